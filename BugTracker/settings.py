@@ -134,6 +134,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Bug attachments, kept apart from MEDIA_ROOT so they are never served publicly
+ATTACHMENT_ROOT = os.path.join(BASE_DIR, 'attachments')
+
+# How attachment downloads are sent: None streams them from Django,
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd) or 'x-accel-redirect' (nginx)
+# has the front server send the file after Django has checked access
+ATTACHMENT_SENDFILE = None
+
+# For 'x-accel-redirect': an nginx location marked `internal` whose alias is ATTACHMENT_ROOT
+ATTACHMENT_ACCEL_PREFIX = '/protected-attachments/'
+
+# Disk space for the uncompressed copies of text attachments opened in the
+# log viewer; the least recently opened are removed beyond it
+LOG_CACHE_BYTES = 5 * 1024 * 1024 * 1024
+
 # Authentication settings
 LOGIN_REDIRECT_URL = 'dashboard:dashboard'
 LOGOUT_REDIRECT_URL = 'accounts:login'
@@ -143,3 +158,7 @@ LOGIN_URL = 'accounts:login'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Bug list pagination
+BUG_LIST_PAGE_SIZE = 50
+BUG_LIST_MAX_PAGE_SIZE = 200
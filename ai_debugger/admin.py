@@ -1,9 +1,24 @@
 from django.contrib import admin
-from .models import AIAnalysisRequest
+from .models import AIAnalysisRequest, AnalysisBatch, AnalysisResult
 
 @admin.register(AIAnalysisRequest)
 class AIAnalysisRequestAdmin(admin.ModelAdmin):
-    list_display = ('id', 'submitted_by', 'language', 'status', 'submitted_at')
-    list_filter = ('status', 'language', 'submitted_at')
-    search_fields = ('submitted_by__username', 'code')
-    readonly_fields = ('submitted_at',)
+    list_display = ('id', 'submitted_by', 'language', 'status', 'cache_hit', 'attempts', 'submitted_at', 'finished_at')
+    list_filter = ('status', 'cache_hit', 'language', 'submitted_at')
+    search_fields = ('submitted_by__username', 'path', 'code_preview')
+    readonly_fields = ('code', 'code_preview', 'line_count', 'submitted_at', 'claimed_by', 'started_at', 'heartbeat_at', 'finished_at', 'error', 'result', 'batch', 'content_hash')
+
+@admin.register(AnalysisResult)
+class AnalysisResultAdmin(admin.ModelAdmin):
+    list_display = ('id', 'language', 'analyzer_version', 'issue_count', 'quality_score', 'hit_count', 'created_at', 'last_used_at')
+    list_filter = ('analyzer_version', 'language')
+    search_fields = ('cache_key',)
+    readonly_fields = ('cache_key', 'analyzer_version', 'language', 'results', 'issue_count', 'high_count',
+                       'quality_score', 'summary', 'created_at', 'last_used_at', 'hit_count')
+
+@admin.register(AnalysisBatch)
+class AnalysisBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'project', 'submitted_by', 'file_count', 'reused_count', 'submitted_at', 'finished_at')
+    list_filter = ('submitted_at',)
+    search_fields = ('name', 'submitted_by__username')
+    readonly_fields = ('submitted_at', 'file_count', 'reused_count', 'skipped_count', 'report', 'finished_at')
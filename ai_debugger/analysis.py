@@ -0,0 +1,85 @@
+"""
+The code analysis run for each AIAnalysisRequest.
+
+``analyze`` is a plain function of the submitted code so that workers can
+run it in a separate process; it must return a JSON-serializable dict with
+``issues``, ``summary`` and ``quality_score``. Python code is parsed with
+``ast`` and checked by the rules in ``ai_debugger.rules`` in a single walk
+of the tree (see ``ai_debugger.engine``); ``timings`` reports where the
+time went. Other languages are not analyzed yet.
+
+Bump ``ANALYZER_VERSION`` whenever a change would alter the results for
+code already analyzed; cached results from other versions are then no
+longer served (see ``ai_debugger.cache``).
+"""
+import ast
+from collections import Counter
+from time import perf_counter
+
+from . import engine, rules  # noqa: F401 (importing rules registers them)
+
+ANALYZER_VERSION = '2'
+
+# Points taken off the quality score per issue, per 100 lines of code
+SEVERITY_PENALTY = {'high': 10, 'medium': 5, 'low': 2}
+
+ISSUE_NOUNS = (('bug', 'potential bug'), ('warning', 'warning'), ('improvement', 'possible improvement'))
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def summarize(issues, line_count):
+    counts = Counter(issue['type'] for issue in issues)
+    parts = [
+        f'{counts[kind]} {noun}{"s" if counts[kind] != 1 else ""}'
+        for kind, noun in ISSUE_NOUNS if counts[kind]
+    ]
+    if not parts:
+        return f'No issues found in {line_count} lines.'
+    found = parts[0] if len(parts) == 1 else ', '.join(parts[:-1]) + ' and ' + parts[-1]
+    return f'Found {found} in {line_count} lines.'
+
+
+def analyze(code, language):
+    """Analyze ``code`` written in ``language``."""
+    if (language or '').lower() != 'python':
+        return {
+            'issues': [],
+            'summary': 'Automatic analysis is only available for Python code so far.',
+            'quality_score': None,
+        }
+
+    start = perf_counter()
+    line_count = code.count('\n') + 1
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError) as exc:
+        return {
+            'issues': [{
+                'type': 'bug',
+                'rule': 'syntax-error',
+                'line': getattr(exc, 'lineno', None),
+                'description': f'Syntax error: {getattr(exc, "msg", exc)}',
+                'severity': 'high',
+                'suggestion': 'Fix the syntax so the rest of the code can be checked',
+            }],
+            'summary': 'The code could not be parsed, so no other checks were run.',
+            'quality_score': 0,
+        }
+    parsed = perf_counter()
+
+    issues, spent = engine.run(tree)
+    finished = perf_counter()
+    penalty = sum(SEVERITY_PENALTY.get(issue['severity'], 0) for issue in issues)
+    return {
+        'issues': issues,
+        'summary': summarize(issues, line_count),
+        'quality_score': max(100 - round(penalty * 100 / max(line_count, 100)), 0),
+        'timings': {
+            'parse_ms': _ms(parsed - start),
+            'total_ms': _ms(finished - start),
+            'rules_ms': {name: _ms(seconds) for name, seconds in spent.items()},
+        },
+    }
@@ -0,0 +1,297 @@
+"""
+Analysis of whole repositories uploaded as a zip file or tarball.
+
+``create_batch`` reads the archive one member at a time (tarballs as a
+stream, zip files member by member), so only the file being read is held
+in memory. Files whose extension maps to one of the chosen languages
+become ``AIAnalysisRequest`` rows of the batch, and the worker pool from
+``run_analysis_workers`` analyzes them in parallel like any other job.
+Files unchanged since the project's previous batch, or already in the
+analysis cache, are completed on the spot from the stored results, so a
+re-upload only queues what changed.
+
+Once no file is left to run, ``finalize`` aggregates the per-file results
+into one report with per-file and per-rule breakdowns.
+"""
+import json
+import lzma
+import tarfile
+import zipfile
+import zlib
+from collections import Counter, defaultdict
+from pathlib import PurePosixPath
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import cache
+from .models import AIAnalysisRequest, AnalysisBatch, AnalysisResult
+
+LANGUAGE_EXTENSIONS = {
+    '.py': 'python', '.pyw': 'python',
+    '.js': 'javascript', '.mjs': 'javascript', '.cjs': 'javascript', '.jsx': 'javascript',
+    '.ts': 'typescript', '.tsx': 'typescript',
+    '.java': 'java',
+    '.c': 'cpp', '.h': 'cpp', '.cc': 'cpp', '.cpp': 'cpp', '.cxx': 'cpp', '.hpp': 'cpp',
+    '.cs': 'csharp',
+    '.php': 'php',
+    '.rb': 'ruby',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.swift': 'swift',
+    '.kt': 'kotlin', '.kts': 'kotlin',
+}
+
+LANGUAGE_CHOICES = (
+    ('python', 'Python'),
+    ('javascript', 'JavaScript'),
+    ('typescript', 'TypeScript'),
+    ('java', 'Java'),
+    ('cpp', 'C/C++'),
+    ('csharp', 'C#'),
+    ('php', 'PHP'),
+    ('ruby', 'Ruby'),
+    ('go', 'Go'),
+    ('rust', 'Rust'),
+    ('swift', 'Swift'),
+    ('kotlin', 'Kotlin'),
+)
+
+DEFAULT_LANGUAGES = ('python',)
+
+# Directories that hold dependencies or tooling rather than the project
+SKIPPED_DIRS = {'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv', '.tox'}
+
+MAX_FILE_BYTES = 1024 * 1024
+
+MAX_FILES = 20000
+
+# Files held before they are written, by count and by total size
+INSERT_BATCH_SIZE = 500
+INSERT_BATCH_BYTES = 8 * 1024 * 1024
+
+UNFINISHED = ('pending', 'processing')
+
+# Raised by zipfile, tarfile and the decompressors for corrupt input
+READ_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, zlib.error, lzma.LZMAError)
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def clean_path(name):
+    """A relative POSIX path for an archive member, or ``None`` to skip it."""
+    parts = [part for part in PurePosixPath(name.replace('\\', '/')).parts
+             if part not in ('/', '.', '..')]
+    if not parts or SKIPPED_DIRS.intersection(parts[:-1]):
+        return None
+    return '/'.join(parts)
+
+
+def _read_zip_member(archive, info):
+    # At most one byte past the limit, whatever the header claims
+    with archive.open(info) as member:
+        return member.read(MAX_FILE_BYTES + 1)
+
+
+def _zip_members(fileobj):
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, (
+                    lambda info=info: _read_zip_member(archive, info)
+                )
+
+
+def _tar_members(fileobj):
+    # "r|*" reads the (possibly compressed) tarball as a stream, without seeking
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, (
+                    lambda member=member: archive.extractfile(member).read(MAX_FILE_BYTES + 1)
+                )
+
+
+def iter_members(fileobj):
+    """
+    Yield ``(path, size, read)`` for each regular file in a zip or tar
+    archive. ``read()`` returns the contents and must be called before
+    moving on to the next member.
+    """
+    fileobj.seek(0)
+    is_zip = zipfile.is_zipfile(fileobj)
+    fileobj.seek(0)
+    return _zip_members(fileobj) if is_zip else _tar_members(fileobj)
+
+
+def _previous_results(batch):
+    """``{content_hash: result_id}`` for the files of the batch before ``batch``."""
+    earlier = AnalysisBatch.objects.filter(id__lt=batch.id)
+    if batch.project_id:
+        earlier = earlier.filter(project_id=batch.project_id)
+    else:
+        earlier = earlier.filter(project__isnull=True, submitted_by_id=batch.submitted_by_id,
+                                 name=batch.name)
+    previous = earlier.order_by('-id').first()
+    if previous is None:
+        return {}
+    return dict(
+        previous.files.filter(status='completed', result__isnull=False)
+        .values_list('content_hash', 'result_id')
+    )
+
+
+def _queue(files, previous):
+    """
+    Insert ``files``, completing those with a stored result. Returns the
+    number completed that way.
+    """
+    missing = {file.content_hash for file in files if file.content_hash not in previous}
+    cached = dict(
+        AnalysisResult.objects.filter(cache_key__in=missing).values_list('cache_key', 'id')
+    )
+    now = timezone.now()
+    used = set()
+    for file in files:
+        result_id = previous.get(file.content_hash) or cached.get(file.content_hash)
+        if result_id:
+            file.status = 'completed'
+            file.result_id = result_id
+            file.cache_hit = True
+            file.finished_at = now
+            used.add(result_id)
+    if used:
+        AnalysisResult.objects.filter(id__in=used).update(
+            hit_count=F('hit_count') + 1, last_used_at=now
+        )
+    AIAnalysisRequest.objects.bulk_create(files)
+    return len([file for file in files if file.result_id])
+
+
+def _add_files(batch, members, languages, previous):
+    pending = []
+    pending_bytes = 0
+    for member_name, size, read in members:
+        path = clean_path(member_name)
+        language = path and LANGUAGE_EXTENSIONS.get(PurePosixPath(path).suffix.lower())
+        if language not in languages:
+            continue
+        data = read() if size <= MAX_FILE_BYTES else b''
+        try:
+            code = data.decode('utf-8') if len(data) <= MAX_FILE_BYTES else ''
+        except UnicodeDecodeError:
+            code = ''
+        if not code.strip():
+            # Oversized, binary or empty
+            batch.skipped_count += 1
+            continue
+        batch.file_count += 1
+        if batch.file_count > MAX_FILES:
+            raise ArchiveError(f'The archive has more than {MAX_FILES} files to analyze.')
+        pending.append(AIAnalysisRequest.for_code(
+            code, batch=batch, path=path, language=language,
+            submitted_by_id=batch.submitted_by_id, content_hash=cache.cache_key(code, language),
+        ))
+        pending_bytes += len(data)
+        if len(pending) == INSERT_BATCH_SIZE or pending_bytes >= INSERT_BATCH_BYTES:
+            batch.reused_count += _queue(pending, previous)
+            pending, pending_bytes = [], 0
+    if pending:
+        batch.reused_count += _queue(pending, previous)
+
+
+def create_batch(fileobj, user, name, project=None, languages=DEFAULT_LANGUAGES):
+    """
+    Queue every file of the archive ``fileobj`` written in one of
+    ``languages`` as one batch. Raises ``ArchiveError`` for unreadable or
+    oversized archives, in which case nothing is saved.
+    """
+    languages = set(languages)
+    with transaction.atomic():
+        batch = AnalysisBatch.objects.create(
+            name=name, project=project, submitted_by=user, languages=','.join(sorted(languages)),
+        )
+        previous = _previous_results(batch)
+        try:
+            _add_files(batch, iter_members(fileobj), languages, previous)
+        except READ_ERRORS as exc:
+            raise ArchiveError(f'Could not read the archive: {exc}')
+        batch.save(update_fields=['file_count', 'reused_count', 'skipped_count'])
+    finalize(batch)
+    return batch
+
+
+def progress(batch):
+    """File counts by status."""
+    counts = {status: 0 for status, _ in AIAnalysisRequest.STATUS_CHOICES}
+    counts.update(batch.files.values_list('status').annotate(count=Count('id')).order_by())
+    return counts
+
+
+def build_report(batch):
+    """Issue counts per file, per rule and per severity across the batch."""
+    files = []
+    rules = defaultdict(lambda: {'issues': 0, 'files': 0, 'ms': 0.0})
+    severities = Counter()
+    rows = batch.files.order_by('path').values_list(
+        'id', 'path', 'language', 'status', 'cache_hit', 'result__results'
+    )
+    for file_id, path, language, status, cache_hit, results in rows.iterator(chunk_size=1000):
+        results = results or {}
+        issues = results.get('issues', [])
+        by_rule = Counter(issue.get('rule') or issue['type'] for issue in issues)
+        for rule, count in by_rule.items():
+            rules[rule]['issues'] += count
+            rules[rule]['files'] += 1
+        if not cache_hit:
+            # Only time actually spent on this batch
+            for rule, ms in results.get('timings', {}).get('rules_ms', {}).items():
+                rules[rule]['ms'] += ms
+        file_severities = Counter(issue['severity'] for issue in issues)
+        severities.update(file_severities)
+        files.append({
+            'id': file_id,
+            'path': path,
+            'language': language,
+            'status': status,
+            'reused': cache_hit,
+            'issues': len(issues),
+            'high': file_severities['high'],
+            'quality_score': results.get('quality_score'),
+        })
+
+    scores = [file['quality_score'] for file in files if file['quality_score'] is not None]
+    return {
+        'files': files,
+        'rules': {
+            rule: {**counts, 'ms': round(counts['ms'], 3)}
+            for rule, counts in sorted(rules.items(), key=lambda item: -item[1]['issues'])
+        },
+        'totals': {
+            'files': len(files),
+            'failed': sum(1 for file in files if file['status'] == 'failed'),
+            'issues': sum(severities.values()),
+            'by_severity': dict(severities),
+            'average_quality_score': round(sum(scores) / len(scores)) if scores else None,
+        },
+    }
+
+
+def finalize(batch):
+    """
+    Write the report once every file has finished. Returns True if the
+    batch is finished.
+    """
+    if batch.report is not None:
+        return True
+    if batch.files.filter(status__in=UNFINISHED).exists():
+        return False
+    batch.report = json.dumps(build_report(batch))
+    batch.finished_at = timezone.now()
+    AnalysisBatch.objects.filter(id=batch.id, report__isnull=True).update(
+        report=batch.report, finished_at=batch.finished_at
+    )
+    return True
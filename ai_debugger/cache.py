@@ -0,0 +1,115 @@
+"""
+Content-addressed cache of analysis results.
+
+Results are keyed by the SHA-256 of the analyzer version, the language and
+the submitted code after normalization (unified line endings, no trailing
+whitespace, no leading or trailing blank lines), so code that was already
+analyzed is answered from the stored result instead of being queued again.
+Every request for the same code points at one ``AnalysisResult`` row rather
+than holding its own copy of the results.
+
+``prune`` evicts entries unused for ``TTL_DAYS``, the least recently used
+beyond ``MAX_ENTRIES`` and any written by another analyzer version.
+Eviction clears the key, so the entry is no longer served while requests
+already pointing at it keep their results; rows no request refers to are
+deleted.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from .analysis import ANALYZER_VERSION
+from .models import AIAnalysisRequest, AnalysisResult
+
+TTL_DAYS = 30
+
+MAX_ENTRIES = 10000
+
+
+def normalize(code):
+    """``code`` with formatting noise that cannot change the analysis removed."""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def cache_key(code, language, version=ANALYZER_VERSION):
+    digest = hashlib.sha256()
+    for part in (version, language or '', normalize(code)):
+        # Separators keep ("ab", "c") and ("a", "bc") apart
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def lookup(key):
+    """The live entry for ``key``, recording the hit, or ``None``."""
+    entry = AnalysisResult.objects.filter(cache_key=key).only('id').first()
+    if entry is not None:
+        AnalysisResult.objects.filter(id=entry.id).update(
+            hit_count=F('hit_count') + 1, last_used_at=timezone.now()
+        )
+    return entry
+
+
+def store(key, language, results, version=ANALYZER_VERSION):
+    """
+    Save the ``analysis.analyze`` output ``results`` under ``key``, or
+    return the entry another worker stored first.
+    """
+    entry = AnalysisResult.from_results(
+        results, cache_key=key, analyzer_version=version, language=language or ''
+    )
+    try:
+        with transaction.atomic():
+            entry.save(force_insert=True)
+            return entry
+    except IntegrityError:
+        return AnalysisResult.objects.get(cache_key=key)
+
+
+def _delete_unreferenced():
+    deleted, _ = AnalysisResult.objects.filter(
+        cache_key__isnull=True, requests__isnull=True
+    ).delete()
+    return deleted
+
+
+def prune(ttl_days=TTL_DAYS, max_entries=MAX_ENTRIES, version=ANALYZER_VERSION):
+    """
+    Evict expired, surplus and outdated entries. Returns the number of
+    entries evicted and of rows deleted.
+    """
+    live = AnalysisResult.objects.filter(cache_key__isnull=False)
+    with transaction.atomic():
+        evicted = live.filter(
+            Q(last_used_at__lt=timezone.now() - timedelta(days=ttl_days))
+            | ~Q(analyzer_version=version)
+        ).update(cache_key=None)
+        evicted += AnalysisResult.objects.filter(id__in=Subquery(
+            live.order_by('-last_used_at', '-id').values('id')[max_entries:]
+        )).update(cache_key=None)
+        return evicted, _delete_unreferenced()
+
+
+def invalidate():
+    """Evict every entry. Returns the same counts as ``prune``."""
+    with transaction.atomic():
+        evicted = AnalysisResult.objects.filter(cache_key__isnull=False).update(cache_key=None)
+        return evicted, _delete_unreferenced()
+
+
+def stats():
+    """Hit and miss counts over all completed requests, and the cache size."""
+    finished = AIAnalysisRequest.objects.filter(result__isnull=False)
+    hits = finished.filter(cache_hit=True).count()
+    misses = finished.filter(cache_hit=False).count()
+    return {
+        'entries': AnalysisResult.objects.filter(cache_key__isnull=False).count(),
+        'stored': AnalysisResult.objects.count(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+    }
@@ -0,0 +1,118 @@
+"""
+Single-pass rule engine for Python static analysis.
+
+A rule is a class registered with ``@register``. Its ``enter_<NodeType>``
+and ``leave_<NodeType>`` methods are called as the syntax tree walk
+reaches and leaves nodes of that type, and it reports findings with
+``self.report``. Registration records which rules handle which node
+types, and ``run`` combines the handlers of every rule into one dispatch
+table, so a file is walked once however many rules there are. Rule
+instances live for one run, so they can keep per-file state on ``self``.
+"""
+import ast
+from collections import defaultdict
+from time import perf_counter
+
+# Registered rule classes in registration order
+RULES = []
+
+# Node class -> [(rule index, method name)], for entering and leaving nodes
+_ENTER = defaultdict(list)
+_LEAVE = defaultdict(list)
+
+
+def register(rule_class):
+    """Class decorator adding a rule to every analysis."""
+    index = len(RULES)
+    RULES.append(rule_class)
+    for attr in dir(rule_class):
+        prefix, _, node_name = attr.partition('_')
+        if prefix in ('enter', 'leave') and node_name:
+            node_class = getattr(ast, node_name, None)
+            if not (isinstance(node_class, type) and issubclass(node_class, ast.AST)):
+                raise TypeError(f'{rule_class.__name__}.{attr} does not name an ast node type')
+            (_ENTER if prefix == 'enter' else _LEAVE)[node_class].append((index, attr))
+    return rule_class
+
+
+class Rule:
+    """Base class for rules; subclasses set ``name`` and handler methods."""
+    name = None
+    type = 'warning'
+    severity = 'medium'
+
+    def __init__(self, issues):
+        self._issues = issues
+
+    def report(self, node, description, suggestion='', severity=None, type=None):
+        self._issues.append({
+            'type': type or self.type,
+            'rule': self.name,
+            'line': getattr(node, 'lineno', None),
+            'description': description,
+            'severity': severity or self.severity,
+            'suggestion': suggestion,
+        })
+
+    def finish(self):
+        """Called once the whole tree has been walked."""
+
+
+def run(tree):
+    """
+    Walk ``tree`` once with every registered rule. Returns the issues found
+    in line order and the seconds spent in each rule, keyed by rule name.
+    """
+    issues = []
+    rules = [rule_class(issues) for rule_class in RULES]
+    spent = [0.0] * len(rules)
+
+    # Bind each node type's handlers once for this run
+    enter = {node_class: [(index, getattr(rules[index], attr)) for index, attr in handlers]
+             for node_class, handlers in _ENTER.items()}
+    leave = {node_class: [(index, getattr(rules[index], attr)) for index, attr in handlers]
+             for node_class, handlers in _LEAVE.items()}
+
+    # Iterative pre-order walk: deeply nested expressions (long chains of
+    # ``+``) would exceed the recursion limit. A node pushed with
+    # ``leaving`` set marks the point where its subtree is done.
+    AST = ast.AST
+    stack = [(tree, False)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node, leaving = pop()
+        node_class = node.__class__
+        if leaving:
+            for index, handler in leave[node_class]:
+                start = perf_counter()
+                handler(node)
+                spent[index] += perf_counter() - start
+            continue
+
+        handlers = enter.get(node_class)
+        if handlers:
+            for index, handler in handlers:
+                start = perf_counter()
+                handler(node)
+                spent[index] += perf_counter() - start
+        if node_class in leave:
+            push((node, True))
+
+        # Children go on the stack last-first so they are visited in order
+        children = []
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, AST):
+                children.append(value)
+            elif value.__class__ is list:
+                children.extend(item for item in value if isinstance(item, AST))
+        for child in reversed(children):
+            push((child, False))
+
+    for index, rule in enumerate(rules):
+        start = perf_counter()
+        rule.finish()
+        spent[index] += perf_counter() - start
+
+    issues.sort(key=lambda issue: issue['line'] or 0)
+    return issues, {rule.name: seconds for rule, seconds in zip(rules, spent)}
@@ -0,0 +1,58 @@
+"""
+Model fields that store their value zlib-compressed in a binary column.
+
+Source code and analysis results compress several times over, and the
+column is only decompressed for rows that actually load it, so list views
+should ``defer()`` these fields and show precomputed summary columns.
+"""
+import json
+import zlib
+
+from django.db import models
+
+COMPRESSION_LEVEL = 6
+
+
+class CompressedTextField(models.BinaryField):
+    """A ``str`` stored compressed."""
+
+    def encode(self, value):
+        return value.encode('utf-8')
+
+    def decode(self, data):
+        return data.decode('utf-8')
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return self.decode(zlib.decompress(value))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        return connection.Database.Binary(zlib.compress(self.encode(value), COMPRESSION_LEVEL))
+
+    def to_python(self, value):
+        # BinaryField would treat strings as base64
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class CompressedJSONField(CompressedTextField):
+    """Any JSON-serializable value, stored as compressed JSON."""
+
+    def encode(self, value):
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(data)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
@@ -0,0 +1,205 @@
+"""
+Database-backed job queue for code analyses.
+
+Every ``AIAnalysisRequest`` is a job. Submitting one only inserts a
+``pending`` row; workers started by ``manage.py run_analysis_workers``
+claim rows with a conditional UPDATE, so two workers can never take the
+same job, and run ``analysis.analyze`` with a per-job time limit. While a
+job runs its worker refreshes ``heartbeat_at``; a job whose heartbeat
+stops (the worker was killed or its machine went away) is put back in the
+queue by ``requeue_stale``. Failed attempts are retried with exponential
+backoff until ``max_attempts`` is reached. Results are stored in the
+analysis cache, and a job whose code was analyzed since it was queued is
+completed from there without running the analyzer again.
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache
+from .analysis import analyze
+from .models import AIAnalysisRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+HEARTBEAT_SECONDS = 5
+
+# A job whose heartbeat is older than this is presumed abandoned
+STALE_SECONDS = 30
+
+# First retry delay; doubled on each further attempt
+RETRY_BACKOFF_SECONDS = 10
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def worker_name(pid=None):
+    return f'{socket.gethostname()}:{pid or os.getpid()}'
+
+
+def claim(worker):
+    """
+    Take the oldest runnable pending job for ``worker``, or return ``None``.
+    """
+    while True:
+        now = timezone.now()
+        job_id = AIAnalysisRequest.objects.filter(
+            status='pending', run_after__lte=now
+        ).order_by('run_after', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        # An UPDATE that re-checks the status: of two workers racing for
+        # the same row only one matches it, and no read lock is held in
+        # between (SQLite cannot upgrade one without risking "locked")
+        claimed = AIAnalysisRequest.objects.filter(id=job_id, status='pending').update(
+            status='processing', claimed_by=worker, started_at=now, heartbeat_at=now,
+            finished_at=None, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            # By id: an earlier job whose outcome could not be recorded may
+            # still be held by this worker
+            return AIAnalysisRequest.objects.get(id=job_id)
+        # Another worker won the race; try the next job
+
+
+def heartbeat(job_ids, worker):
+    """Mark ``job_ids`` as still running on ``worker``."""
+    return AIAnalysisRequest.objects.filter(
+        id__in=job_ids, status='processing', claimed_by=worker
+    ).update(heartbeat_at=timezone.now())
+
+
+def complete(job, result, worker, cache_hit=False):
+    """Complete a job this worker still holds with the AnalysisResult ``result``."""
+    return AIAnalysisRequest.objects.filter(
+        id=job.id, status='processing', claimed_by=worker
+    ).update(status='completed', result=result, cache_hit=cache_hit, error='',
+             finished_at=timezone.now())
+
+
+def fail(job, error, worker, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Put a failed job back in the queue, or give up after ``max_attempts``."""
+    now = timezone.now()
+    held = AIAnalysisRequest.objects.filter(id=job.id, status='processing', claimed_by=worker)
+    if job.attempts >= max_attempts:
+        return held.update(status='failed', error=error, finished_at=now)
+    delay = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+    return held.update(status='pending', error=error, claimed_by='',
+                       run_after=now + timedelta(seconds=delay))
+
+
+def requeue_stale(stale_seconds=STALE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Return abandoned ``processing`` jobs to the queue (or fail them once
+    out of attempts). Returns the number of jobs touched.
+    """
+    now = timezone.now()
+    stale = AIAnalysisRequest.objects.filter(
+        status='processing', heartbeat_at__lt=now - timedelta(seconds=stale_seconds)
+    )
+    error = 'Worker stopped responding'
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed', error=error, finished_at=now
+    )
+    requeued = stale.update(status='pending', error=error, claimed_by='', run_after=now)
+    return failed + requeued
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+
+def run(job, timeout=DEFAULT_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Run one claimed job within ``timeout`` seconds and record the outcome.
+    Must be called from the main thread, as it uses SIGALRM. Returns True
+    if the job completed.
+    """
+    worker = job.claimed_by
+    key = cache.cache_key(job.code, job.language)
+    try:
+        hit = cache.lookup(key)
+        if hit is not None:
+            complete(job, hit, worker, cache_hit=True)
+            return True
+    except DatabaseError:
+        logger.exception('Looking up analysis %s in the cache failed', job.id)
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                heartbeat([job.id], worker)
+            except Exception:
+                logger.exception('Heartbeat for analysis %s failed', job.id)
+        connection.close()
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        results = analyze(job.code, job.language)
+        json.dumps(results)
+    except JobTimeout:
+        error = f'Analysis took longer than {timeout} seconds'
+    except Exception:
+        error = traceback.format_exc(limit=5)
+    else:
+        error = None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        stop.set()
+        beater.join()
+
+    # If recording the outcome fails the job stays claimed and is retried
+    # once requeue_stale notices its heartbeat has stopped
+    try:
+        if error is None:
+            complete(job, cache.store(key, job.language, results), worker)
+            return True
+        logger.warning('Analysis %s failed (attempt %s): %s', job.id, job.attempts, error)
+        fail(job, error, worker, max_attempts)
+    except DatabaseError:
+        logger.exception('Recording the outcome of analysis %s failed', job.id)
+    return False
+
+
+def work(worker, timeout=DEFAULT_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS,
+         poll_seconds=1.0, stop=None, drain=False):
+    """
+    Claim and run jobs until ``stop`` is set, sleeping ``poll_seconds``
+    when the queue is empty. With ``drain``, return once it is empty.
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            job = claim(worker)
+        except DatabaseError:
+            # Typically a busy database; the job, if any, is still queued
+            logger.exception('Claiming an analysis job failed')
+            stop.wait(poll_seconds)
+            continue
+        if job is None:
+            if drain:
+                return
+            stop.wait(poll_seconds)
+            continue
+        run(job, timeout, max_attempts)
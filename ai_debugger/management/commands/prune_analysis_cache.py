@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from ai_debugger import cache
+
+
+class Command(BaseCommand):
+    help = 'Evict expired, surplus and outdated analysis results from the cache and report its hit rate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=int, default=cache.TTL_DAYS,
+                            help='Evict entries unused for this many days.')
+        parser.add_argument('--max-entries', type=int, default=cache.MAX_ENTRIES,
+                            help='Keep at most this many entries, evicting the least recently used.')
+        parser.add_argument('--all', action='store_true',
+                            help='Evict every entry, for example after changing the analyzer.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            evicted, deleted = cache.invalidate()
+        else:
+            evicted, deleted = cache.prune(options['ttl_days'], options['max_entries'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Evicted {evicted} entries and deleted {deleted} unreferenced results.'
+        ))
+        stats = cache.stats()
+        rate = 'n/a' if stats['hit_rate'] is None else f'{stats["hit_rate"]:.1%}'
+        self.stdout.write(
+            f'{stats["entries"]} cached entries ({stats["stored"]} stored results); '
+            f'{stats["hits"]} hits, {stats["misses"]} misses, hit rate {rate}.'
+        )
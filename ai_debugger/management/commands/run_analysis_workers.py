@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from ai_debugger import cache, jobs
+from ai_debugger.models import AIAnalysisRequest
+
+# Extra seconds a job may overrun its time limit before its worker is killed
+KILL_GRACE_SECONDS = 10
+
+# Seconds between evictions from the analysis cache
+PRUNE_SECONDS = 3600
+
+
+def _worker(options):
+    # The supervisor owns Ctrl-C; SIGTERM means finish the current job and exit
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    jobs.work(jobs.worker_name(), timeout=options['timeout'],
+              max_attempts=options['max_attempts'], poll_seconds=options['poll'], stop=stop)
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker processes that execute queued code analyses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes to run (default: one per CPU).')
+        parser.add_argument('--timeout', type=float, default=jobs.DEFAULT_TIMEOUT,
+                            help='Seconds a single analysis may run.')
+        parser.add_argument('--max-attempts', type=int, default=jobs.DEFAULT_MAX_ATTEMPTS,
+                            help='Attempts per job before it is marked failed.')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds between queue checks when idle.')
+        parser.add_argument('--drain', action='store_true',
+                            help='Run queued jobs in this process and exit when the queue is empty.')
+
+    def handle(self, *args, **options):
+        jobs.requeue_stale(max_attempts=options['max_attempts'])
+        if options['drain']:
+            jobs.work(jobs.worker_name(), timeout=options['timeout'],
+                      max_attempts=options['max_attempts'], drain=True)
+            return
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+        workers = {}
+        self.stdout.write(f'Starting {options["processes"]} analysis workers.')
+        last_sweep = last_prune = 0
+        while not stopping.is_set():
+            # Replace workers that exited or were killed
+            for name, process in list(workers.items()):
+                if not process.is_alive():
+                    self.stderr.write(f'Worker {name} exited with code {process.exitcode}.')
+                    del workers[name]
+                    self.release_jobs(name, options)
+            while len(workers) < options['processes']:
+                # Children must open their own database connections
+                connections.close_all()
+                process = multiprocessing.Process(target=_worker, args=(options,), daemon=True)
+                process.start()
+                workers[jobs.worker_name(process.pid)] = process
+
+            if time.monotonic() - last_sweep >= jobs.HEARTBEAT_SECONDS:
+                last_sweep = time.monotonic()
+                jobs.requeue_stale(max_attempts=options['max_attempts'])
+                self.kill_overrunning(workers, options)
+            if time.monotonic() - last_prune >= PRUNE_SECONDS:
+                last_prune = time.monotonic()
+                cache.prune()
+            stopping.wait(1)
+
+        self.stdout.write('Stopping workers after their current jobs.')
+        for process in workers.values():
+            process.terminate()
+        deadline = time.monotonic() + options['timeout'] + KILL_GRACE_SECONDS
+        for process in workers.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+
+    def release_jobs(self, name, options):
+        """Retry the job a dead worker was running, without waiting for it to go stale."""
+        for job in AIAnalysisRequest.objects.filter(status='processing', claimed_by=name):
+            jobs.fail(job, 'Worker exited while running the analysis', name, options['max_attempts'])
+
+    def kill_overrunning(self, workers, options):
+        """Kill workers stuck in a job that ignored its time limit."""
+        cutoff = timezone.now() - timedelta(seconds=options['timeout'] + KILL_GRACE_SECONDS)
+        for job in AIAnalysisRequest.objects.filter(
+            status='processing', claimed_by__in=list(workers), started_at__lt=cutoff
+        ).only('id', 'attempts', 'claimed_by'):
+            self.stderr.write(f'Killing worker {job.claimed_by}, stuck on analysis {job.id}.')
+            workers[job.claimed_by].kill()
+            workers[job.claimed_by].join()
+            jobs.fail(job, f'Analysis took longer than {options["timeout"]} seconds',
+                      job.claimed_by, options['max_attempts'])
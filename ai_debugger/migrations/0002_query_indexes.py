@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_debugger', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aianalysisrequest',
+            index=models.Index(fields=['submitted_by', '-submitted_at'], name='analysis_user_submitted_idx'),
+        ),
+    ]
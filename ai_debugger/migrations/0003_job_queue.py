@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:00
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_debugger', '0002_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='run_after',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='aianalysisrequest',
+            index=models.Index(fields=['status', 'run_after'], name='analysis_queue_idx'),
+        ),
+    ]
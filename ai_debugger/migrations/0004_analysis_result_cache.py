@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_debugger', '0003_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='AnalysisResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('analyzer_version', models.CharField(max_length=20)),
+                ('language', models.CharField(max_length=50)),
+                ('results', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hit_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='analysis_result_lru_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='result',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='requests', to='ai_debugger.analysisresult'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_debugger', '0004_analysis_result_cache'),
+        ('projects', '0002_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('submitted_at', models.DateTimeField(auto_now_add=True)),
+                ('languages', models.CharField(max_length=200)),
+                ('file_count', models.IntegerField(default=0)),
+                ('reused_count', models.IntegerField(default=0)),
+                ('skipped_count', models.IntegerField(default=0)),
+                ('report', models.TextField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='aianalysisrequest',
+            name='analysis_user_submitted_idx',
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='analysisbatch',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='analysis_batches', to='projects.project'),
+        ),
+        migrations.AddField(
+            model_name='analysisbatch',
+            name='submitted_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_batches', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='files', to='ai_debugger.analysisbatch'),
+        ),
+        migrations.AddIndex(
+            model_name='aianalysisrequest',
+            index=models.Index(fields=['submitted_by', 'batch', '-submitted_at'], name='analysis_user_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aianalysisrequest',
+            index=models.Index(fields=['batch', 'status'], name='analysis_batch_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisbatch',
+            index=models.Index(fields=['submitted_by', '-submitted_at'], name='analysis_batch_user_idx'),
+        ),
+    ]
@@ -0,0 +1,187 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:40
+
+import json
+
+import ai_debugger.fields
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _summary_fields(results):
+    issues = results.get('issues', [])
+    return {
+        'issue_count': len(issues),
+        'high_count': sum(1 for issue in issues if issue.get('severity') == 'high'),
+        'quality_score': results.get('quality_score'),
+        'summary': (results.get('summary') or '')[:255],
+    }
+
+
+def _load(text):
+    try:
+        results = json.loads(text) if text else None
+    except ValueError:
+        return None
+    return results if isinstance(results, dict) else None
+
+
+def _preview(code):
+    first_line = next((line.strip() for line in code.splitlines() if line.strip()), '')
+    return first_line[:100], len(code.splitlines())
+
+
+def compress(apps, schema_editor):
+    AIAnalysisRequest = apps.get_model('ai_debugger', 'AIAnalysisRequest')
+    AnalysisResult = apps.get_model('ai_debugger', 'AnalysisResult')
+
+    fields = ['compressed_results', 'issue_count', 'high_count', 'quality_score', 'summary']
+    batch = []
+    for result in AnalysisResult.objects.iterator(chunk_size=BATCH_SIZE):
+        result.compressed_results = _load(result.results) or {}
+        for name, value in _summary_fields(result.compressed_results).items():
+            setattr(result, name, value)
+        batch.append(result)
+        if len(batch) >= BATCH_SIZE:
+            AnalysisResult.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        AnalysisResult.objects.bulk_update(batch, fields)
+
+    # Requests from before the result cache kept their own results; they
+    # become unkeyed result rows like evicted cache entries
+    fields = ['compressed_code', 'code_preview', 'line_count', 'result']
+    batch = []
+    for request in AIAnalysisRequest.objects.only(
+        'id', 'code', 'language', 'results', 'result_id'
+    ).iterator(chunk_size=BATCH_SIZE):
+        request.compressed_code = request.code
+        request.code_preview, request.line_count = _preview(request.code)
+        results = _load(request.results)
+        if request.result_id is None and results is not None:
+            request.result = AnalysisResult.objects.create(
+                analyzer_version='1', language=request.language, results='',
+                compressed_results=results, **_summary_fields(results)
+            )
+        batch.append(request)
+        if len(batch) >= BATCH_SIZE:
+            AIAnalysisRequest.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        AIAnalysisRequest.objects.bulk_update(batch, fields)
+
+
+def decompress(apps, schema_editor):
+    AIAnalysisRequest = apps.get_model('ai_debugger', 'AIAnalysisRequest')
+    AnalysisResult = apps.get_model('ai_debugger', 'AnalysisResult')
+
+    for model, source, target, convert in (
+        (AnalysisResult, 'compressed_results', 'results', json.dumps),
+        (AIAnalysisRequest, 'compressed_code', 'code', str),
+    ):
+        batch = []
+        for row in model.objects.only('id', source).iterator(chunk_size=BATCH_SIZE):
+            setattr(row, target, convert(getattr(row, source)))
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, [target])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, [target])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_debugger', '0005_analysis_batches'),
+    ]
+
+    # New columns go at the end of the row, after every column that list
+    # views read, so those reads stop short of the large values
+    operations = [
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='compressed_code',
+            field=ai_debugger.fields.CompressedTextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='code_preview',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='aianalysisrequest',
+            name='line_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='analysisresult',
+            name='compressed_results',
+            field=ai_debugger.fields.CompressedJSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='analysisresult',
+            name='issue_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='analysisresult',
+            name='high_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='analysisresult',
+            name='quality_score',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysisresult',
+            name='summary',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        # Nullable while both copies exist, so unapplying can re-add the
+        # old columns before decompress() fills them
+        migrations.AlterField(
+            model_name='aianalysisrequest',
+            name='code',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisresult',
+            name='results',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(compress, decompress),
+        migrations.RemoveField(
+            model_name='aianalysisrequest',
+            name='code',
+        ),
+        migrations.RemoveField(
+            model_name='aianalysisrequest',
+            name='results',
+        ),
+        migrations.RemoveField(
+            model_name='analysisresult',
+            name='results',
+        ),
+        migrations.RenameField(
+            model_name='aianalysisrequest',
+            old_name='compressed_code',
+            new_name='code',
+        ),
+        migrations.RenameField(
+            model_name='analysisresult',
+            old_name='compressed_results',
+            new_name='results',
+        ),
+        migrations.AlterField(
+            model_name='aianalysisrequest',
+            name='code',
+            field=ai_debugger.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='analysisresult',
+            name='results',
+            field=ai_debugger.fields.CompressedJSONField(),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_debugger', '0006_compressed_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aianalysisrequest',
+            index=models.Index(fields=['batch', 'path'], name='analysis_batch_path_idx'),
+        ),
+    ]
@@ -1,5 +1,74 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .fields import CompressedJSONField, CompressedTextField
+
+class AnalysisResult(models.Model):
+    """
+    One stored analysis output, shared by every request for the same code.
+    
+    ``cache_key`` hashes the normalized code, language and analyzer version
+    (see ``ai_debugger.cache``). Evicted entries lose their key, so they are
+    no longer reused, and are deleted once no request refers to them.
+    The results are stored compressed; list views read the summary columns.
+    """
+    cache_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    analyzer_version = models.CharField(max_length=20)
+    language = models.CharField(max_length=50)
+    results = CompressedJSONField()
+    issue_count = models.IntegerField(default=0)
+    high_count = models.IntegerField(default=0)
+    quality_score = models.IntegerField(null=True, blank=True)
+    summary = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    hit_count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.language} result {self.cache_key or '(evicted)'}"
+    
+    @classmethod
+    def from_results(cls, results, **fields):
+        """An unsaved result for the ``analysis.analyze`` output ``results``."""
+        issues = results.get('issues', [])
+        return cls(
+            results=results,
+            issue_count=len(issues),
+            high_count=sum(1 for issue in issues if issue.get('severity') == 'high'),
+            quality_score=results.get('quality_score'),
+            summary=(results.get('summary') or '')[:255],
+            **fields
+        )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_used_at'], name='analysis_result_lru_idx'),
+        ]
+
+class AnalysisBatch(models.Model):
+    """
+    An uploaded archive analyzed file by file. Each file becomes an
+    AIAnalysisRequest with ``batch`` set; see ``ai_debugger.batches``.
+    """
+    name = models.CharField(max_length=255)
+    project = models.ForeignKey('projects.Project', on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='analysis_batches')
+    submitted_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analysis_batches')
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    languages = models.CharField(max_length=200)  # comma-separated
+    file_count = models.IntegerField(default=0)
+    reused_count = models.IntegerField(default=0)  # unchanged files answered without analysis
+    skipped_count = models.IntegerField(default=0)  # too large or not text
+    report = models.TextField(blank=True, null=True)  # JSON, written once every file is done
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.file_count} files)"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['submitted_by', '-submitted_at'], name='analysis_batch_user_idx'),
+        ]
 
 class AIAnalysisRequest(models.Model):
     STATUS_CHOICES = (
@@ -9,12 +78,51 @@ class AIAnalysisRequest(models.Model):
         ('failed', 'Failed'),
     )
     
-    code = models.TextField()
+    code = CompressedTextField()  # defer() it in list views
+    code_preview = models.CharField(max_length=100, blank=True, default='')
+    line_count = models.IntegerField(default=0)
     language = models.CharField(max_length=50)
     submitted_by = models.ForeignKey(User, on_delete=models.CASCADE)
     submitted_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    results = models.TextField(blank=True, null=True)
+    result = models.ForeignKey(AnalysisResult, on_delete=models.PROTECT, null=True, blank=True,
+                               related_name='requests')
+    cache_hit = models.BooleanField(default=False)
+    
+    # Set for files of an uploaded archive
+    batch = models.ForeignKey(AnalysisBatch, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='files')
+    path = models.CharField(max_length=500, blank=True, default='')
+    content_hash = models.CharField(max_length=64, blank=True, default='')  # cache.cache_key of the code
+    
+    # Job queue bookkeeping, see ai_debugger.jobs
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)  # pushed back between retries
+    claimed_by = models.CharField(max_length=100, blank=True, default='')  # host:pid of the worker
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
     
     def __str__(self):
-        return f"Analysis Request by {self.submitted_by.username} ({self.language})"
\ No newline at end of file
+        return f"Analysis Request by {self.submitted_by.username} ({self.language})"
+    
+    @classmethod
+    def for_code(cls, code, **fields):
+        """An unsaved request for ``code``, with its list view summary filled in."""
+        first_line = next((line.strip() for line in code.splitlines() if line.strip()), '')
+        return cls(
+            code=code,
+            code_preview=first_line[:100],
+            line_count=len(code.splitlines()),
+            **fields
+        )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['submitted_by', 'batch', '-submitted_at'], name='analysis_user_submitted_idx'),
+            models.Index(fields=['status', 'run_after'], name='analysis_queue_idx'),
+            models.Index(fields=['batch', 'status'], name='analysis_batch_status_idx'),
+            # Batch reports list their files by path
+            models.Index(fields=['batch', 'path'], name='analysis_batch_path_idx'),
+        ]
@@ -0,0 +1,300 @@
+"""
+Built-in Python analysis rules, registered with the engine on import.
+"""
+import ast
+
+from .engine import Rule, register
+
+MUTABLE_CONSTRUCTORS = {'list', 'dict', 'set', 'bytearray', 'defaultdict', 'deque', 'OrderedDict'}
+
+LIST_ANNOTATIONS = {'list', 'List'}
+
+# Methods that return None when nothing is found
+MAYBE_NONE_METHODS = {'first', 'last', 'match', 'search', 'fullmatch'}
+
+
+def _call_name(node):
+    """``name`` for ``name(...)`` and ``obj.name(...)`` calls, else ``None``."""
+    if isinstance(node, ast.Call):
+        if isinstance(node.func, ast.Name):
+            return node.func.id
+        if isinstance(node.func, ast.Attribute):
+            return node.func.attr
+    return None
+
+
+def _is_none(node):
+    return isinstance(node, ast.Constant) and node.value is None
+
+
+def _assigned_name(node):
+    """The target of a plain ``name = value`` assignment, else ``None``."""
+    if isinstance(node, ast.Assign):
+        if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            return node.targets[0].id
+    elif isinstance(node, ast.AnnAssign):
+        if node.value is not None and isinstance(node.target, ast.Name):
+            return node.target.id
+    return None
+
+
+class ScopedRule(Rule):
+    """
+    A rule keeping one state object per scope (module, class, function or
+    lambda body), innermost last in ``self.scopes``.
+    """
+
+    def __init__(self, issues):
+        super().__init__(issues)
+        self.scopes = [self.new_scope(None)]
+
+    @property
+    def scope(self):
+        return self.scopes[-1]
+
+    def new_scope(self, node):
+        return {}
+
+    def close_scope(self, scope):
+        pass
+
+    def enter_FunctionDef(self, node):
+        self.scopes.append(self.new_scope(node))
+
+    enter_AsyncFunctionDef = enter_Lambda = enter_ClassDef = enter_FunctionDef
+
+    def leave_FunctionDef(self, node):
+        self.close_scope(self.scopes.pop())
+
+    leave_AsyncFunctionDef = leave_Lambda = leave_ClassDef = leave_FunctionDef
+
+    def finish(self):
+        self.close_scope(self.scopes.pop())
+
+
+@register
+class BareExcept(Rule):
+    name = 'bare-except'
+    type = 'bug'
+
+    def enter_ExceptHandler(self, node):
+        if node.type is None:
+            self.report(
+                node, 'Bare "except:" also catches KeyboardInterrupt and SystemExit',
+                'Catch the exceptions you expect, or "except Exception:" at the widest',
+            )
+
+
+@register
+class MutableDefault(Rule):
+    name = 'mutable-default'
+    type = 'bug'
+    severity = 'high'
+
+    def enter_FunctionDef(self, node):
+        for default in node.args.defaults + node.args.kw_defaults:
+            if isinstance(default, (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp,
+                                    ast.SetComp)) or _call_name(default) in MUTABLE_CONSTRUCTORS:
+                self.report(
+                    default, 'Mutable default argument is shared between calls',
+                    'Default to None and create the object inside the function',
+                )
+
+    enter_AsyncFunctionDef = enter_Lambda = enter_FunctionDef
+
+
+@register
+class UnusedVariable(ScopedRule):
+    name = 'unused-variable'
+    type = 'improvement'
+    severity = 'low'
+
+    def new_scope(self, node):
+        return {
+            'function': isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)),
+            'stores': {},
+            'loads': set(),
+            'declared': set(),
+            'dynamic': False,
+        }
+
+    def close_scope(self, scope):
+        if self.scopes:
+            # Names a nested function reads may be the enclosing function's
+            self.scope['loads'] |= scope['loads']
+        if not scope['function'] or scope['dynamic']:
+            return
+        for name, node in scope['stores'].items():
+            if name not in scope['loads'] and name not in scope['declared']:
+                self.report(
+                    node, f'Local variable "{name}" is assigned but never used',
+                    'Remove the assignment, or assign to "_" if the value is deliberately ignored',
+                )
+
+    def enter_Assign(self, node):
+        name = _assigned_name(node)
+        if name and not name.startswith('_'):
+            self.scope['stores'].setdefault(name, node)
+
+    enter_AnnAssign = enter_Assign
+
+    def enter_Name(self, node):
+        if node.ctx.__class__ is not ast.Store:
+            self.scope['loads'].add(node.id)
+            if node.id == 'locals':
+                self.scope['dynamic'] = True
+
+    def enter_AugAssign(self, node):
+        if isinstance(node.target, ast.Name):
+            self.scope['loads'].add(node.target.id)
+
+    def enter_Global(self, node):
+        self.scope['declared'].update(node.names)
+
+    enter_Nonlocal = enter_Global
+
+
+@register
+class QuadraticLoop(ScopedRule):
+    """Linear list operations repeated on every iteration of a loop."""
+    name = 'quadratic-loop'
+    type = 'improvement'
+
+    def new_scope(self, node):
+        return {'lists': set(), 'loops': []}
+
+    def enter_arg(self, node):
+        annotation = node.annotation
+        if isinstance(annotation, ast.Subscript):
+            annotation = annotation.value
+        if isinstance(annotation, ast.Name) and annotation.id in LIST_ANNOTATIONS:
+            self.scope['lists'].add(node.arg)
+
+    def leave_Assign(self, node):
+        name = _assigned_name(node)
+        if name:
+            value = node.value
+            if isinstance(value, (ast.List, ast.ListComp)) or _call_name(value) in ('list', 'sorted'):
+                self.scope['lists'].add(name)
+            else:
+                self.scope['lists'].discard(name)
+
+    leave_AnnAssign = leave_Assign
+
+    def enter_For(self, node):
+        loops = self.scope['loops']
+        if isinstance(node.iter, ast.Name) and node.iter.id in loops:
+            self.report(
+                node, f'Nested loop over "{node.iter.id}" inside a loop over it is quadratic',
+                'Index the items in a dict or set keyed on what the inner loop looks for',
+            )
+        loops.append(node.iter.id if isinstance(node.iter, ast.Name) else None)
+
+    def enter_While(self, node):
+        self.scope['loops'].append(None)
+
+    enter_AsyncFor = enter_For
+    enter_ListComp = enter_SetComp = enter_DictComp = enter_GeneratorExp = enter_While
+
+    def leave_For(self, node):
+        self.scope['loops'].pop()
+
+    leave_AsyncFor = leave_While = leave_For
+    leave_ListComp = leave_SetComp = leave_DictComp = leave_GeneratorExp = leave_For
+
+    def enter_Compare(self, node):
+        scope = self.scope
+        if not scope['loops']:
+            return
+        for op, right in zip(node.ops, node.comparators):
+            if (op.__class__ in (ast.In, ast.NotIn) and isinstance(right, ast.Name)
+                    and right.id in scope['lists']):
+                self.report(
+                    node, f'Membership test on list "{right.id}" inside a loop scans the list every iteration',
+                    f'Build a set from "{right.id}" once before the loop',
+                )
+
+    def enter_Call(self, node):
+        scope = self.scope
+        func = node.func
+        if not (scope['loops'] and isinstance(func, ast.Attribute)
+                and isinstance(func.value, ast.Name) and func.value.id in scope['lists']):
+            return
+        name = func.value.id
+        if func.attr in ('index', 'count', 'remove'):
+            self.report(
+                node, f'"{name}.{func.attr}()" inside a loop scans the list every iteration',
+                'Keep a dict or set alongside the list for lookups',
+            )
+        elif (func.attr in ('insert', 'pop') and node.args
+              and isinstance(node.args[0], ast.Constant) and node.args[0].value == 0):
+            call = 'insert(0, ...)' if func.attr == 'insert' else 'pop(0)'
+            self.report(
+                node, f'"{name}.{call}" inside a loop shifts the whole list every iteration',
+                'Use collections.deque for appending and popping at the front',
+            )
+
+
+@register
+class MissingNoneCheck(ScopedRule):
+    """Values from calls that return None on a miss, used without a check."""
+    name = 'missing-none-check'
+    type = 'bug'
+    severity = 'high'
+
+    def _may_be_none(self, value):
+        if not isinstance(value, ast.Call):
+            return False
+        name = _call_name(value)
+        if name in MAYBE_NONE_METHODS:
+            return isinstance(value.func, ast.Attribute)
+        if name == 'get':
+            # dict.get(key) without a default
+            return isinstance(value.func, ast.Attribute) and len(value.args) == 1 and not value.keywords
+        if name == 'getattr':
+            return len(value.args) == 3 and _is_none(value.args[2])
+        if name == 'next':
+            return len(value.args) == 2 and _is_none(value.args[1])
+        return False
+
+    def leave_Assign(self, node):
+        # After the value has been walked, so "x = x.get(k)" is not a use
+        name = _assigned_name(node)
+        if name and self._may_be_none(node.value):
+            self.scope[name] = node
+
+    leave_AnnAssign = leave_Assign
+
+    def enter_Name(self, node):
+        if node.ctx.__class__ is ast.Store:
+            self.scope.pop(node.id, None)
+
+    def _checked(self, test):
+        scope = self.scope
+        if scope:
+            for sub in ast.walk(test):
+                if sub.__class__ is ast.Name:
+                    scope.pop(sub.id, None)
+
+    def enter_If(self, node):
+        self._checked(node.test)
+
+    enter_While = enter_IfExp = enter_Assert = enter_If
+
+    def enter_BoolOp(self, node):
+        for value in node.values[:-1]:
+            self._checked(value)
+
+    def enter_Attribute(self, node):
+        value = node.value
+        if value.__class__ is ast.Name and value.id in self.scope:
+            self._report_use(node, value.id)
+
+    enter_Subscript = enter_Attribute
+
+    def _report_use(self, node, name):
+        source = self.scope.pop(name)
+        self.report(
+            node, f'"{name}" may be None here (from the call on line {source.lineno})',
+            f'Check "if {name} is None" before using it',
+        )
@@ -1,3 +1,380 @@
+import ast
+import io
+import json
+import sys
+import tarfile
+import textwrap
+import time
+import zipfile
+import zlib
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from projects.models import Project
+
+from . import batches, cache, engine, jobs
+from .analysis import analyze
+from .models import AIAnalysisRequest, AnalysisBatch, AnalysisResult
+
+WORKER = 'test-host:1'
+
+CODE = 'def add(a, b):\n    return a + b\n'
+
+
+class AnalysisTestCase(TestCase):
+    """Adds a user to submit analyses as."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('developer', password='secret')
+
+    def queue(self, code=CODE, language='python', **fields):
+        job = AIAnalysisRequest.for_code(code, language=language, submitted_by=self.user, **fields)
+        job.save()
+        return job
+
+
+class JobQueueTests(AnalysisTestCase):
+
+    def test_jobs_are_claimed_oldest_first_once_runnable(self):
+        later = self.queue(run_after=timezone.now() + timedelta(minutes=5))
+        first = self.queue()
+        second = self.queue()
+        self.assertEqual(jobs.claim(WORKER).id, first.id)
+        self.assertEqual(jobs.claim('other-host:2').id, second.id)
+        self.assertIsNone(jobs.claim(WORKER))
+
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.claimed_by, first.attempts), ('processing', WORKER, 1))
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'pending')
+
+    def test_finished_job_stores_its_result(self):
+        job = self.queue()
+        self.assertTrue(jobs.run(jobs.claim(WORKER)))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertFalse(job.cache_hit)
+        self.assertIn('issues', job.result.results)
+
+    def test_job_over_its_time_limit_is_retried_later_then_failed(self):
+        job = self.queue()
+
+        def slow(code, language):
+            time.sleep(5)
+
+        with mock.patch.object(jobs, 'analyze', slow), self.assertLogs(jobs.logger, 'WARNING'):
+            started = time.monotonic()
+            self.assertFalse(jobs.run(jobs.claim(WORKER), timeout=0.1, max_attempts=2))
+            self.assertLess(time.monotonic() - started, 2)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.claimed_by), ('pending', ''))
+            self.assertIn('longer than 0.1 seconds', job.error)
+            # Backed off, so not claimed straight away
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIsNone(jobs.claim(WORKER))
+
+            AIAnalysisRequest.objects.filter(id=job.id).update(run_after=timezone.now())
+            jobs.run(jobs.claim(WORKER), timeout=0.1, max_attempts=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_failing_analysis_records_the_error(self):
+        job = self.queue()
+        with mock.patch.object(jobs, 'analyze', side_effect=ValueError('unparseable')), \
+                self.assertLogs(jobs.logger, 'WARNING'):
+            jobs.run(jobs.claim(WORKER), max_attempts=1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('ValueError: unparseable', job.error)
+
+    def test_jobs_of_a_silent_worker_are_requeued_or_failed(self):
+        retried = self.queue()
+        exhausted = self.queue(attempts=jobs.DEFAULT_MAX_ATTEMPTS - 1)
+        alive = self.queue()
+        for job in (retried, exhausted, alive):
+            jobs.claim(WORKER)
+        AIAnalysisRequest.objects.exclude(id=alive.id).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=jobs.STALE_SECONDS + 1)
+        )
+
+        self.assertEqual(jobs.requeue_stale(), 2)
+        statuses = dict(AIAnalysisRequest.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {retried.id: 'pending', exhausted.id: 'failed', alive.id: 'processing'})
+
+    def test_outcome_of_a_job_taken_over_is_not_recorded(self):
+        job = self.queue()
+        claimed = jobs.claim(WORKER)
+        AIAnalysisRequest.objects.filter(id=job.id).update(claimed_by='other-host:2')
+        self.assertTrue(jobs.run(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('processing', None))
+
+
+class ResultCacheTests(AnalysisTestCase):
+
+    def store(self, code, **fields):
+        entry = cache.store(cache.cache_key(code, 'python'), 'python', analyze(code, 'python'))
+        if fields:
+            AnalysisResult.objects.filter(id=entry.id).update(**fields)
+        return entry
+
+    def test_formatting_noise_keeps_the_key_and_content_changes_it(self):
+        key = cache.cache_key(CODE, 'python')
+        self.assertEqual(cache.cache_key('\r\n' + CODE.replace('\n', '  \r\n') + '\n\n', 'python'), key)
+        self.assertNotEqual(cache.cache_key(CODE.replace('+', '-'), 'python'), key)
+        self.assertNotEqual(cache.cache_key(CODE, 'javascript'), key)
+        self.assertNotEqual(cache.cache_key(CODE, 'python', version='0'), key)
+
+    def test_code_analyzed_before_is_answered_at_submission(self):
+        self.client.login(username='developer', password='secret')
+        first = self.queue()
+        jobs.run(jobs.claim(WORKER))
+        first.refresh_from_db()
+
+        self.client.post(reverse('ai_debugger:submit_analysis'), {'code': CODE + '\n', 'language': 'python'})
+        again = AIAnalysisRequest.objects.latest('id')
+        self.assertEqual((again.status, again.cache_hit, again.result_id), ('completed', True, first.result_id))
+        self.assertEqual(AnalysisResult.objects.count(), 1)
+        self.assertEqual(cache.stats()['hit_rate'], 0.5)
+
+    def test_job_queued_before_an_identical_one_finished_is_completed_from_the_cache(self):
+        first, second = self.queue(), self.queue()
+        jobs.run(jobs.claim(WORKER))
+        with mock.patch.object(jobs, 'analyze') as analyzer:
+            self.assertTrue(jobs.run(jobs.claim(WORKER)))
+        analyzer.assert_not_called()
+        second.refresh_from_db()
+        self.assertTrue(second.cache_hit)
+
+    def test_prune_evicts_expired_outdated_and_least_recently_used_entries(self):
+        now = timezone.now()
+        expired = self.store('x = 1', last_used_at=now - timedelta(days=cache.TTL_DAYS + 1))
+        outdated = self.store('x = 2', analyzer_version='0')
+        oldest = self.store('x = 3', last_used_at=now - timedelta(days=2))
+        newest = self.store('x = 4', last_used_at=now - timedelta(days=1))
+        self.queue('x = 1', status='completed', result=expired)
+
+        self.assertEqual(cache.prune(max_entries=1), (3, 2))
+        self.assertEqual(list(AnalysisResult.objects.filter(cache_key__isnull=False)), [newest])
+        # Still referenced, so kept without its key
+        self.assertTrue(AnalysisResult.objects.filter(id=expired.id).exists())
+        self.assertFalse(AnalysisResult.objects.filter(id__in=[outdated.id, oldest.id]).exists())
+
+
+class RuleEngineTests(TestCase):
+
+    def found(self, code):
+        """``(rule, line)`` for every issue in ``code``."""
+        results = analyze(textwrap.dedent(code), 'python')
+        return [(issue['rule'], issue['line']) for issue in results['issues']]
+
+    def test_bare_except_and_mutable_defaults(self):
+        self.assertEqual(self.found("""
+            def load(path, seen=[], *, cache=dict()):
+                try:
+                    return open(path)
+                except:
+                    return None
+            """), [('mutable-default', 2), ('mutable-default', 2), ('bare-except', 5)])
+        self.assertEqual(self.found("""
+            def load(path, seen=None):
+                try:
+                    return open(path)
+                except OSError:
+                    return None
+            """), [])
+
+    def test_unused_variables_in_functions_only(self):
+        self.assertEqual(self.found("""
+            total = 0
+            def report(rows):
+                count = len(rows)
+                _ignored = rows[0]
+                shown = 0
+                for row in rows:
+                    shown += 1
+                def inner():
+                    return count
+                return inner
+            def dynamic():
+                hidden = 1
+                return locals()
+            """), [])
+        self.assertEqual(self.found("""
+            def report(rows):
+                count = len(rows)
+                return rows
+            """), [('unused-variable', 3)])
+
+    def test_linear_list_work_inside_loops(self):
+        self.assertEqual(self.found("""
+            def match(names: list, wanted):
+                picked = []
+                for name in wanted:
+                    if name in names:
+                        picked.insert(0, name)
+                    names.remove(name)
+                for name in wanted:
+                    for other in wanted:
+                        pass
+                return picked
+            """), [('quadratic-loop', 5), ('quadratic-loop', 6), ('quadratic-loop', 7), ('quadratic-loop', 9)])
+        self.assertEqual(self.found("""
+            def match(names: list, wanted):
+                names = set(names)
+                return [name for name in wanted if name in names]
+            """), [])
+
+    def test_values_that_may_be_none_used_unchecked(self):
+        self.assertEqual(self.found("""
+            import re
+            def parse(text, options):
+                match = re.match(r'\\d+', text)
+                limit = options.get('limit')
+                if limit:
+                    print(limit.real)
+                return match.group(0)
+            """), [('missing-none-check', 8)])
+
+    def test_syntax_errors_and_other_languages(self):
+        self.assertEqual(self.found('def broken(:\n'), [('syntax-error', 1)])
+        self.assertEqual(analyze('x = 1', 'javascript')['issues'], [])
+
+    def test_tree_is_walked_without_recursion(self):
+        tree = ast.parse('x = ' + ' + '.join(['a'] * 900))
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(300)
+        try:
+            issues, spent = engine.run(tree)
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertEqual(issues, [])
+        self.assertEqual(set(spent), {rule.name for rule in engine.RULES})
+
+
+@mock.patch.object(batches, 'MAX_FILE_BYTES', 200)
+class BatchTests(AnalysisTestCase):
+
+    FILES = {
+        'repo/app.py': CODE,
+        'repo/../../etc/settings.py': 'def load(options={}):\n    return options\n',
+        'repo/node_modules/lib.py': CODE,
+        'repo/web/app.js': 'let x = 1;\n',
+        'repo/empty.py': '\n',
+        'repo/huge.py': 'x = 1\n' * 100,
+        'repo/binary.py': b'\xff\xfe\x00',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(name='Tracker', description='', manager=self.user)
+
+    def zip(self, files):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        return buffer
+
+    def tarball(self, files):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            for name, content in files.items():
+                data = content.encode() if isinstance(content, str) else content
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return buffer
+
+    def submit(self, archive, **kwargs):
+        return batches.create_batch(archive, self.user, 'repo', self.project, **kwargs)
+
+    def test_files_of_the_chosen_languages_are_queued(self):
+        for archive in (self.zip(self.FILES), self.tarball(self.FILES)):
+            with self.subTest(archive=archive):
+                batch = self.submit(archive)
+                self.assertEqual((batch.file_count, batch.skipped_count), (2, 3))
+                # Parent directory references cannot lead out of the archive
+                self.assertEqual(sorted(batch.files.values_list('path', flat=True)),
+                                 ['repo/app.py', 'repo/etc/settings.py'])
+        batch = self.submit(self.zip(self.FILES), languages=['python', 'javascript'])
+        self.assertIn('repo/web/app.js', batch.files.values_list('path', flat=True))
+
+    def test_report_is_written_once_every_file_is_analyzed(self):
+        batch = self.submit(self.zip(self.FILES))
+        self.assertFalse(batches.finalize(batch))
+        jobs.work(WORKER, drain=True)
+        self.assertTrue(batches.finalize(batch))
+
+        report = json.loads(AnalysisBatch.objects.get(id=batch.id).report)
+        self.assertEqual([(file['path'], file['issues']) for file in report['files']],
+                         [('repo/app.py', 0), ('repo/etc/settings.py', 1)])
+        self.assertEqual(report['rules']['mutable-default']['files'], 1)
+        self.assertEqual(report['totals']['by_severity'], {'high': 1})
+
+    def test_unchanged_files_of_a_reupload_are_not_analyzed_again(self):
+        self.submit(self.zip(self.FILES))
+        jobs.work(WORKER, drain=True)
+        changed = {**self.FILES, 'repo/app.py': CODE + 'print(add(1, 2))\n'}
+        batch = self.submit(self.tarball(changed))
+        self.assertEqual((batch.file_count, batch.reused_count), (2, 1))
+        self.assertEqual(list(batch.files.filter(status='pending').values_list('path', flat=True)),
+                         ['repo/app.py'])
+
+    def test_unreadable_archive_saves_nothing(self):
+        with self.assertRaises(batches.ArchiveError):
+            self.submit(io.BytesIO(b'PK\x03\x04 not really a zip'))
+        self.assertFalse(AnalysisBatch.objects.exists())
+
+    def test_archive_with_too_many_files_saves_nothing(self):
+        with mock.patch.object(batches, 'MAX_FILES', 1), self.assertRaises(batches.ArchiveError):
+            self.submit(self.zip(self.FILES))
+        self.assertFalse(AIAnalysisRequest.objects.exists())
+
+
+class CompressedStorageTests(AnalysisTestCase):
+
+    def raw(self, table, column, row_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {column} FROM {table} WHERE id = %s', [row_id])
+            return bytes(cursor.fetchone()[0])
+
+    def test_code_and_results_round_trip_compressed(self):
+        code = 'def add(a, b):\n    return a + b  # ünïcode\n' * 50
+        job = self.queue(code)
+        jobs.run(jobs.claim(WORKER))
+        job = AIAnalysisRequest.objects.select_related('result').get(id=job.id)
+        self.assertEqual(job.code, code)
+        self.assertEqual(job.result.results['issues'], analyze(code, 'python')['issues'])
+
+        stored = self.raw(AIAnalysisRequest._meta.db_table, 'code', job.id)
+        self.assertEqual(zlib.decompress(stored).decode(), code)
+        self.assertLess(len(stored), len(code.encode()) / 5)
+        self.assertEqual(json.loads(zlib.decompress(self.raw(AnalysisResult._meta.db_table, 'results',
+                                                             job.result_id))),
+                         job.result.results)
+
+    def test_summary_columns_are_filled_from_the_results(self):
+        job = self.queue('def load(options={}):\n    return options\n')
+        jobs.run(jobs.claim(WORKER))
+        job.refresh_from_db()
+        self.assertEqual(job.code_preview, 'def load(options={}):')
+        self.assertEqual((job.line_count, job.result.issue_count, job.result.high_count), (2, 1, 1))
 
-# Create your tests here.
+    def test_history_reads_neither_code_nor_results(self):
+        self.queue()
+        jobs.run(jobs.claim(WORKER))
+        self.client.login(username='developer', password='secret')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ai_debugger:analysis_history'))
+        self.assertContains(response, 'def add(a, b):')
+        for query in queries:
+            self.assertNotIn('"code"', query['sql'])
+            self.assertNotIn('"results"', query['sql'])
@@ -8,4 +8,9 @@ urlpatterns = [
     path('submit/', views.submit_analysis, name='submit_analysis'),
     path('history/', views.analysis_history, name='analysis_history'),
     path('results/<int:analysis_id>/', views.analysis_results, name='analysis_results'),
+    path('results/<int:analysis_id>/status/', views.analysis_status, name='analysis_status'),
+    path('batches/', views.batch_list, name='batch_list'),
+    path('batches/submit/', views.submit_batch, name='submit_batch'),
+    path('batches/<int:batch_id>/', views.batch_detail, name='batch_detail'),
+    path('batches/<int:batch_id>/status/', views.batch_status, name='batch_status'),
 ]
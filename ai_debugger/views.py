@@ -1,16 +1,24 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import AIAnalysisRequest
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.utils import timezone
+from projects.models import Project
+from . import batches, cache
+from .models import AIAnalysisRequest, AnalysisBatch
 import json
 
+# Files listed per page of a batch report
+BATCH_FILES_PER_PAGE = 100
+
 @login_required
 def analysis_home(request):
     """Home page for AI code analysis feature."""
     # Get user's recent analyses
     recent_analyses = AIAnalysisRequest.objects.filter(
-        submitted_by=request.user
-    ).order_by('-submitted_at')[:5]
+        submitted_by=request.user, batch__isnull=True
+    ).defer('code').order_by('-submitted_at')[:5]
     
     return render(request, 'ai_debugger/home.html', {
         'recent_analyses': recent_analyses
@@ -27,46 +35,29 @@ def submit_analysis(request):
             messages.error(request, 'Please provide code to analyze.')
             return redirect('ai_debugger:submit_analysis')
         
-        # Create analysis request
-        analysis = AIAnalysisRequest.objects.create(
-            code=code,
+        # Code analyzed before is answered from the cache straight away
+        cached = cache.lookup(cache.cache_key(code, language))
+        if cached is not None:
+            analysis = AIAnalysisRequest.for_code(
+                code,
+                language=language,
+                submitted_by=request.user,
+                status='completed',
+                result=cached,
+                cache_hit=True,
+                finished_at=timezone.now()
+            )
+            analysis.save()
+            messages.success(request, 'This code was analyzed before; showing the stored results.')
+            return redirect('ai_debugger:analysis_results', analysis_id=analysis.id)
+        
+        # Queue the analysis; run_analysis_workers picks it up
+        analysis = AIAnalysisRequest.for_code(
+            code,
             language=language,
             submitted_by=request.user,
             status='pending'
         )
-        
-        # In a real application, you would trigger the AI analysis here
-        # For demonstration, we'll just update the status
-        
-        # Simulate AI processing
-        analysis.status = 'processing'
-        analysis.save()
-        
-        # For demo purposes, let's provide some mock results
-        mock_results = {
-            'issues': [
-                {
-                    'type': 'bug',
-                    'line': 10,
-                    'description': 'Potential null reference exception',
-                    'severity': 'high',
-                    'suggestion': 'Add null check before accessing this property'
-                },
-                {
-                    'type': 'improvement',
-                    'line': 15,
-                    'description': 'Inefficient algorithm detected',
-                    'severity': 'medium',
-                    'suggestion': 'Consider using a hash map for better performance'
-                }
-            ],
-            'summary': 'The code has 1 potential bug and 1 performance issue.',
-            'quality_score': 75
-        }
-        
-        # Save mock results
-        analysis.results = json.dumps(mock_results)
-        analysis.status = 'completed'
         analysis.save()
         
         messages.success(request, 'Your code has been submitted for analysis.')
@@ -77,8 +68,13 @@ def submit_analysis(request):
 @login_required
 def analysis_history(request):
     """View history of all analyses performed by the user."""
+    # Files of uploaded archives are listed on their batch instead. Only
+    # the summary columns are read, never the code or results.
     analyses = AIAnalysisRequest.objects.filter(
-        submitted_by=request.user
+        submitted_by=request.user, batch__isnull=True
+    ).select_related('result').only(
+        'id', 'language', 'status', 'submitted_at', 'code_preview', 'line_count', 'cache_hit',
+        'result__issue_count', 'result__high_count', 'result__quality_score'
     ).order_by('-submitted_at')
     
     return render(request, 'ai_debugger/analysis_history.html', {
@@ -88,22 +84,129 @@ def analysis_history(request):
 @login_required
 def analysis_results(request, analysis_id):
     """View the results of a specific analysis."""
-    analysis = get_object_or_404(AIAnalysisRequest, id=analysis_id)
+    analysis = get_object_or_404(
+        AIAnalysisRequest.objects.select_related('submitted_by', 'result', 'batch'), id=analysis_id
+    )
     
     # Ensure user has permission to view this analysis
     if analysis.submitted_by != request.user and not request.user.is_staff:
         messages.error(request, 'You do not have permission to view this analysis.')
         return redirect('ai_debugger:analysis_home')
     
-    # Parse the results from JSON if available
-    results = None
-    if analysis.results:
-        try:
-            results = json.loads(analysis.results)
-        except json.JSONDecodeError:
-            results = None
+    # Stored as structured data; no parsing needed
+    results = analysis.result.results if analysis.result_id else None
     
     return render(request, 'ai_debugger/analysis_results.html', {
         'analysis': analysis,
         'results': results
     })
+
+@login_required
+def analysis_status(request, analysis_id):
+    """Current status of an analysis, polled by the results page."""
+    analysis = get_object_or_404(
+        AIAnalysisRequest.objects.only('status', 'attempts', 'submitted_by_id'), id=analysis_id
+    )
+    if analysis.submitted_by_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({'error': 'not found'}, status=404)
+    
+    return JsonResponse({
+        'id': analysis.id,
+        'status': analysis.status,
+        'attempts': analysis.attempts,
+        'finished': analysis.status in ('completed', 'failed'),
+    })
+
+@login_required
+def submit_batch(request):
+    """Upload a zip file or tarball of source files for analysis."""
+    projects = Project.objects.filter(members=request.user).order_by('name')
+    
+    if request.method == 'POST':
+        upload = request.FILES.get('archive')
+        if not upload:
+            messages.error(request, 'Please choose a zip file or tarball to analyze.')
+            return redirect('ai_debugger:submit_batch')
+        
+        project = None
+        if request.POST.get('project'):
+            project = get_object_or_404(projects, id=request.POST['project'])
+        known = dict(batches.LANGUAGE_CHOICES)
+        languages = [language for language in request.POST.getlist('languages') if language in known]
+        
+        try:
+            batch = batches.create_batch(
+                upload, request.user, request.POST.get('name') or upload.name, project,
+                languages or batches.DEFAULT_LANGUAGES
+            )
+        except batches.ArchiveError as exc:
+            messages.error(request, f'Could not analyze "{upload.name}": {exc}')
+            return redirect('ai_debugger:submit_batch')
+        
+        messages.success(
+            request,
+            f'{batch.file_count} files found, {batch.file_count - batch.reused_count} queued for analysis '
+            f'({batch.reused_count} unchanged).'
+        )
+        return redirect('ai_debugger:batch_detail', batch_id=batch.id)
+    
+    return render(request, 'ai_debugger/submit_batch.html', {
+        'projects': projects,
+        'languages': batches.LANGUAGE_CHOICES,
+        'default_languages': batches.DEFAULT_LANGUAGES,
+    })
+
+@login_required
+def batch_list(request):
+    """Archives the user has submitted for analysis."""
+    analysis_batches = AnalysisBatch.objects.filter(
+        submitted_by=request.user
+    ).select_related('project').order_by('-submitted_at')
+    
+    return render(request, 'ai_debugger/batch_list.html', {
+        'batches': analysis_batches
+    })
+
+def _get_batch(request, batch_id):
+    batch = get_object_or_404(AnalysisBatch.objects.select_related('project', 'submitted_by'), id=batch_id)
+    if batch.submitted_by_id != request.user.id and not request.user.is_staff:
+        return None
+    return batch
+
+@login_required
+def batch_detail(request, batch_id):
+    """Progress of a batch, then its report once every file is done."""
+    batch = _get_batch(request, batch_id)
+    if batch is None:
+        messages.error(request, 'You do not have permission to view this analysis.')
+        return redirect('ai_debugger:batch_list')
+    
+    report = None
+    files = None
+    if batches.finalize(batch):
+        report = json.loads(batch.report)
+        # Files with the most serious problems first
+        ranked = sorted(report['files'], key=lambda file: (-file['high'], -file['issues'], file['path']))
+        files = Paginator(ranked, BATCH_FILES_PER_PAGE).get_page(request.GET.get('page'))
+    
+    return render(request, 'ai_debugger/batch_detail.html', {
+        'batch': batch,
+        'progress': batches.progress(batch),
+        'report': report,
+        'files': files,
+    })
+
+@login_required
+def batch_status(request, batch_id):
+    """File counts by status, polled by the batch page."""
+    batch = _get_batch(request, batch_id)
+    if batch is None:
+        return JsonResponse({'error': 'not found'}, status=404)
+    
+    progress = batches.progress(batch)
+    return JsonResponse({
+        'id': batch.id,
+        'files': batch.file_count,
+        'progress': progress,
+        'finished': not any(progress[status] for status in batches.UNFINISHED),
+    })
@@ -0,0 +1,36 @@
+"""
+Who may see which bugs.
+
+A bug, with its comments, history and attachments, is shown to staff and
+to the manager and members of its project.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from projects.models import Project
+
+
+def visible_projects(user):
+    """The projects whose bugs ``user`` may see."""
+    if user.is_staff:
+        return Project.objects.all()
+    # A subquery rather than a join, so projects are not repeated
+    memberships = Project.members.through.objects.filter(user_id=user.id).values('project_id')
+    return Project.objects.filter(Q(manager_id=user.id) | Q(id__in=memberships))
+
+
+def can_view_project(user, project):
+    return user.is_staff or user.id == project.manager_id or project.members.filter(id=user.id).exists()
+
+
+def visible_bugs(user, bugs):
+    """Restrict the ``bugs`` queryset to those ``user`` may see."""
+    if user.is_staff:
+        return bugs
+    return bugs.filter(project_id__in=visible_projects(user).values('id'))
+
+
+def project_members(project):
+    """The users who work on ``project``, and so may be assigned its bugs: its manager and members."""
+    memberships = Project.members.through.objects.filter(project_id=project.id).values('user_id')
+    return User.objects.filter(Q(id=project.manager_id) | Q(id__in=memberships))
@@ -1,9 +1,19 @@
 from django.contrib import admin
-from .models import Bug, BugAttachment, BugComment, BugHistory
+from .models import AttachmentBlob, Bug, BugAttachment, BugComment, BugHistory, BugTag, ProjectBugStats, Tag
+
+class BugTagInline(admin.TabularInline):
+    model = BugTag
+    extra = 0
+    autocomplete_fields = ('tag',)
 
 class BugAttachmentInline(admin.TabularInline):
     model = BugAttachment
     extra = 0
+    readonly_fields = ('blob', 'filename', 'uploaded_by', 'uploaded_at')
+    
+    def has_add_permission(self, request, obj=None):
+        # Attachments are uploaded from the bug page
+        return False
 
 class BugCommentInline(admin.TabularInline):
     model = BugComment
@@ -12,7 +22,7 @@ class BugCommentInline(admin.TabularInline):
 class BugHistoryInline(admin.TabularInline):
     model = BugHistory
     extra = 0
-    readonly_fields = ('user', 'action', 'timestamp')
+    readonly_fields = ('user', 'event', 'action', 'timestamp')
     can_delete = False
     
     def has_add_permission(self, request, obj=None):
@@ -22,15 +32,31 @@ class BugHistoryInline(admin.TabularInline):
 class BugAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'project', 'status', 'priority', 'severity', 'reported_by', 'assigned_to')
     list_filter = ('status', 'priority', 'severity', 'project')
-    search_fields = ('title', 'description', 'tags')
-    inlines = [BugAttachmentInline, BugCommentInline, BugHistoryInline]
+    search_fields = ('title', 'description', 'tags__name')
+    inlines = [BugTagInline, BugAttachmentInline, BugCommentInline, BugHistoryInline]
     date_hierarchy = 'created_at'
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
 @admin.register(BugAttachment)
 class BugAttachmentAdmin(admin.ModelAdmin):
     list_display = ('bug', 'filename', 'uploaded_by', 'uploaded_at')
     list_filter = ('uploaded_at', 'uploaded_by')
     search_fields = ('filename', 'bug__title')
+    raw_id_fields = ('bug', 'blob')
+
+@admin.register(AttachmentBlob)
+class AttachmentBlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'size', 'stored_size', 'compressed', 'references', 'created_at')
+    list_filter = ('compressed',)
+    search_fields = ('digest',)
+    
+    def has_change_permission(self, request, obj=None):
+        # Reference counts are maintained automatically
+        return False
 
 @admin.register(BugComment)
 class BugCommentAdmin(admin.ModelAdmin):
@@ -40,7 +66,16 @@ class BugCommentAdmin(admin.ModelAdmin):
 
 @admin.register(BugHistory)
 class BugHistoryAdmin(admin.ModelAdmin):
-    list_display = ('bug', 'user', 'action', 'timestamp')
-    list_filter = ('timestamp', 'user')
+    list_display = ('bug', 'user', 'event', 'action', 'timestamp')
+    list_filter = ('event', 'field', 'timestamp', 'user')
     search_fields = ('action', 'bug__title')
-    readonly_fields = ('bug', 'user', 'action', 'timestamp')
+    readonly_fields = ('bug', 'user', 'event', 'field', 'old_value', 'new_value', 'action', 'timestamp')
+
+@admin.register(ProjectBugStats)
+class ProjectBugStatsAdmin(admin.ModelAdmin):
+    list_display = ('project', 'total', 'status_open', 'status_in_progress', 'status_resolved',
+                    'status_closed', 'open_unassigned')
+    
+    def has_change_permission(self, request, obj=None):
+        # Maintained automatically; use reconcile_bug_stats to repair
+        return False
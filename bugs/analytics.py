@@ -0,0 +1,293 @@
+"""
+Cycle-time, time-in-status and time-to-resolve analytics.
+
+``refresh`` walks history newer than the last entry processed in id-ordered
+windows and folds each window's status transitions, in (bug, timestamp)
+order, into one ``BugCycleTime`` row per bug. ``CycleTimeProgress`` records
+the last entry read, status change or not, so the audit log is read once
+however often the numbers are asked for.
+``summary`` then loads one flat ``array('d')`` of durations per metric for
+the selected bugs, sorts it once and reads percentiles and histogram
+counts straight off the sorted values. ``cached_summary`` catches up on
+history at most once every ``REFRESH_SECONDS`` (``manage.py
+refresh_cycle_times`` can also run on a schedule) and keeps results until
+the next catch-up moves on.
+"""
+import hashlib
+import json
+import math
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models import Q
+
+from .models import Bug, BugCycleTime, BugHistory, CycleTimeProgress
+
+# Metric name -> BugCycleTime column
+METRICS = {
+    'lead': 'lead_seconds',
+    'resolve': 'resolve_seconds',
+    'cycle': 'cycle_seconds',
+    **{f'in_{status}': f'{status}_seconds' for status in BugCycleTime.STATUSES},
+}
+
+METRIC_LABELS = {
+    'lead': 'Lead time (created to closed)',
+    'resolve': 'Time to resolve',
+    'cycle': 'Cycle time (in progress to resolved)',
+    **{f'in_{value}': f'Time in {label}' for value, label in Bug.STATUS_CHOICES},
+}
+
+# Filter / breakdown name -> lookup from BugCycleTime
+DIMENSIONS = {
+    'project': 'bug__project_id',
+    'version': 'bug__project_version_id',
+    'assignee': 'bug__assigned_to_id',
+    'priority': 'bug__priority',
+}
+
+PERCENTILES = (50, 90, 99)
+
+# Upper bounds (in hours) of the histogram buckets; the last bucket is open
+HISTOGRAM_EDGES = (1, 4, 24, 72, 168, 720, 2160)
+HISTOGRAM_LABELS = ('< 1h', '1-4h', '4-24h', '1-3d', '3-7d', '7-30d', '30-90d', '> 90d')
+
+# History entries read per query, and bugs written per statement
+REFRESH_WINDOW = 20000
+REFRESH_BATCH_SIZE = 2000
+
+SAVED_FIELDS = (
+    'bug', 'status', 'status_since', 'started_at', 'reopen_count', 'last_history_id',
+    *METRICS.values(),
+)
+
+SUMMARY_CHUNK_SIZE = 5000
+
+# Pages catch up on new history at most this often, so the numbers can be
+# this far behind
+REFRESH_SECONDS = 60
+
+# Results are keyed on the newest history id processed; this bounds
+# staleness from edits that do not write history (such as reassigning in
+# the edit form).
+CACHE_SECONDS = 300
+
+
+class AnalyticsParamError(ValueError):
+    pass
+
+
+def parse_params(params):
+    """
+    Read ``project``, ``version``, ``assignee``, ``priority`` filters and
+    ``by`` from a QueryDict. Raises ``AnalyticsParamError`` for bad values.
+    """
+    filters = {}
+    for name in ('project', 'version', 'assignee'):
+        value = params.get(name)
+        if value:
+            if not value.isdigit():
+                raise AnalyticsParamError(f'{name} must be an id')
+            filters[name] = int(value)
+    priority = params.get('priority')
+    if priority:
+        if priority not in dict(Bug.PRIORITY_CHOICES):
+            raise AnalyticsParamError(f'unknown priority "{priority}"')
+        filters['priority'] = priority
+    by = params.get('by') or None
+    if by and by not in DIMENSIONS:
+        raise AnalyticsParamError(f'by must be one of {", ".join(DIMENSIONS)}')
+    return filters, by
+
+
+def _history_window(after_id, size):
+    """The next ``size`` history entries after ``after_id``, in id order."""
+    # Filtering on field/event here would make SQLite prefer those indexes
+    # over the primary key range and sort every status entry ever written
+    return list(
+        BugHistory.objects.filter(id__gt=after_id).order_by('id')
+        .values_list('id', 'bug_id', 'event', 'field', 'new_value', 'timestamp')[:size]
+    )
+
+
+def _replay(groups):
+    """Fold each ``(bug_id, entries)`` group into its BugCycleTime row."""
+    bug_ids = [bug_id for bug_id, _ in groups]
+    existing = BugCycleTime.objects.in_bulk(bug_ids)
+    bugs = {
+        bug_id: (created_at, status, resolved_at)
+        for bug_id, created_at, status, resolved_at in Bug.objects.filter(
+            id__in=bug_ids
+        ).values_list('id', 'created_at', 'status', 'resolved_at')
+    }
+
+    cycles = []
+    for bug_id, entries in groups:
+        if bug_id not in bugs:
+            continue
+        created_at, status, resolved_at = bugs[bug_id]
+        cycle = existing.get(bug_id)
+        if cycle is None:
+            cycle = BugCycleTime(bug_id=bug_id, status='open', status_since=created_at)
+        cycles.append(cycle)
+
+        for history_id, _, event, _, new_value, timestamp in entries:
+            if history_id <= cycle.last_history_id:
+                continue
+            cycle.last_history_id = history_id
+            if event == 'imported' and status != 'open':
+                # Imported bugs arrive in their final state with no transitions
+                cycle.enter(status, resolved_at or created_at, created_at)
+            elif event == 'changed' and new_value != cycle.status:
+                cycle.enter(new_value, timestamp, created_at)
+
+    _save(cycles)
+
+
+def _save(cycles):
+    """Upsert BugCycleTime rows with one prepared statement."""
+    # bulk_create and bulk_update spend most of their time preparing values
+    # and building SQL; only the datetimes here need adapting
+    fields = [BugCycleTime._meta.get_field(name) for name in SAVED_FIELDS]
+    columns = [field.column for field in fields]
+    attnames = [field.attname for field in fields]
+    adapt = connection.ops.adapt_datetimefield_value
+    datetimes = {field.attname for field in fields if isinstance(field, models.DateTimeField)}
+    table = connection.ops.quote_name(BugCycleTime._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT (bug_id) DO UPDATE SET "
+            + ', '.join(f'{column} = excluded.{column}' for column in columns[1:]),
+            [
+                [adapt(getattr(cycle, name)) if name in datetimes else getattr(cycle, name)
+                 for name in attnames]
+                for cycle in cycles
+            ],
+        )
+
+
+def refresh(window=REFRESH_WINDOW, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Fold history entries newer than the last processed one into
+    ``BugCycleTime``. Returns the number of status entries applied.
+    """
+    processed = 0
+    with transaction.atomic():
+        progress, _ = CycleTimeProgress.objects.select_for_update().get_or_create(pk=1)
+        after_id = progress.last_history_id
+        while True:
+            entries = _history_window(after_id, window)
+            if not entries:
+                break
+            after_id = entries[-1][0]
+
+            # Status transitions of each bug in (bug, timestamp) order
+            entries = sorted(
+                (entry for entry in entries
+                 if entry[3] == 'status' or entry[2] in ('created', 'imported')),
+                key=lambda entry: (entry[1], entry[5], entry[0]),
+            )
+            processed += len(entries)
+            groups = [
+                (bug_id, list(group))
+                for bug_id, group in groupby(entries, key=lambda entry: entry[1])
+            ]
+            for start in range(0, len(groups), batch_size):
+                _replay(groups[start:start + batch_size])
+        if after_id != progress.last_history_id:
+            progress.last_history_id = after_id
+            progress.save(update_fields=['last_history_id'])
+    return processed
+
+
+def rebuild():
+    """Recompute every BugCycleTime row from the full history."""
+    with transaction.atomic():
+        BugCycleTime.objects.all().delete()
+        CycleTimeProgress.objects.update(last_history_id=0)
+        return refresh()
+
+
+def describe(values):
+    """
+    Count, mean, percentiles and histogram of an ``array('d')`` of hours.
+    """
+    values = array('d', sorted(values))
+    count = len(values)
+    if not count:
+        return {'count': 0, 'mean': None,
+                **{f'p{pct}': None for pct in PERCENTILES},
+                'histogram': [0] * len(HISTOGRAM_LABELS)}
+
+    # Histogram counts are differences between insertion points of the edges
+    bounds = [0] + [bisect_left(values, edge) for edge in HISTOGRAM_EDGES] + [count]
+    return {
+        'count': count,
+        'mean': round(math.fsum(values) / count, 2),
+        # Nearest-rank percentiles
+        **{f'p{pct}': round(values[max(math.ceil(pct / 100 * count) - 1, 0)], 2)
+           for pct in PERCENTILES},
+        'histogram': [high - low for low, high in zip(bounds, bounds[1:])],
+    }
+
+
+def summary(filters=None, by=None, project_ids=None):
+    """
+    Distributions of every metric, in hours, over bugs matching ``filters``
+    (a dict keyed by ``DIMENSIONS``), within ``project_ids`` if given. With
+    ``by``, ``groups`` maps each value of that dimension to its own metrics.
+    """
+    rows = BugCycleTime.objects.filter(
+        **{DIMENSIONS[name]: value for name, value in (filters or {}).items()}
+    )
+    if project_ids is not None:
+        rows = rows.filter(**{f"{DIMENSIONS['project']}__in": project_ids})
+    columns = list(METRICS.values())
+    fields = columns + ([DIMENSIONS[by]] if by else [])
+
+    totals = defaultdict(lambda: array('d'))
+    groups = defaultdict(lambda: defaultdict(lambda: array('d')))
+    for row in rows.values_list(*fields).iterator(chunk_size=SUMMARY_CHUNK_SIZE):
+        group = groups[str(row[-1])] if by else None
+        for name, seconds in zip(METRICS, row):
+            # Unfinished durations and statuses never left are NULL
+            if seconds is not None:
+                totals[name].append(seconds / 3600)
+                if by:
+                    group[name].append(seconds / 3600)
+
+    result = {
+        'unit': 'hours',
+        'percentiles': list(PERCENTILES),
+        'histogram_buckets': list(HISTOGRAM_LABELS),
+        'metrics': {name: describe(totals[name]) for name in METRICS},
+    }
+    if by:
+        result['by'] = by
+        result['groups'] = {
+            key: {name: describe(values[name]) for name in METRICS}
+            for key, values in groups.items()
+        }
+    return result
+
+
+def cached_summary(filters=None, by=None, project_ids=None):
+    """``summary``, cached until newer history has been processed."""
+    # Only the first request after REFRESH_SECONDS pays for catching up
+    if cache.add('bug_analytics:refreshed', True, REFRESH_SECONDS):
+        refresh()
+    latest = CycleTimeProgress.objects.values_list('last_history_id', flat=True).first()
+    key = 'bug_analytics:' + hashlib.md5(
+        json.dumps([latest, filters or {}, by, project_ids], sort_keys=True).encode()
+    ).hexdigest()
+    result = cache.get(key)
+    if result is None:
+        result = summary(filters, by, project_ids)
+        cache.set(key, result, CACHE_SECONDS)
+    return result
@@ -0,0 +1,334 @@
+"""
+Content-addressed, deduplicated storage for bug attachments.
+
+Every attachment's content lives in one ``AttachmentBlob``, named by its
+digest: the SHA-256 of the concatenated SHA-256 digests of its
+``BLOCK_SIZE`` blocks. Hashing block by block lets a chunked upload be
+hashed as it streams in and resumed in a later request, since each
+request only adds whole blocks to the digests already stored on the
+``AttachmentUpload``. Identical content attached to ten bugs is stored
+once; ``references`` counts the attachments and finished uploads using a
+blob, and the blob's file is deleted when the last of them goes (see the
+signal handlers in ``bugs.signals``).
+
+An upload is started with its size, then sent in chunks at increasing
+offsets. Every chunk but the last must be a whole number of blocks, so a
+dropped connection only loses the block being sent. Once the last byte
+arrives the part file becomes a blob: if the content is already stored
+the part file is simply dropped, otherwise it is moved into the blob
+store, gzip-compressed first when it is text (logs, stack traces, JSON).
+A finished upload is then attached to a bug by ``create_bug`` or
+``add_attachment``; plain form uploads go through the same path.
+
+Uploads left unfinished or unattached for ``UPLOAD_EXPIRY`` are removed
+by ``manage.py purge_attachment_uploads``.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import secrets
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AttachmentBlob, AttachmentUpload, BugAttachment
+from .storage import attachment_storage
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Chunk size suggested to the browser; any whole number of blocks is accepted
+CHUNK_SIZE = 2 * BLOCK_SIZE
+
+# Bytes read from the request or file at a time
+READ_SIZE = 256 * 1024
+
+MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+BLOB_DIR = 'attachment_blobs'
+PART_DIR = 'attachment_uploads'
+
+COMPRESSION_LEVEL = 6
+
+# Bytes inspected to decide whether a file without a known text type is text
+SNIFF_BYTES = 8192
+
+UPLOAD_EXPIRY = timedelta(days=1)
+
+
+class UploadError(ValueError):
+    """A chunk or upload that cannot be accepted; the upload's ``received`` says where to resume."""
+
+
+def storage_path(name):
+    """The filesystem path of the stored file ``name``, with its directory created."""
+    path = attachment_storage().path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    return storage_path(f'{PART_DIR}/{upload.id}.part')
+
+
+def lock_file(file):
+    """
+    Lock an open file for this process alone, without waiting: raises
+    BlockingIOError if it is locked already. The lock goes with the file.
+    """
+    if os.name == 'nt':
+        import msvcrt
+        # Locks the first byte, which need not exist yet
+        file.seek(0)
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as exc:
+            raise BlockingIOError(*exc.args) from None
+    else:
+        import fcntl
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def content_digest(block_digests):
+    """The digest of content whose blocks have the given concatenated SHA-256 digests."""
+    return hashlib.sha256(block_digests).hexdigest()
+
+
+def _read(source, size):
+    try:
+        return source.read(size)
+    except OSError:
+        # A dropped client connection; the caller keeps the whole blocks read so far
+        return b''
+
+
+def copy_blocks(source, target, length):
+    """
+    Copy ``length`` bytes from ``source`` to the end of ``target``, block by
+    block. Returns the concatenated SHA-256 digests of the blocks copied and
+    the number of bytes they cover; a block cut short by the end of
+    ``source`` is truncated away again.
+    """
+    digests = []
+    copied = 0
+    while copied < length:
+        wanted = min(BLOCK_SIZE, length - copied)
+        hasher = hashlib.sha256()
+        done = 0
+        while done < wanted:
+            data = _read(source, min(READ_SIZE, wanted - done))
+            if not data:
+                break
+            target.write(data)
+            hasher.update(data)
+            done += len(data)
+        if done < wanted:
+            target.truncate(target.tell() - done)
+            break
+        digests.append(hasher.digest())
+        copied += wanted
+    return b''.join(digests), copied
+
+
+def is_text(path, filename):
+    """Whether a file is text, and so worth compressing, by its name or its first bytes."""
+    content_type, encoding = mimetypes.guess_type(filename)
+    if encoding:
+        # .gz, .bz2 and the like are compressed already
+        return False
+    if content_type and content_type.startswith('text/'):
+        return True
+    with open(path, 'rb') as file:
+        sample = file.read(SNIFF_BYTES)
+    if not sample or b'\0' in sample:
+        return False
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        # The sample may end in the middle of a character
+        return exc.start >= len(sample) - 3
+    return True
+
+
+def _store(path, digest, filename):
+    """Move the part file at ``path`` into the blob store. Returns (name, stored size, compressed)."""
+    compressed = is_text(path, filename)
+    # The random suffix keeps a blob stored again right after its
+    # predecessor was deleted from losing its file to that deletion
+    name = f'{BLOB_DIR}/{digest[:2]}/{digest}-{secrets.token_hex(4)}{".gz" if compressed else ""}'
+    target = storage_path(name)
+    if compressed:
+        with open(path, 'rb') as source, open(target, 'wb') as output:
+            with gzip.GzipFile(fileobj=output, mode='wb', compresslevel=COMPRESSION_LEVEL, mtime=0) as archive:
+                shutil.copyfileobj(source, archive, READ_SIZE)
+        os.remove(path)
+    else:
+        os.replace(path, target)
+    return name, os.path.getsize(target), compressed
+
+
+def _acquire(digest):
+    """Take a reference to the blob with ``digest``, or return None if there is none."""
+    if AttachmentBlob.objects.filter(digest=digest).update(references=F('references') + 1):
+        return AttachmentBlob.objects.get(digest=digest)
+    return None
+
+
+def release(blob_id):
+    """Drop one reference to a blob, deleting it and its file when none are left."""
+    AttachmentBlob.objects.filter(id=blob_id).update(references=F('references') - 1)
+    unused = AttachmentBlob.objects.filter(id=blob_id, references=0)
+    name = unused.values_list('file', flat=True).first()
+    if name is not None and unused.delete()[0]:
+        transaction.on_commit(lambda: attachment_storage().delete(name))
+
+
+def start_upload(user, filename, size, client_key=''):
+    """
+    Begin an upload of ``size`` bytes, or return the user's unfinished
+    upload of the same file (same ``client_key``, name and size) to resume.
+    """
+    if not 0 <= size <= MAX_UPLOAD_BYTES:
+        raise UploadError(f'Attachments can be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.')
+    filename = os.path.basename(filename.replace('\\', '/'))[:100] or 'attachment'
+    if client_key:
+        upload = AttachmentUpload.objects.filter(
+            uploaded_by=user, client_key=client_key[:255], filename=filename, size=size
+        ).order_by('-updated_at').first()
+        if upload is not None:
+            return upload
+    upload = AttachmentUpload.objects.create(
+        uploaded_by=user, filename=filename, size=size, client_key=client_key[:255]
+    )
+    if size == 0:
+        open(part_path(upload), 'wb').close()
+        finish(upload)
+    return upload
+
+
+def write_chunk(upload, offset, source, length):
+    """
+    Append ``length`` bytes read from ``source`` at ``offset``, finishing
+    the upload when its last byte has arrived.
+
+    Only one request writes to an upload at a time: a chunk sent while
+    another is still streaming in (a client retrying too early) is refused
+    rather than interleaved with it.
+    """
+    end = offset + length
+    if end > upload.size:
+        raise UploadError('The chunk runs past the end of the file.')
+    if length % BLOCK_SIZE and end != upload.size:
+        raise UploadError(f'Chunks must be a multiple of {BLOCK_SIZE} bytes, except the last one.')
+
+    with open(part_path(upload), 'ab') as target:
+        try:
+            # Released when the file is closed, or the process dies
+            lock_file(target)
+        except BlockingIOError:
+            raise UploadError('Another chunk of this upload is still being received.')
+        # What an earlier holder of the lock wrote
+        upload.refresh_from_db(fields=['received', 'block_digests', 'blob'])
+        if upload.complete:
+            raise UploadError('The upload is already complete.')
+        if offset != upload.received:
+            raise UploadError(f'Expected the chunk starting at byte {upload.received}.')
+
+        # Drop anything left over from an interrupted earlier attempt
+        target.truncate(offset)
+        digests, copied = copy_blocks(source, target, length)
+        # Progress is recorded, and the part file read by finish(), only
+        # once the bytes are in it
+        target.flush()
+        upload.received += copied
+        upload.block_digests = bytes(upload.block_digests) + digests
+        upload.save(update_fields=['received', 'block_digests', 'updated_at'])
+        if copied < length:
+            raise UploadError('The chunk was cut short.')
+        if upload.received == upload.size:
+            finish(upload)
+    return upload
+
+
+def finish(upload):
+    """Turn a fully received upload's part file into (a reference to) a blob."""
+    digest = content_digest(bytes(upload.block_digests))
+    path = part_path(upload)
+    blob = _acquire(digest)
+    if blob is None:
+        name, stored_size, compressed = _store(path, digest, upload.filename)
+        try:
+            with transaction.atomic():
+                blob = AttachmentBlob.objects.create(
+                    digest=digest, size=upload.size, stored_size=stored_size,
+                    compressed=compressed, file=name, references=1,
+                )
+        except IntegrityError:
+            # Another upload of the same content finished first
+            attachment_storage().delete(name)
+            blob = _acquire(digest)
+    else:
+        os.remove(path)
+    upload.blob = blob
+    upload.save(update_fields=['blob', 'updated_at'])
+
+
+def upload_file(file, user):
+    """Store a file from ``request.FILES`` as a finished upload."""
+    upload = start_upload(user, file.name, file.size)
+    if not upload.complete:
+        file.seek(0)
+        write_chunk(upload, 0, file, file.size)
+    return upload
+
+
+def finished_uploads(user, upload_ids):
+    """The user's finished uploads among ``upload_ids`` (strings, as posted by a form)."""
+    ids = []
+    for upload_id in upload_ids:
+        try:
+            ids.append(uuid.UUID(upload_id))
+        except ValueError:
+            continue
+    return AttachmentUpload.objects.filter(id__in=ids, uploaded_by=user, blob__isnull=False)
+
+
+def attach(bug, upload, user):
+    """Attach a finished upload to ``bug``; the upload itself is deleted."""
+    with transaction.atomic():
+        attachment = BugAttachment.objects.create(
+            bug=bug, blob_id=upload.blob_id, filename=upload.filename, uploaded_by=user
+        )
+        upload.delete()
+    return attachment
+
+
+def remove_part_file(upload):
+    """Delete an upload's part file, if it still has one."""
+    try:
+        os.remove(attachment_storage().path(f'{PART_DIR}/{upload.id}.part'))
+    except FileNotFoundError:
+        pass
+
+
+def purge_stale_uploads(expiry=UPLOAD_EXPIRY):
+    """Delete uploads untouched for ``expiry``, finished or not. Returns how many were deleted."""
+    stale = AttachmentUpload.objects.filter(updated_at__lt=timezone.now() - expiry)
+    deleted = 0
+    for upload in stale.iterator():
+        with transaction.atomic():
+            upload.delete()
+        deleted += 1
+    return deleted
+
+
+def iter_content(blob):
+    """The original content of a blob, in pieces."""
+    with blob.file.open('rb') as file:
+        source = gzip.GzipFile(fileobj=file, mode='rb') if blob.compressed else file
+        while data := source.read(READ_SIZE):
+            yield data
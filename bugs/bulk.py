@@ -0,0 +1,137 @@
+"""
+Bulk changes to many bugs at once.
+
+Every bug in a bulk action receives the same new value for each changed
+field, so each field is written with one ``UPDATE ... WHERE id IN (...)``
+per batch of ids instead of one ``save()`` per bug, and all the matching
+``BugHistory`` rows go in through ``bulk_create``. Only bugs whose value
+actually changes are touched or get a history entry. The project counters
+and daily rollups are adjusted in the same transaction.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from projects.models import ProjectVersion
+
+from . import facets
+from .models import Bug, BugDailyRollup, BugHistory, ProjectBugStats
+
+BATCH_SIZE = 500
+
+# Marker for "leave this field alone", as opposed to ``None`` (e.g. unassign).
+UNCHANGED = object()
+
+
+def _batches(ids):
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def bulk_change(bugs, user, status=UNCHANGED, priority=UNCHANGED,
+                assigned_to=UNCHANGED, project_version=UNCHANGED):
+    """
+    Apply the given changes to every bug in ``bugs`` in one transaction.
+
+    ``assigned_to`` is a ``User`` or ``None`` to unassign, and
+    ``project_version`` a ``ProjectVersion`` or ``None`` to clear it; a
+    version is only applied to bugs in the version's own project. Returns
+    the number of bugs that changed.
+    """
+    with transaction.atomic():
+        rows = list(
+            bugs.select_for_update().order_by().values_list(
+                'id', 'project_id', 'status', 'priority', 'severity', 'assigned_to_id',
+                'project_version_id',
+            )
+        )
+        return _apply(rows, user, status, priority, assigned_to, project_version)
+
+
+def _apply(rows, user, status, priority, assigned_to, project_version):
+    now = timezone.now()
+    updates = []  # (ids, {field: value})
+    history = []
+    changed_ids = set()
+
+    def log(bug_id, field, old_value, new_value, action=None):
+        history.append(BugHistory.field_change(bug_id, user, field, old_value, new_value, action))
+        changed_ids.add(bug_id)
+
+    if status is not UNCHANGED:
+        ids = []
+        resolved_ids = []
+        for bug_id, _, old_status, _, _, _, _ in rows:
+            if old_status != status:
+                ids.append(bug_id)
+                log(bug_id, 'status', old_status, status)
+                if status == 'resolved':
+                    resolved_ids.append(bug_id)
+        updates.append((ids, {'status': status}))
+        updates.append((resolved_ids, {'resolved_at': now}))
+
+    if priority is not UNCHANGED:
+        ids = []
+        for bug_id, _, _, old_priority, _, _, _ in rows:
+            if old_priority != priority:
+                ids.append(bug_id)
+                log(bug_id, 'priority', old_priority, priority)
+        updates.append((ids, {'priority': priority}))
+
+    if assigned_to is not UNCHANGED:
+        new_id = assigned_to.id if assigned_to else None
+        new_name = assigned_to.username if assigned_to else ''
+        action = f"Assigned to {new_name}" if assigned_to else "Unassigned"
+        old_names = dict(User.objects.filter(
+            id__in={row[5] for row in rows if row[5] is not None}
+        ).values_list('id', 'username'))
+        ids = []
+        for bug_id, _, _, _, _, old_assignee, _ in rows:
+            if old_assignee != new_id:
+                ids.append(bug_id)
+                log(bug_id, 'assigned_to', old_names.get(old_assignee, ''), new_name, action)
+        updates.append((ids, {'assigned_to_id': new_id}))
+
+    if project_version is not UNCHANGED:
+        new_id = project_version.id if project_version else None
+        new_number = project_version.version_number if project_version else ''
+        action = f"Changed version to {new_number}" if project_version else "Cleared version"
+        old_numbers = dict(ProjectVersion.objects.filter(
+            id__in={row[6] for row in rows if row[6] is not None}
+        ).values_list('id', 'version_number'))
+        ids = []
+        for bug_id, project_id, _, _, _, _, old_version in rows:
+            if project_version and project_id != project_version.project_id:
+                continue
+            if old_version != new_id:
+                ids.append(bug_id)
+                log(bug_id, 'project_version', old_numbers.get(old_version, ''), new_number, action)
+        updates.append((ids, {'project_version_id': new_id}))
+
+    for ids, values in updates:
+        for batch in _batches(ids):
+            Bug.objects.filter(id__in=batch).update(updated_at=now, **values)
+    BugHistory.objects.bulk_create(history, batch_size=BATCH_SIZE)
+    # The UPDATEs send no signals
+    transaction.on_commit(facets.invalidate)
+
+    counted = []
+    for bug_id, project_id, old_status, old_priority, severity, old_assignee, _ in rows:
+        if bug_id not in changed_ids:
+            continue
+        old = (project_id, old_status, old_priority, severity, old_assignee)
+        new = (
+            project_id,
+            old_status if status is UNCHANGED else status,
+            old_priority if priority is UNCHANGED else priority,
+            severity,
+            old_assignee if assigned_to is UNCHANGED else (assigned_to.id if assigned_to else None),
+        )
+        counted.append((old, new))
+    ProjectBugStats.record_changes(counted)
+    BugDailyRollup.record_events(
+        event for old, new in counted
+        for event in BugDailyRollup.events_for(old, new, None, when=now)
+    )
+
+    return len(changed_ids)
@@ -0,0 +1,239 @@
+"""
+Near-duplicate detection for bug reports, with MinHash and LSH.
+
+A bug's title is reduced to its set of words and its description to its
+set of word pairs. Each set becomes a MinHash signature of ``NUM_HASHES``
+minimum hash values, and the fraction of positions where two signatures
+agree estimates the Jaccard similarity of the two sets. Each signature is
+cut into ``BANDS`` bands of ``ROWS`` values, and every band is hashed into
+a ``BugSignatureBucket`` row indexed by (project, bucket). Two texts with
+similarity ``s`` share at least one bucket with probability
+``1 - (1 - s ** ROWS) ** BANDS``, about 0.5 at ``s = 0.37`` and 0.98 at
+``s = 0.6``. A lookup therefore reads the bugs in its own few dozen buckets
+and compares their signatures, however many bugs the project has.
+
+Titles and descriptions are indexed separately, so that a title typed on
+its own can be matched against the stored titles. The signal handlers in
+``bugs.signals`` reindex a bug when its text or project changes. Imported
+bugs are left out of the import itself, which would otherwise spend most
+of its time here; ``manage.py rebuild_duplicate_index --missing`` indexes
+them afterwards, and without ``--missing`` builds the index from scratch.
+"""
+import hashlib
+import re
+import zlib
+from array import array
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Bug, BugSignature, BugSignatureBucket
+
+NUM_HASHES = 60
+BANDS = 20
+ROWS = NUM_HASHES // BANDS
+
+# Only the start of long descriptions (pasted logs, stack traces) is used
+MAX_DESCRIPTION_WORDS = 300
+
+# Buckets compared per lookup, most shared first, and the lowest
+# estimated similarity reported
+MAX_CANDIDATES = 200
+MIN_SIMILARITY = 0.3
+
+INDEX_BATCH_SIZE = 500
+
+STOP_WORDS = frozenset(
+    'a an and are as at be but by can does for from has have i if in is it its '
+    'of on or so that the then there this to was were when which while with'.split()
+)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+_MASK = (1 << 64) - 1
+
+# Fixed odd multipliers and offsets for the NUM_HASHES hash functions
+# h(x) = (a * x + b) mod 2**64, keeping the top 32 bits
+_PARAMETERS = [
+    (int.from_bytes(hashlib.blake2b(b'a%d' % i, digest_size=8).digest(), 'big') | 1,
+     int.from_bytes(hashlib.blake2b(b'b%d' % i, digest_size=8).digest(), 'big'))
+    for i in range(NUM_HASHES)
+]
+
+
+def words(text):
+    """Lowercased words of ``text`` without stop words, plurals reduced to singular."""
+    found = []
+    for word in _WORD_RE.findall((text or '').lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        # Plurals count as the same word: "crashes" and "crash"
+        if len(word) > 4 and word.endswith('es') and word[:-2].endswith(('s', 'x', 'ch', 'sh')):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        found.append(word)
+    return found
+
+
+def shingles(title, description):
+    """The title's words and the description's word pairs, as two sets."""
+    pairs = words(description)[:MAX_DESCRIPTION_WORDS]
+    return set(words(title)), {f'{first} {second}' for first, second in zip(pairs, pairs[1:])}
+
+
+def signature(items):
+    """The MinHash signature of a set of strings; empty for an empty set."""
+    if not items:
+        return array('I')
+    values = [zlib.crc32(item.encode()) for item in items]
+    return array('I', [
+        min([(a * value + b) & _MASK for value in values]) >> 32
+        for a, b in _PARAMETERS
+    ])
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    if not first or not second:
+        return 0.0
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_HASHES
+
+
+def buckets(field, sig):
+    """The LSH bucket of each band of ``sig``, as signed 64-bit integers."""
+    if not sig:
+        return []
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8,
+                                 person=f'{field}{band}'.encode())
+        keys.append(int.from_bytes(digest.digest(), 'big', signed=True))
+    return keys
+
+
+def _load(data):
+    sig = array('I')
+    sig.frombytes(data)
+    return sig
+
+
+def _write(rows):
+    """(Re)index ``(bug_id, project_id, title, description)`` rows."""
+    signatures = []
+    bucket_rows = []
+    for bug_id, project_id, title, description in rows:
+        title_shingles, description_shingles = shingles(title, description)
+        title_sig, description_sig = signature(title_shingles), signature(description_shingles)
+        signatures.append(BugSignature(
+            bug_id=bug_id, project_id=project_id,
+            title=title_sig.tobytes(), description=description_sig.tobytes(),
+        ))
+        bucket_rows.extend(
+            (bug_id, project_id, bucket)
+            for field, sig in (('t', title_sig), ('d', description_sig))
+            for bucket in buckets(field, sig)
+        )
+    ids = [sig.bug_id for sig in signatures]
+    BugSignatureBucket.objects.filter(bug_id__in=ids).delete()
+    BugSignature.objects.filter(bug_id__in=ids).delete()
+    BugSignature.objects.bulk_create(signatures)
+    # Forty rows per bug; plain executemany skips building a model for each
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO %s (bug_id, project_id, bucket) VALUES (%%s, %%s, %%s)'
+            % ops.quote_name(BugSignatureBucket._meta.db_table),
+            bucket_rows,
+        )
+
+
+def index_bug(bug):
+    """(Re)index a saved bug, skipping the writes if its text and project are unchanged."""
+    title_shingles, description_shingles = shingles(bug.title, bug.description)
+    stored = BugSignature.objects.filter(bug_id=bug.id).first()
+    if stored is not None and (
+        stored.project_id == bug.project_id
+        and bytes(stored.title) == signature(title_shingles).tobytes()
+        and bytes(stored.description) == signature(description_shingles).tobytes()
+    ):
+        return
+    with transaction.atomic():
+        _write([(bug.id, bug.project_id, bug.title, bug.description)])
+
+
+def index_bugs(bug_ids):
+    """(Re)index a batch of bugs by id."""
+    bug_ids = list(bug_ids)
+    with transaction.atomic():
+        for start in range(0, len(bug_ids), INDEX_BATCH_SIZE):
+            _write(Bug.objects.filter(id__in=bug_ids[start:start + INDEX_BATCH_SIZE]).values_list(
+                'id', 'project_id', 'title', 'description'
+            ))
+
+
+def index_missing(batch_size=INDEX_BATCH_SIZE):
+    """Index the bugs without a signature, a batch per transaction. Returns the number indexed."""
+    count = 0
+    after_id = 0
+    while True:
+        bug_ids = list(
+            Bug.objects.filter(id__gt=after_id, signature__isnull=True)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not bug_ids:
+            return count
+        index_bugs(bug_ids)
+        count += len(bug_ids)
+        after_id = bug_ids[-1]
+
+
+def rebuild_index():
+    """Reindex every bug. Returns the number indexed."""
+    count = 0
+    with transaction.atomic():
+        BugSignatureBucket.objects.all().delete()
+        BugSignature.objects.all().delete()
+        rows = Bug.objects.order_by().values_list('id', 'project_id', 'title', 'description')
+        batch = []
+        for row in rows.iterator(chunk_size=2000):
+            batch.append(row)
+            if len(batch) == INDEX_BATCH_SIZE:
+                _write(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _write(batch)
+            count += len(batch)
+    return count
+
+
+def find_duplicates(project_id, title, description='', exclude=None, limit=5):
+    """
+    ``(bug_id, similarity)`` for the bugs of the project most like the given
+    text, best first. The similarity is the higher of the title and the
+    description estimates.
+    """
+    title_shingles, description_shingles = shingles(title, description)
+    title_sig, description_sig = signature(title_shingles), signature(description_shingles)
+    keys = buckets('t', title_sig) + buckets('d', description_sig)
+    if not keys:
+        return []
+
+    candidates = BugSignatureBucket.objects.filter(project_id=project_id, bucket__in=keys)
+    if exclude is not None:
+        candidates = candidates.exclude(bug_id=exclude)
+    candidate_ids = candidates.values('bug_id').annotate(
+        shared=Count('id')
+    ).order_by('-shared').values_list('bug_id', flat=True)[:MAX_CANDIDATES]
+
+    scored = []
+    for bug_id, stored_title, stored_description in BugSignature.objects.filter(
+        bug_id__in=list(candidate_ids)
+    ).values_list('bug_id', 'title', 'description'):
+        score = max(similarity(title_sig, _load(stored_title)),
+                    similarity(description_sig, _load(stored_description)))
+        if score >= MIN_SIMILARITY:
+            scored.append((bug_id, score))
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
@@ -0,0 +1,122 @@
+"""
+Streaming export of bug lists as CSV or JSON Lines.
+
+Rows come from a single joined ``values()`` query read with
+``.iterator(chunk_size=...)``, so no model instances are built and only one
+chunk of rows is held in memory at a time, however many bugs match. The
+optional columns are correlated subqueries on indexed columns rather than
+joins, so they add no ``GROUP BY`` and keep the rows streaming.
+"""
+import csv
+import json
+
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+
+from .models import BugComment, BugHistory
+
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = ('csv', 'jsonl')
+
+# Output column -> values() lookup, always exported.
+COLUMNS = {
+    'id': 'id',
+    'title': 'title',
+    'status': 'status',
+    'priority': 'priority',
+    'severity': 'severity',
+    'project': 'project__name',
+    'version': 'project_version__version_number',
+    'reported_by': 'reported_by__username',
+    'assigned_to': 'assigned_to__username',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'resolved_at': 'resolved_at',
+}
+
+# Columns that are only exported on request (``?include=<name>``).
+OPTIONAL_COLUMNS = ('comment_count', 'last_activity', 'resolution_hours')
+
+
+def comment_count():
+    """The number of comments on each bug, as an annotation."""
+    return Subquery(
+        BugComment.objects.filter(bug_id=OuterRef('id'))
+        .order_by().values('bug_id').annotate(count=Count('id')).values('count'),
+        output_field=IntegerField(),
+    )
+
+
+def last_activity():
+    """When each bug last had history written, as an annotation."""
+    return Subquery(
+        BugHistory.objects.filter(bug_id=OuterRef('id'))
+        .order_by().values('bug_id').annotate(last=Max('timestamp')).values('last')
+    )
+
+
+def export_columns(include=()):
+    """Return the ordered column names for the given optional columns."""
+    return list(COLUMNS) + [name for name in OPTIONAL_COLUMNS if name in include]
+
+
+def export_rows(queryset, columns):
+    """Yield one dict per bug in ``queryset`` with exactly ``columns`` as keys."""
+    annotations = {}
+    if 'comment_count' in columns:
+        annotations['export_comment_count'] = comment_count()
+    if 'last_activity' in columns:
+        annotations['export_last_activity'] = last_activity()
+
+    rows = (
+        queryset.annotate(**annotations)
+        .order_by('-created_at', '-id')
+        .values(*COLUMNS.values(), *annotations)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for row in rows:
+        record = {name: row[lookup] for name, lookup in COLUMNS.items()}
+        if 'comment_count' in columns:
+            record['comment_count'] = row['export_comment_count'] or 0
+        if 'last_activity' in columns:
+            record['last_activity'] = row['export_last_activity']
+        if 'resolution_hours' in columns:
+            resolved_at = row['resolved_at']
+            record['resolution_hours'] = (
+                round((resolved_at - row['created_at']).total_seconds() / 3600, 2)
+                if resolved_at else None
+            )
+        yield {name: record[name] for name in columns}
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose ``write`` just hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    """Yield CSV lines: a header, then one line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(row[name]) for name in columns])
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def stream_jsonl(rows):
+    """Yield one JSON object per line; empty values are ``null``."""
+    for row in rows:
+        yield json.dumps(row, default=_json_default) + '\n'
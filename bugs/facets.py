@@ -0,0 +1,120 @@
+"""
+Facet counts for the bug search page.
+
+Every facet count honours all of the *other* active filters, so picking a
+status narrows the priority counts but not the status counts themselves.
+All five facets come from a single ``GROUP BY`` over the facet columns; the
+grouped rows are then folded into per-facet counters in Python, so the
+database work does not grow with the number of options shown.
+
+That grouping still reads every matching bug, so ``cached_facet_counts``
+keeps the result per search until a bug changes, and for at most
+``CACHE_SECONDS`` (changes are only seen by the process that made them
+when the cache is per process).
+"""
+import hashlib
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+# Facet name -> model column it groups on.
+FACET_FIELDS = {
+    'status': 'status',
+    'priority': 'priority',
+    'severity': 'severity',
+    'project': 'project_id',
+    'assigned_to': 'assigned_to_id',
+}
+
+# Query-string value selecting bugs with a NULL facet column (unassigned).
+NONE_VALUE = 'none'
+
+CACHE_SECONDS = 60
+
+# Bumped whenever bugs change, which retires every cached count
+_GENERATION_KEY = 'bug_facets:generation'
+
+
+def _facet_q(facet, value):
+    field = FACET_FIELDS[facet]
+    if value == NONE_VALUE:
+        return Q(**{f'{field}__isnull': True})
+    return Q(**{field: value})
+
+
+def _row_key(value):
+    return NONE_VALUE if value is None else str(value)
+
+
+def apply_facet_filters(queryset, selected):
+    """Filter ``queryset`` by every non-empty value in ``selected``."""
+    for facet, value in selected.items():
+        if value:
+            queryset = queryset.filter(_facet_q(facet, value))
+    return queryset
+
+
+def facet_counts(queryset, selected):
+    """
+    Return ``{facet: Counter(value -> count)}`` for ``queryset``.
+
+    ``queryset`` must carry every filter *except* the facet filters, which
+    are given separately in ``selected`` (facet name -> query-string value).
+    Counter keys are query-string values, so they compare directly with the
+    options rendered in the filter dropdowns.
+    """
+    active = {facet: value for facet, value in selected.items() if value}
+    fields = list(FACET_FIELDS.values())
+
+    if len(active) > 1:
+        # Only rows that miss at most one active filter can contribute to a
+        # facet count; skip the rest in the database.
+        matched = sum(
+            (Case(When(_facet_q(facet, value), then=Value(1)), default=Value(0),
+                  output_field=IntegerField())
+             for facet, value in active.items()),
+            Value(0),
+        )
+        queryset = queryset.alias(facet_matches=matched).filter(
+            facet_matches__gte=len(active) - 1
+        )
+
+    rows = queryset.order_by().values(*fields).annotate(count=Count('id'))
+
+    counts = {facet: Counter() for facet in FACET_FIELDS}
+    for row in rows:
+        keys = {facet: _row_key(row[field]) for facet, field in FACET_FIELDS.items()}
+        misses = [facet for facet, value in active.items() if keys[facet] != value]
+        if not misses:
+            for facet, key in keys.items():
+                counts[facet][key] += row['count']
+        elif len(misses) == 1:
+            facet = misses[0]
+            counts[facet][keys[facet]] += row['count']
+    return counts
+
+
+def invalidate():
+    """Retire cached facet counts after bugs were added, changed or deleted."""
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.add(_GENERATION_KEY, 1, None)
+
+
+def cached_facet_counts(queryset, selected, search):
+    """
+    ``facet_counts`` for ``queryset``, cached. ``search`` must describe
+    every filter ``queryset`` carries (keyword, tags) as JSON-able values.
+    """
+    generation = cache.get_or_set(_GENERATION_KEY, 0, None)
+    key = 'bug_facets:' + hashlib.md5(
+        json.dumps([generation, search, selected], sort_keys=True).encode()
+    ).hexdigest()
+    counts = cache.get(key)
+    if counts is None:
+        counts = facet_counts(queryset, selected)
+        cache.set(key, counts, CACHE_SECONDS)
+    return counts
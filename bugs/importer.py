@@ -0,0 +1,340 @@
+"""
+Streaming bulk import of bugs from CSV or JSON Lines.
+
+Records are parsed one at a time from the open file, validated, and written
+in batches: multi-row ``INSERT ... RETURNING`` statements for the bugs, then
+one ``executemany`` each for their "Imported bug" history rows and their tag
+links, one counter update per project, one daily rollup upsert, one
+full-text reindex. The duplicate and similarity indexes are left to
+``duplicates.index_missing`` and ``similarity.index_missing``, which cost
+several times the import itself. The inserts are plain SQL rather than ``bulk_create`` because
+per-field model preparation and Django's 999-parameter statement limit on
+SQLite cost several times more than the writes themselves.
+Projects, versions, users and tags are resolved through in-memory caches, so
+each distinct name costs at most one query for the whole import.
+
+Recognised fields (CSV header names or JSON keys):
+
+    title (required), description, project (required, name or id),
+    version, status, priority, severity, reported_by, assigned_to,
+    tags (comma-separated, or a list in JSONL), created_at, resolved_at
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from projects.models import Project, ProjectVersion
+
+from . import facets, search
+from .models import Bug, BugDailyRollup, BugHistory, BugTag, ProjectBugStats, Tag
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Only the first errors are kept for reporting; the rest are just counted.
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'jsonl')
+
+# Bug fields written by the importer, in the order ``BugImporter.build`` emits
+# them.
+BUG_FIELDS = (
+    'title', 'description', 'project', 'project_version', 'status', 'priority',
+    'severity', 'reported_by', 'assigned_to', 'created_at', 'updated_at', 'resolved_at',
+)
+DATETIME_FIELDS = ('created_at', 'updated_at', 'resolved_at')
+
+# Rows per multi-row INSERT; 500 * 12 parameters stays well under SQLite's
+# 32766 bound-parameter limit.
+INSERT_ROWS = 500
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    """Guess the format from a file name, defaulting to CSV."""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_records(stream, fmt):
+    """
+    Yield ``(line_number, record)`` pairs from a text stream.
+
+    Malformed JSON lines are yielded as ``(line_number, ImportRowError)`` so
+    the caller can report them without stopping the import.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, ImportRowError(f'Invalid JSON: {exc.msg}')
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ImportRowError('Expected a JSON object')
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f'Unknown import format: {fmt}')
+
+
+def open_text(fileobj, encoding='utf-8'):
+    """Wrap a binary file (such as an upload) as a streaming text file."""
+    return io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []  # (line_number, message), capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+
+class _Cache:
+    """Dict-backed lookup that remembers misses as well as hits."""
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.values = {}
+
+    def get(self, key):
+        if key not in self.values:
+            self.values[key] = self.loader(key)
+        return self.values[key]
+
+
+def _text(record, key):
+    value = record.get(key)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class BugImporter:
+    """
+    Validate and insert bug records in batches.
+
+    With ``dry_run`` every record is still parsed and validated, including
+    reference lookups, but nothing is written.
+    """
+
+    def __init__(self, user, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        self.user = user
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.projects = _Cache(self._load_project)
+        self.versions = _Cache(self._load_version)
+        self.users = _Cache(self._load_user)
+        self.tag_ids = {}
+        self.statuses = dict(Bug.STATUS_CHOICES)
+        self.priorities = dict(Bug.PRIORITY_CHOICES)
+        self.severities = dict(Bug.SEVERITY_CHOICES)
+        self.now = timezone.now()
+        self.timezone = timezone.get_current_timezone()
+
+    def _load_project(self, key):
+        project = Project.objects.filter(name=key).only('id').first()
+        if project is None and key.isdigit():
+            project = Project.objects.filter(id=key).only('id').first()
+        return project.id if project else None
+
+    def _load_version(self, key):
+        project_id, version_number = key
+        return ProjectVersion.objects.filter(
+            project_id=project_id, version_number=version_number
+        ).values_list('id', flat=True).first()
+
+    def _load_user(self, username):
+        return User.objects.filter(username=username).values_list('id', flat=True).first()
+
+    def _choice(self, record, key, choices, default):
+        value = _text(record, key).lower().replace(' ', '_') or default
+        if value not in choices:
+            raise ImportRowError(f'Unknown {key} "{value}"')
+        return value
+
+    def _datetime(self, record, key):
+        value = _text(record, key)
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ImportRowError(f'Invalid {key} "{value}"')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, self.timezone)
+        return parsed
+
+    def build(self, record):
+        """Turn one record into ``(row, tag_names)`` or raise ImportRowError."""
+        title = _text(record, 'title')
+        if not title:
+            raise ImportRowError('Missing title')
+        if len(title) > 200:
+            raise ImportRowError('Title is longer than 200 characters')
+
+        project_key = _text(record, 'project')
+        project_id = self.projects.get(project_key) if project_key else None
+        if project_id is None:
+            raise ImportRowError(f'Unknown project "{project_key}"')
+
+        version_id = None
+        version_key = _text(record, 'version')
+        if version_key:
+            version_id = self.versions.get((project_id, version_key))
+            if version_id is None:
+                raise ImportRowError(f'Unknown version "{version_key}" for project "{project_key}"')
+
+        reported_by_id = self.user.id
+        reporter = _text(record, 'reported_by')
+        if reporter:
+            reported_by_id = self.users.get(reporter)
+            if reported_by_id is None:
+                raise ImportRowError(f'Unknown user "{reporter}"')
+
+        assigned_to_id = None
+        assignee = _text(record, 'assigned_to')
+        if assignee:
+            assigned_to_id = self.users.get(assignee)
+            if assigned_to_id is None:
+                raise ImportRowError(f'Unknown user "{assignee}"')
+
+        tags = record.get('tags')
+        if isinstance(tags, list):
+            tag_names = Tag.parse(','.join(str(tag) for tag in tags))
+        else:
+            tag_names = Tag.parse(_text(record, 'tags'))
+
+        created_at = self._datetime(record, 'created_at') or self.now
+        row = (
+            title,
+            _text(record, 'description'),
+            project_id,
+            version_id,
+            self._choice(record, 'status', self.statuses, 'open'),
+            self._choice(record, 'priority', self.priorities, 'medium'),
+            self._choice(record, 'severity', self.severities, 'major'),
+            reported_by_id,
+            assigned_to_id,
+            created_at,
+            self.now,
+            self._datetime(record, 'resolved_at'),
+        )
+        return row, tag_names
+
+    def run(self, records):
+        """Import ``(line_number, record)`` pairs and return an ``ImportResult``."""
+        result = ImportResult()
+        batch = []
+        for line_number, record in records:
+            if isinstance(record, ImportRowError):
+                result.add_error(line_number, str(record))
+                continue
+            try:
+                batch.append(self.build(record))
+            except ImportRowError as exc:
+                result.add_error(line_number, str(exc))
+                continue
+            if len(batch) >= self.batch_size:
+                result.created += self.write(batch)
+                batch = []
+        if batch:
+            result.created += self.write(batch)
+        return result
+
+    def _resolve_tags(self, names):
+        missing = [name for name in names if name not in self.tag_ids]
+        if not missing:
+            return
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        self.tag_ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def _insert_bugs(self, cursor, rows):
+        """Insert bug rows and return their new ids, in order."""
+        ops = connection.ops
+        columns = [Bug._meta.get_field(name).column for name in BUG_FIELDS]
+        datetime_positions = [BUG_FIELDS.index(name) for name in DATETIME_FIELDS]
+        adapted = {None: None, self.now: ops.adapt_datetimefield_value(self.now)}
+        row_sql = '(%s)' % ', '.join(['%s'] * len(columns))
+        ids = []
+        for start in range(0, len(rows), INSERT_ROWS):
+            chunk = rows[start:start + INSERT_ROWS]
+            params = []
+            for row in chunk:
+                row = list(row)
+                for position in datetime_positions:
+                    value = row[position]
+                    if value in adapted:
+                        row[position] = adapted[value]
+                    else:
+                        row[position] = ops.adapt_datetimefield_value(value)
+                params.extend(row)
+            cursor.execute(
+                'INSERT INTO %s (%s) VALUES %s RETURNING %s' % (
+                    ops.quote_name(Bug._meta.db_table),
+                    ', '.join(ops.quote_name(column) for column in columns),
+                    ', '.join([row_sql] * len(chunk)),
+                    ops.quote_name(Bug._meta.pk.column),
+                ),
+                params,
+            )
+            ids.extend(bug_id for bug_id, in cursor.fetchall())
+        return ids
+
+    def write(self, batch):
+        """Insert one batch of built rows; returns the number of bugs written."""
+        if self.dry_run:
+            return len(batch)
+
+        ops = connection.ops
+        with transaction.atomic(), connection.cursor() as cursor:
+            bug_ids = self._insert_bugs(cursor, [row for row, _ in batch])
+
+            now = ops.adapt_datetimefield_value(self.now)
+            cursor.executemany(
+                'INSERT INTO %s (bug_id, user_id, action, event, field, old_value, new_value, timestamp) '
+                "VALUES (%%s, %%s, 'Imported bug', 'imported', '', '', '', %%s)"
+                % ops.quote_name(BugHistory._meta.db_table),
+                [(bug_id, self.user.id, now) for bug_id in bug_ids],
+            )
+
+            self._resolve_tags({name for _, names in batch for name in names})
+            cursor.executemany(
+                'INSERT INTO %s (bug_id, tag_id) VALUES (%%s, %%s)'
+                % ops.quote_name(BugTag._meta.db_table),
+                [
+                    (bug_id, self.tag_ids[name])
+                    for bug_id, (_, names) in zip(bug_ids, batch)
+                    for name in names
+                ],
+            )
+
+            states = [(row[2], row[4], row[5], row[6], row[8]) for row, _ in batch]
+            ProjectBugStats.record_changes((None, state) for state in states)
+            BugDailyRollup.record_events(
+                event for state, (row, _) in zip(states, batch)
+                for event in BugDailyRollup.events_for(None, state, row[9], when=row[11])
+            )
+            search.index_bugs(bug_ids)
+            transaction.on_commit(facets.invalidate)
+        return len(bug_ids)
@@ -0,0 +1,286 @@
+"""
+In-process broadcast of new bug history to live activity streams.
+
+Each server process runs one ``ActivityHub`` on its event loop. A single
+poller reads history entries newer than the last one it has seen (one
+query per wake-up, however many clients are watching) and fans them out to
+subscribers, each of which owns a bounded ``asyncio.Queue``. Saving a
+BugHistory row wakes the poller as soon as its transaction commits; writes
+that skip signals (bulk edits, imports, other processes) are picked up by
+the periodic poll instead.
+
+The hub also keeps the last ``RECENT_SIZE`` events it published. A
+subscriber that falls ``QUEUE_SIZE`` events behind has its queue emptied
+and catches up from that buffer using its cursor, the id of the last event
+it sent. Browsers send the same cursor back as ``Last-Event-ID`` when they
+reconnect, so a dropped connection resumes where it left off, from the
+buffer when it is recent enough and from the database otherwise.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict, deque, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.urls import reverse
+
+from .models import BugHistory
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls when nothing wakes the poller
+POLL_SECONDS = 5
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 20
+
+# Milliseconds the browser waits before reconnecting
+RETRY_MS = 3000
+
+# Events buffered per client before it is considered lagged
+QUEUE_SIZE = 100
+
+# Recent events kept by the hub for lagged and reconnecting clients
+RECENT_SIZE = 1000
+
+# Most events replayed from the database when resuming; a client further
+# behind than this is told to reload instead
+CATCHUP_LIMIT = 200
+
+# Most entries the poller reads per query
+FETCH_LIMIT = 500
+
+# Queued in place of events when a subscriber overflows
+LAGGED = object()
+
+
+def latest_id():
+    return BugHistory.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+# A history entry ready to send: its ids for routing, and the SSE chunk
+Event = namedtuple('Event', 'id project_id chunk')
+
+
+def fetch_after(after_id, project_ids=None, limit=FETCH_LIMIT):
+    """History entries after ``after_id`` in id order, as ``Event`` tuples."""
+    entries = BugHistory.objects.filter(id__gt=after_id)
+    if project_ids is not None:
+        entries = entries.filter(bug__project_id__in=project_ids)
+    rows = entries.order_by('id').values(
+        'id', 'bug_id', 'bug__title', 'bug__project_id', 'user__username',
+        'event', 'action', 'timestamp',
+    )[:limit]
+    # Serialized once here, however many clients receive the event
+    return [
+        Event(row['id'], row['bug__project_id'], format_event(row['id'], {
+            'id': row['id'],
+            'bug_id': row['bug_id'],
+            'bug_title': row['bug__title'],
+            'project_id': row['bug__project_id'],
+            'user': row['user__username'],
+            'event': row['event'],
+            'action': row['action'],
+            'timestamp': row['timestamp'].isoformat(),
+            'url': reverse('bugs:bug_detail', args=[row['bug_id']]),
+        }))
+        for row in rows
+    ]
+
+
+def format_event(event_id, data):
+    """One server-sent event carrying ``data`` as JSON."""
+    return f"id: {event_id}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscriber:
+    """One connected stream: its project filter and bounded event queue."""
+
+    def __init__(self, project_ids=None):
+        self.project_ids = project_ids
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.lagged = False
+
+    def offer(self, event):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop what is buffered; the stream replays it from the hub
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(LAGGED)
+
+
+class ActivityHub:
+    def __init__(self):
+        self.loop = None
+        self.wakeup = None
+        self.task = None
+        self.started = None
+        self.everyone = set()
+        self.by_project = defaultdict(set)
+        self.last_id = 0
+        # Every event after ``recent_after`` is in ``recent``
+        self.recent = deque(maxlen=RECENT_SIZE)
+        self.recent_after = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self.everyone) + sum(len(subs) for subs in self.by_project.values())
+
+    def subscribe(self, project_ids=None):
+        """Register a subscriber; must be called on the event loop."""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # First use, or a new loop (tests, server reload)
+            self.loop, self.task = loop, None
+            self.wakeup = asyncio.Event()
+        subscriber = Subscriber(project_ids)
+        if project_ids is None:
+            self.everyone.add(subscriber)
+        else:
+            for project_id in project_ids:
+                self.by_project[project_id].add(subscriber)
+        if self.task is None or self.task.done():
+            self.started = loop.create_future()
+            self.task = loop.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.everyone.discard(subscriber)
+        for project_id in subscriber.project_ids or ():
+            subscribers = self.by_project.get(project_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.by_project[project_id]
+        if not self.subscriber_count and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def position(self):
+        """The id of the newest entry the poller has seen."""
+        await asyncio.shield(self.started)
+        return self.last_id
+
+    def replay(self, cursor, project_ids=None):
+        """
+        Buffered events after ``cursor``, or ``None`` when the buffer no
+        longer reaches back that far.
+        """
+        if cursor < self.recent_after:
+            return None
+        projects = None if project_ids is None else set(project_ids)
+        return [
+            event for event in self.recent
+            if event.id > cursor and (projects is None or event.project_id in projects)
+        ]
+
+    def notify(self):
+        """Wake the poller; safe to call from any thread."""
+        loop, wakeup = self.loop, self.wakeup
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def publish(self, event):
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_after = self.recent[0].id
+        self.recent.append(event)
+        for subscriber in self.everyone | self.by_project.get(event.project_id, set()):
+            subscriber.offer(event)
+
+    async def _run(self):
+        try:
+            self.last_id = await sync_to_async(latest_id)()
+        except Exception as exc:
+            self.started.set_exception(exc)
+            raise
+        # Entries before this may have been missed while nobody listened
+        self.recent.clear()
+        self.recent_after = self.last_id
+        self.started.set_result(None)
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                events = await sync_to_async(fetch_after)(self.last_id)
+            except Exception:
+                logger.exception('Polling bug history for live streams failed')
+                continue
+            for event in events:
+                self.publish(event)
+            if events:
+                self.last_id = events[-1].id
+            if len(events) == FETCH_LIMIT:
+                self.wakeup.set()
+
+
+hub = ActivityHub()
+
+
+async def catch_up(cursor, project_ids=None):
+    """
+    Events after ``cursor`` from the database, as ``(chunks, cursor)``.
+    Past ``CATCHUP_LIMIT`` events the client is sent a ``reset`` event and
+    the cursor moves to the newest entry.
+    """
+    events = await sync_to_async(fetch_after)(cursor, project_ids, CATCHUP_LIMIT + 1)
+    if len(events) > CATCHUP_LIMIT:
+        return ['event: reset\ndata: {}\n\n'], await sync_to_async(latest_id)()
+    chunks = [event.chunk for event in events]
+    return chunks, events[-1].id if events else cursor
+
+
+async def stream(project_ids=None, cursor=None):
+    """
+    Server-sent events for new history, starting after ``cursor`` (or
+    now), limited to ``project_ids`` when given.
+    """
+    subscriber = hub.subscribe(project_ids)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        position = await hub.position()
+        if cursor is None:
+            # Everything the hub publishes from now on is new to this client
+            cursor = position
+        else:
+            events = hub.replay(cursor, project_ids)
+            if events is None:
+                chunks, cursor = await catch_up(cursor, project_ids)
+            else:
+                chunks = [event.chunk for event in events]
+                cursor = max(cursor, events[-1].id if events else position)
+            for chunk in chunks:
+                yield chunk
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event is LAGGED:
+                # Replaying and re-enabling the queue happen with no await in
+                # between, so no event can fall into the gap
+                subscriber.lagged = False
+                events = hub.replay(cursor, project_ids)
+                if events is None:
+                    yield 'event: reset\ndata: {}\n\n'
+                    cursor = hub.last_id
+                    continue
+                for event in events:
+                    cursor = event.id
+                    yield event.chunk
+                continue
+            if event.id <= cursor:
+                continue
+            cursor = event.id
+            yield event.chunk
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,322 @@
+"""
+Random access to the lines of large text attachments, for the log viewer.
+
+Text blobs are stored gzipped, and gzip cannot be read from the middle, so
+the viewer reads an uncompressed copy kept in a cache under
+``attachment_logs/``, next to a sparse line index: for every
+``INDEX_BLOCK`` bytes of content, how many newlines come before that
+block. Both are written by the preview worker (see ``bugs.previews``) in
+the same pass over the content as the text excerpt, never in a request,
+and are named after the blob's file, so a blob stored again under the same
+digest gets its own. The cache holds at most ``LOG_CACHE_BYTES``: after
+each build the entries opened least recently are removed, and opening one
+that has been removed queues its blob's preview again to rebuild it.
+
+Reading memory-maps the content. Finding where a line starts is a binary
+search over the index plus a scan of at most one block, so jumping to any
+line of a multi-GB log takes milliseconds and reads only the lines asked
+for. Search runs a regular expression over the mapped content in windows
+of whole lines and reports matching lines as it finds them, stopping after
+``MAX_MATCHES`` matches or ``SEARCH_SECONDS`` with the line to continue from.
+
+Some expressions take exponential time on some lines, and the re module
+cannot be stopped once it has started, so expressions are compiled with
+the ``regex`` module, whose searches take a timeout. A window the
+expression cannot get through in ``WINDOW_SECONDS`` ends the search with
+the line after that window to continue from.
+
+Lines are numbered from 0 here; the views number them from 1.
+"""
+import mmap
+import os
+import secrets
+import shutil
+import struct
+import time
+from array import array
+from bisect import bisect_left
+
+import regex
+
+from django.conf import settings
+
+from .attachments import storage_path
+from .storage import attachment_storage
+
+LOG_DIR = 'attachment_logs'
+
+DEFAULT_CACHE_BYTES = 5 * 1024 * 1024 * 1024
+
+# An entry without an index this old was left by a build that died
+ABANDONED_SECONDS = 24 * 3600
+
+INDEX_BLOCK = 64 * 1024
+
+# Most lines returned at once
+MAX_LINES = 1000
+
+# Longer lines are cut when shown
+MAX_LINE_BYTES = 4096
+
+SEARCH_WINDOW = 4 * 1024 * 1024
+
+MAX_MATCHES = 1000
+
+SEARCH_SECONDS = 10
+
+# Longest an expression may spend on one window before it is skipped
+WINDOW_SECONDS = 2
+
+MAX_PATTERN_CHARS = 500
+
+# Magic, block size, content size, line count; the newline counts follow
+_HEADER = struct.Struct('<4sIQQ')
+_MAGIC = b'LIX1'
+
+
+def _directory(blob):
+    name = os.path.basename(blob.file.name).removesuffix('.gz')
+    return f'{LOG_DIR}/{name[:2]}/{name}'
+
+
+def _text(data):
+    text = data[:MAX_LINE_BYTES].decode('utf-8', 'replace').rstrip('\r')
+    return text + ' [...]' if len(data) > MAX_LINE_BYTES else text
+
+
+class LogFile:
+    """The indexed, memory-mapped content of a text attachment. Close it when done."""
+
+    def __init__(self, content_path, index_path):
+        with open(index_path, 'rb') as file:
+            magic, self.block_size, self.size, self.line_count = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f'{index_path} is not a line index')
+            # newlines[i]: the newlines before byte i * block_size
+            self.newlines = array('Q')
+            self.newlines.frombytes(file.read())
+        self._file = open(content_path, 'rb')
+        # An empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.size:
+            self._map.close()
+        self._file.close()
+
+    def offset(self, line):
+        """The byte offset at which ``line`` starts."""
+        if line <= 0:
+            return 0
+        if line >= self.line_count:
+            return self.size
+        # The block holding the newline that ends the previous line
+        block = bisect_left(self.newlines, line) - 1
+        start = block * self.block_size
+        data = self._map[start:start + self.block_size]
+        rest = data.split(b'\n', line - self.newlines[block])[-1]
+        return start + len(data) - len(rest)
+
+    def lines(self, start, count):
+        """The text of up to ``count`` lines from ``start`` on."""
+        position = self.offset(start)
+        result = []
+        while len(result) < count and position < self.size:
+            end = self._map.find(b'\n', position)
+            if end < 0:
+                end = self.size
+            result.append(_text(self._map[position:min(end, position + MAX_LINE_BYTES + 1)]))
+            position = end + 1
+        return result
+
+    def _window_end(self, position):
+        """Where the whole lines from ``position`` that fit in a search window end."""
+        end = self._map.rfind(b'\n', position, position + SEARCH_WINDOW)
+        if end < 0:
+            # A single line longer than the window
+            end = self._map.find(b'\n', position + SEARCH_WINDOW)
+        return self.size if end < 0 else end
+
+    def line_at(self, offset):
+        """The number of the line holding byte ``offset``."""
+        if offset >= self.size:
+            return self.line_count
+        block = offset // self.block_size
+        start = block * self.block_size
+        return self.newlines[block] + self._map[start:offset].count(b'\n')
+
+    def search(self, pattern, start=0, max_matches=MAX_MATCHES, seconds=SEARCH_SECONDS):
+        """
+        Yield ``(line, text)`` for each line from ``start`` on that
+        ``pattern`` (from ``compile_pattern``) matches in. Matches spanning
+        lines are only found within a search window. A search cut short by
+        ``max_matches``, ``seconds`` or a window that takes too long ends
+        by yielding ``(line, None)`` with the line to continue from.
+        """
+        deadline = time.monotonic() + seconds
+        found = 0
+        line, window_start = start, self.offset(start)
+        while window_start < self.size:
+            if time.monotonic() > deadline:
+                yield line, None
+                return
+            window_end = self._window_end(window_start)
+            # ``line`` is the number of the line starting at ``position``
+            position = window_start
+            while True:
+                budget = min(deadline - time.monotonic(), WINDOW_SECONDS)
+                try:
+                    # Other requests' threads run while this one searches
+                    match = pattern.search(self._map, position, window_end, concurrent=True, timeout=budget)
+                except TimeoutError:
+                    # Out of time: the search continues in this window next
+                    # time, unless the window itself is what took too long
+                    skip = budget >= WINDOW_SECONDS
+                    yield self.line_at(window_end + 1) if skip else line, None
+                    return
+                if match is None:
+                    break
+                first = self._map.rfind(b'\n', position, match.start()) + 1 or position
+                line += self._map[position:first].count(b'\n')
+                last = self._map.find(b'\n', max(match.end() - 1, first), window_end)
+                if last < 0:
+                    last = window_end
+                yield line, _text(self._map[first:min(last, first + MAX_LINE_BYTES + 1)])
+                found += 1
+                # A match can span lines
+                line += self._map[first:last].count(b'\n') + 1
+                position = last + 1
+                if found >= max_matches or time.monotonic() > deadline:
+                    if position < self.size:
+                        yield line, None
+                    return
+                if position > window_end:
+                    break
+            if position <= window_end:
+                line += self._map[position:window_end].count(b'\n') + 1
+            window_start = window_end + 1
+
+
+def compile_pattern(pattern, ignore_case=False):
+    """Compile a search expression; raises ValueError if it is not a valid one."""
+    flags = regex.MULTILINE | (regex.IGNORECASE if ignore_case else 0)
+    try:
+        return regex.compile(pattern.encode('utf-8'), flags)
+    except regex.error as exc:
+        raise ValueError(f'Invalid regular expression: {exc}') from None
+
+
+def fill_cache(blob, chunks):
+    """
+    Pass ``chunks`` of a text blob's content through, writing its line index
+    and uncompressed copy to the cache on the way. The entry appears once
+    the last chunk has been read.
+    """
+    directory = _directory(blob)
+    suffix = f'.{secrets.token_hex(4)}.tmp'
+    index_path = storage_path(f'{directory}/lines.idx')
+    content_path = storage_path(f'{directory}/content') if blob.compressed else None
+    newlines = array('Q')
+    total = size = 0
+    ends_with_newline = True
+    content = open(content_path + suffix, 'wb') if content_path else None
+    try:
+        for data in chunks:
+            if content:
+                content.write(data)
+            position = 0
+            while position < len(data):
+                if size % INDEX_BLOCK == 0:
+                    newlines.append(total)
+                end = min(position + INDEX_BLOCK - size % INDEX_BLOCK, len(data))
+                total += data.count(b'\n', position, end)
+                size += end - position
+                position = end
+            if data:
+                ends_with_newline = data.endswith(b'\n')
+            yield data
+    except BaseException:
+        if content:
+            content.close()
+            os.remove(content_path + suffix)
+        raise
+    if content:
+        content.close()
+        os.replace(content_path + suffix, content_path)
+    with open(index_path + suffix, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, INDEX_BLOCK, size, total + (0 if ends_with_newline else 1)))
+        newlines.tofile(file)
+    # The index appears last, so its presence means the content is complete
+    os.replace(index_path + suffix, index_path)
+
+
+def _paths(blob):
+    directory = _directory(blob)
+    index_path = attachment_storage().path(f'{directory}/lines.idx')
+    content_path = attachment_storage().path(f'{directory}/content') if blob.compressed else blob.file.path
+    return index_path, content_path
+
+
+def is_cached(blob):
+    return os.path.exists(_paths(blob)[0])
+
+
+def open_log(blob):
+    """
+    The ``LogFile`` of a text blob, or None while it is not in the cache.
+    Opening it counts as a use, for eviction.
+    """
+    index_path, content_path = _paths(blob)
+    try:
+        os.utime(index_path)
+        return LogFile(content_path, index_path)
+    except FileNotFoundError:
+        return None
+
+
+def evict(limit=None, keep=None):
+    """
+    Remove the cache entries opened least recently until the cache takes at
+    most ``limit`` bytes (``LOG_CACHE_BYTES``), sparing the entry of the blob
+    ``keep``, however large. Returns how many entries were removed.
+    """
+    if limit is None:
+        limit = getattr(settings, 'LOG_CACHE_BYTES', DEFAULT_CACHE_BYTES)
+    root = attachment_storage().path(LOG_DIR)
+    kept = attachment_storage().path(_directory(keep)) if keep is not None else None
+    abandoned = time.time() - ABANDONED_SECONDS
+    entries = []
+    total = 0
+    for prefix in os.scandir(root) if os.path.isdir(root) else ():
+        for entry in os.scandir(prefix.path):
+            files = [file.stat() for file in os.scandir(entry.path)]
+            size = sum(stat.st_size for stat in files)
+            total += size
+            try:
+                used = os.stat(os.path.join(entry.path, 'lines.idx')).st_mtime
+            except FileNotFoundError:
+                # Still being built, unless it was left behind long ago
+                used = max((stat.st_mtime for stat in files), default=0)
+                if used > abandoned:
+                    continue
+            if entry.path != kept:
+                entries.append((used, size, entry.path))
+    removed = 0
+    for used, size, path in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def delete_files(blob):
+    """Remove the line index and uncompressed content of a deleted blob."""
+    shutil.rmtree(attachment_storage().path(_directory(blob)), ignore_errors=True)
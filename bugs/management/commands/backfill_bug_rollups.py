@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bugs import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily bug rollups (opened, resolved, closed) from bugs and their history.'
+
+    def handle(self, *args, **options):
+        count = rollups.backfill()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} daily rollup rows.'))
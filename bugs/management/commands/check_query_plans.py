@@ -0,0 +1,279 @@
+import re
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from ai_debugger.models import AIAnalysisRequest, AnalysisBatch, AnalysisResult
+from bugs import search
+from bugs.access import visible_bugs
+from bugs.export import comment_count, last_activity
+from bugs.facets import FACET_FIELDS
+from bugs.models import (
+    AttachmentPreview, AttachmentUpload, Bug, BugAttachment, BugComment, BugDailyRollup, BugHistory, BugSignature, BugSignatureBucket, BugTag,
+    BugTermStat, BugVector, BugVectorPosting,
+)
+from bugs.pagination import lean_bug_queryset
+from projects.models import Project, ProjectVersion, member_count
+
+# Placeholder values: EXPLAIN only needs the shape of the query, not real rows.
+SOME_ID = 1
+SOME_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# A SCAN reads a whole table, or a whole index. Walking an index in order is
+# only fine when a LIMIT stops the walk early (ORDER BY ... LIMIT).
+FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)(?! VIRTUAL TABLE)')
+INDEX_SCAN_RE = re.compile(r'\bSCAN (\w+) USING (?:COVERING )?INDEX')
+LIMIT_RE = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+TEMP_BTREE_RE = re.compile(r'USE TEMP B-TREE')
+
+# Shapes that read or sort an unbounded set of rows by design, with the reason.
+ALLOWED_PROBLEMS = {
+    # An export streams every bug the filters match, in list order.
+    'bug_export': {'full index scan of bugs_bug'},
+    # A member's export reads their projects' bugs through the project
+    # index and sorts them into list order.
+    'bug_export.visible': {'temp B-tree sort'},
+    # Facet counts group every bug the search matches, however many; they
+    # are cached per search by facets.cached_facet_counts until bugs change.
+    'search.facets': {'full index scan of bugs_bug', 'temp B-tree sort'},
+    'search.facets.project': {'temp B-tree sort'},
+    # bm25() scores exist only for the rows a MATCH returns, so ranking
+    # sorts every match, as does a keyword-filtered list.
+    'search.match': {'temp B-tree sort'},
+    'search.ranked': {'temp B-tree sort'},
+    'search.ranked.project': {'temp B-tree sort'},
+    # A member's list reads their projects' bugs through the project index
+    # and sorts them, as no index orders several projects' bugs together.
+    # Filtering by one project walks the (project, created) index instead.
+    'bug_list.visible': {'temp B-tree sort'},
+    # Tag matches come from the (tag, bug) index and no index orders them
+    # by creation, so every bug with the tag is sorted.
+    'bug_list.tag': {'temp B-tree sort'},
+    # Entries come from each of the projects' bugs and are merged into id
+    # order, so every entry after the cursor is sorted.
+    'activity_stream.project': {'temp B-tree sort'},
+    # Days are grouped into computed week or month buckets, which no index
+    # holds; every day in the requested range is grouped.
+    'statistics.timeline': {'temp B-tree sort'},
+    'statistics.project_timeline': {'temp B-tree sort'},
+    # Candidates are counted per bug and ranked by the count, which only
+    # exists once every bucket the query shares has been read.
+    'duplicates.candidates': {'temp B-tree sort'},
+    # Pruning reads every cached result past the newest ones kept.
+    'analysis_cache.lru': {'full index scan of ai_debugger_analysisresult'},
+    # The project list page shows every project.
+    'project_list': {'full scan of projects_project'},
+}
+
+
+def query_shapes():
+    """
+    Representative querysets for every hot view query, keyed by name. Raw
+    SQL queries are given as ``(sql, params)``.
+    """
+    after_cursor = Q(created_at__lte=SOME_TIME) & (
+        Q(created_at__lt=SOME_TIME) | Q(id__lt=SOME_ID)
+    )
+    before_cursor = Q(created_at__gte=SOME_TIME) & (
+        Q(created_at__gt=SOME_TIME) | Q(id__gt=SOME_ID)
+    )
+    keyset = ('-created_at', '-id')
+
+    return {
+        'bug_list': lean_bug_queryset(Bug.objects.order_by(*keyset))[:51],
+        'bug_list.after_cursor': lean_bug_queryset(
+            Bug.objects.filter(after_cursor).order_by(*keyset)
+        )[:51],
+        'bug_list.before_cursor': lean_bug_queryset(
+            Bug.objects.filter(before_cursor).order_by('created_at', 'id')
+        )[:51],
+        'bug_list.project': lean_bug_queryset(
+            Bug.objects.filter(project_id=SOME_ID).order_by(*keyset)
+        )[:51],
+        'bug_list.project.after_cursor': lean_bug_queryset(
+            Bug.objects.filter(after_cursor, project_id=SOME_ID).order_by(*keyset)
+        )[:51],
+        'bug_list.visible': lean_bug_queryset(
+            visible_bugs(User(id=SOME_ID), Bug.objects.order_by(*keyset))
+        )[:51],
+        'bug_list.tag': lean_bug_queryset(
+            Bug.objects.filter(
+                id__in=BugTag.objects.filter(tag__name='ui').values('bug_id')
+            ).order_by(*keyset)
+        )[:51],
+        'bug_export': Bug.objects.annotate(
+            comment_count=comment_count(), last_activity=last_activity()
+        ).order_by(*keyset).values('id', 'project__name', 'assigned_to__username'),
+        'bug_export.visible': visible_bugs(User(id=SOME_ID), Bug.objects.order_by(*keyset)).values('id'),
+        'project.status_count': Bug.objects.filter(project_id=SOME_ID, status='open'),
+        'dashboard.assigned_bugs': Bug.objects.filter(
+            assigned_to_id=SOME_ID
+        ).order_by('-updated_at')[:5],
+        'my_bugs.reported': Bug.objects.filter(reported_by_id=SOME_ID).order_by('-created_at'),
+        'my_bugs.assigned': Bug.objects.filter(assigned_to_id=SOME_ID).order_by('-updated_at'),
+        'recent_activity.bugs': Bug.objects.order_by('-updated_at')[:20],
+        'recent_activity.history': BugHistory.objects.order_by('-timestamp')[:50],
+        'bug_detail.history': BugHistory.objects.filter(
+            bug_id=SOME_ID
+        ).order_by('-timestamp', '-id')[:21],
+        'bug_detail.comments': BugComment.objects.filter(
+            bug_id=SOME_ID
+        ).order_by('-created_at', '-id')[:21],
+        'bug_detail.attachments': BugAttachment.objects.filter(
+            bug_id=SOME_ID
+        ).select_related('uploaded_by', 'blob'),
+        'attachments.resume': AttachmentUpload.objects.filter(
+            uploaded_by_id=SOME_ID, client_key='key', filename='name', size=SOME_ID
+        ).order_by('-updated_at')[:1],
+        'attachments.stale_uploads': AttachmentUpload.objects.filter(updated_at__lt=SOME_TIME),
+        'previews.claim': AttachmentPreview.objects.filter(
+            status='pending', run_after__lte=SOME_TIME
+        ).order_by('run_after', 'blob').values('blob')[:1],
+        'history.transitions': BugHistory.objects.filter(
+            field='status', new_value='reopened', old_value='resolved',
+            timestamp__range=(SOME_TIME, SOME_TIME),
+        ),
+        'history.events': BugHistory.objects.filter(
+            event='created', timestamp__gte=SOME_TIME
+        ).order_by('-timestamp')[:50],
+        'activity_stream.project': BugHistory.objects.filter(
+            id__gt=SOME_ID, bug__project_id__in=[SOME_ID]
+        ).order_by('id').values('id', 'bug__title', 'user__username')[:500],
+        'analytics.history_window': BugHistory.objects.filter(id__gt=SOME_ID).order_by('id')[:20000],
+        'statistics.timeline': BugDailyRollup.objects.filter(
+            day__range=(SOME_TIME.date(), SOME_TIME.date())
+        ).annotate(bucket=TruncMonth('day')).values('bucket').annotate(opened=Sum('opened')),
+        'statistics.project_timeline': BugDailyRollup.objects.filter(
+            project_id=SOME_ID, day__range=(SOME_TIME.date(), SOME_TIME.date())
+        ).annotate(bucket=TruncMonth('day')).values('bucket').annotate(opened=Sum('opened')),
+        'duplicates.candidates': BugSignatureBucket.objects.filter(
+            project_id=SOME_ID, bucket__in=[SOME_ID, SOME_ID + 1]
+        ).values('bug_id').annotate(shared=Count('id')).order_by('-shared')[:200],
+        'duplicates.signatures': BugSignature.objects.filter(bug_id__in=[SOME_ID, SOME_ID + 1]),
+        'duplicates.missing': Bug.objects.filter(id__gt=SOME_ID, signature__isnull=True)
+        .order_by('id').values_list('id', flat=True)[:500],
+        'similarity.postings': BugVectorPosting.objects.filter(
+            feature=SOME_ID
+        ).order_by('-weight').values('bug_id', 'weight')[:250],
+        'similarity.vector': BugVector.objects.filter(bug_id=SOME_ID),
+        'similarity.missing': Bug.objects.filter(id__gt=SOME_ID, vector__isnull=True)
+        .order_by('id').values_list('id', flat=True)[:500],
+        'similarity.document_counts': BugTermStat.objects.filter(feature__in=[SOME_ID, SOME_ID + 1]),
+        'version_list': ProjectVersion.objects.filter(project_id=SOME_ID).order_by('-release_date'),
+        'analysis_queue.claim': AIAnalysisRequest.objects.filter(
+            status='pending', run_after__lte=SOME_TIME
+        ).order_by('run_after', 'id').values('id')[:1],
+        'analysis_cache.lookup': AnalysisResult.objects.filter(cache_key='0' * 64)[:1],
+        'analysis_cache.lru': AnalysisResult.objects.filter(
+            cache_key__isnull=False
+        ).order_by('-last_used_at', '-id').values('id')[10000:],
+        'analysis_history': AIAnalysisRequest.objects.filter(
+            submitted_by_id=SOME_ID, batch__isnull=True
+        ).order_by('-submitted_at'),
+        'analysis_batch.previous': AnalysisBatch.objects.filter(
+            project_id=SOME_ID, id__lt=SOME_ID
+        ).order_by('-id')[:1],
+        'analysis_batch.progress': AIAnalysisRequest.objects.filter(
+            batch_id=SOME_ID
+        ).values('status').annotate(count=Count('id')).order_by(),
+        'search.facets': Bug.objects.order_by().values(*FACET_FIELDS.values()).annotate(count=Count('id')),
+        'search.facets.project': Bug.objects.filter(
+            project_id=SOME_ID
+        ).order_by().values(*FACET_FIELDS.values()).annotate(count=Count('id')),
+        'search.match': lean_bug_queryset(
+            search.filter_queryset(Bug.objects.order_by(*keyset), 'crash')
+        )[:51],
+        'search.ranked': search.ranking_sql(search.build_match_query('crash')),
+        'search.ranked.project': search.ranking_sql(
+            search.build_match_query('crash'), Bug.objects.filter(project_id=SOME_ID)
+        ),
+        'project_list': Project.objects.select_related('manager', 'bug_stats').annotate(
+            member_count=member_count()
+        ),
+        'dashboard.projects': Project.objects.filter(members=SOME_ID).select_related('bug_stats'),
+        'my_projects.managed': Project.objects.filter(manager_id=SOME_ID).select_related(
+            'bug_stats'
+        ).annotate(member_count=member_count()),
+        'my_projects.member': Project.objects.filter(members=SOME_ID).exclude(
+            manager_id=SOME_ID
+        ).select_related('manager', 'bug_stats'),
+        'analysis_batch.report': AIAnalysisRequest.objects.filter(
+            batch_id=SOME_ID
+        ).order_by('path').values_list('id', 'path', 'result__results'),
+    }
+
+
+def explain(shape):
+    """The EXPLAIN QUERY PLAN output of a queryset or ``(sql, params)``."""
+    if not isinstance(shape, tuple):
+        return shape.explain()
+    sql, params = shape
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        # Laid out as QuerySet.explain() does on SQLite
+        return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+
+
+def is_limited(shape):
+    """Whether a queryset or ``(sql, params)`` has a LIMIT."""
+    if isinstance(shape, tuple):
+        return bool(LIMIT_RE.search(shape[0]))
+    return shape.query.high_mark is not None
+
+
+def plan_problems(plan, limited=False):
+    """
+    Return a list of human-readable problems found in an EXPLAIN QUERY PLAN,
+    of a query with a LIMIT if ``limited``.
+    """
+    problems = []
+    for table in FULL_SCAN_RE.findall(plan):
+        problems.append(f'full scan of {table}')
+    if not limited:
+        for table in INDEX_SCAN_RE.findall(plan):
+            problems.append(f'full index scan of {table}')
+    if TEMP_BTREE_RE.search(plan):
+        problems.append('temp B-tree sort')
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN QUERY PLAN for every hot view query and fail if any of '
+        'them falls back to a full table scan, an unlimited full index scan or a '
+        'temp B-tree sort.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print the query plan for every shape, not just failing ones.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plan checks are written against SQLite plans.')
+
+        failures = []
+        for name, shape in query_shapes().items():
+            plan = explain(shape)
+            allowed = ALLOWED_PROBLEMS.get(name, set())
+            problems = [
+                problem for problem in plan_problems(plan, is_limited(shape)) if problem not in allowed
+            ]
+            if problems:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: {", ".join(problems)}'))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(f'{name}: ok')
+                if options['verbose_plans']:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} query shape(s) regressed: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All query plans use indexes.'))
@@ -0,0 +1,62 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bugs import duplicates, similarity
+from bugs.importer import DEFAULT_BATCH_SIZE, FORMATS, BugImporter, detect_format, iter_records
+
+
+class Command(BaseCommand):
+    help = 'Import bugs from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: guessed from the file name).')
+        parser.add_argument('--user', required=True,
+                            help='Username recorded as the importer and default reporter.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without writing anything.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Unknown user "{options["user"]}".')
+
+        fmt = options['format'] or detect_format(options['path'])
+        importer = BugImporter(user, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        started = time.monotonic()
+        if options['path'] == '-':
+            result = importer.run(iter_records(sys.stdin, fmt))
+        else:
+            try:
+                with open(options['path'], encoding='utf-8', newline='') as stream:
+                    result = importer.run(iter_records(stream, fmt))
+            except OSError as exc:
+                raise CommandError(str(exc))
+        elapsed = time.monotonic() - started
+
+        for line_number, message in result.errors:
+            self.stderr.write(f'line {line_number}: {message}')
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... and {result.failed - len(result.errors)} more errors')
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        rate = result.created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} bugs in {elapsed:.2f}s ({rate:.0f}/s), '
+            f'{result.failed} rows rejected.'
+        ))
+
+        if result.created and not options['dry_run']:
+            # Left out of the import itself, as it costs several times more
+            started = time.monotonic()
+            count = duplicates.index_missing()
+            similarity.index_missing()
+            self.stdout.write(f'Indexed {count} bugs for duplicate and similar bug suggestions '
+                              f'in {time.monotonic() - started:.2f}s.')
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from bugs import attachments
+
+
+class Command(BaseCommand):
+    help = 'Delete attachment uploads that were abandoned, finished or not, and their part files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=int(attachments.UPLOAD_EXPIRY.total_seconds() // 3600),
+                            help='Delete uploads untouched for this many hours.')
+
+    def handle(self, *args, **options):
+        count = attachments.purge_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} stale uploads.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from bugs import duplicates
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MinHash index used to suggest duplicate bugs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true',
+                            help='Only index bugs not indexed yet, such as imported ones.')
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            count = duplicates.index_missing()
+        else:
+            count = duplicates.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} bugs.'))
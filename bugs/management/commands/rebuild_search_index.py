@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bugs import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for bugs and their comments.'
+
+    def handle(self, *args, **options):
+        if not search.create_index():
+            raise CommandError('Full-text search requires SQLite with FTS5 support.')
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} bugs.'))
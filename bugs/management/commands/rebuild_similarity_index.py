@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from bugs import similarity
+
+
+class Command(BaseCommand):
+    help = 'Recompute the TF-IDF vectors behind the "Similar bugs" panel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true',
+                            help='Only index bugs not indexed yet, such as imported ones.')
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            count = similarity.index_missing()
+        else:
+            count = similarity.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} bugs.'))
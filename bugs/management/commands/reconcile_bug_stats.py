@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bugs.models import ProjectBugStats
+
+
+class Command(BaseCommand):
+    help = 'Recount the per-project bug counters from the bugs table and repair any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int,
+                            help='Only check these projects (default: all).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted projects without rewriting them.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = ProjectBugStats.recount(
+                options['project_ids'] or None, dry_run=options['dry_run']
+            )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All project bug counters are correct.'))
+            return
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.WARNING(
+            f'{verb} drift in {len(drifted)} project(s): {", ".join(map(str, drifted))}'
+        ))
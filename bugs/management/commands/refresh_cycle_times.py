@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from bugs import analytics
+
+
+class Command(BaseCommand):
+    help = 'Fold new bug status history into the cycle-time table used by the analytics page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every bug from its full history.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = analytics.rebuild()
+        else:
+            count = analytics.refresh()
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} history entries.'))
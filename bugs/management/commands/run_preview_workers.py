@@ -0,0 +1,30 @@
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+
+from bugs import previews
+
+
+class Command(BaseCommand):
+    help = 'Generate queued attachment thumbnails and text excerpts. Several can run at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds between queue checks when idle.')
+        parser.add_argument('--drain', action='store_true',
+                            help='Exit once the queue is empty.')
+        parser.add_argument('--requeue', action='store_true',
+                            help='First queue every attachment without a preview in the current version.')
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            self.stdout.write(f'Queued {previews.requeue_outdated()} previews.')
+
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        previews.work(f'{socket.gethostname()}:{os.getpid()}', poll_seconds=options['poll'],
+                      stop=stop, drain=options['drain'])
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# The SQL is inlined rather than imported from bugs.search so this
+# migration keeps working as the indexed document evolves.
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS bugs_bug_fts USING fts5("
+    "title, description, tags, comments, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+POPULATE_FTS = (
+    "INSERT INTO bugs_bug_fts (rowid, title, description, tags, comments) "
+    "SELECT b.id, b.title, b.description, COALESCE(b.tags, ''), "
+    "COALESCE((SELECT group_concat(c.content, ' ') FROM bugs_bugcomment c "
+    "WHERE c.bug_id = b.id), '') "
+    "FROM bugs_bug b"
+)
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS)
+    schema_editor.execute(POPULATE_FTS)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS bugs_bug_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
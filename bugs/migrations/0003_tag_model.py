@@ -0,0 +1,90 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _parse(value):
+    names = []
+    for part in (value or '').split(','):
+        name = part.strip().lower()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def copy_tag_strings(apps, schema_editor):
+    Bug = apps.get_model('bugs', 'Bug')
+    Tag = apps.get_model('bugs', 'Tag')
+    BugTag = apps.get_model('bugs', 'BugTag')
+
+    rows = list(
+        Bug.objects.exclude(tags__isnull=True).exclude(tags='').values_list('id', 'tags')
+    )
+    names = {name for _, value in rows for name in _parse(value)}
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+
+    links = [
+        BugTag(bug_id=bug_id, tag_id=tag_ids[name])
+        for bug_id, value in rows
+        for name in _parse(value)
+    ]
+    BugTag.objects.bulk_create(links, batch_size=1000)
+
+
+def restore_tag_strings(apps, schema_editor):
+    Bug = apps.get_model('bugs', 'Bug')
+    BugTag = apps.get_model('bugs', 'BugTag')
+
+    tags_by_bug = {}
+    for bug_id, name in BugTag.objects.order_by('id').values_list('bug_id', 'tag__name'):
+        tags_by_bug.setdefault(bug_id, []).append(name)
+    bugs = [Bug(id=bug_id, tags=', '.join(names)[:200]) for bug_id, names in tags_by_bug.items()]
+    Bug.objects.bulk_update(bugs, ['tags'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0002_bug_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BugTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bug_tags', to='bugs.bug')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bug_tags', to='bugs.tag')),
+            ],
+        ),
+        migrations.RunPython(copy_tag_strings, restore_tag_strings),
+        migrations.RemoveField(
+            model_name='bug',
+            name='tags',
+        ),
+        migrations.AddField(
+            model_name='bug',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='bugs', through='bugs.BugTag', to='bugs.tag'),
+        ),
+        migrations.AddIndex(
+            model_name='bugtag',
+            index=models.Index(fields=['tag', 'bug'], name='bugtag_tag_bug_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bugtag',
+            constraint=models.UniqueConstraint(fields=('bug', 'tag'), name='unique_bug_tag'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0003_tag_model'),
+        ('projects', '0002_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['-created_at', '-id'], name='bug_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='bug_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'status'], name='bug_project_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['assigned_to', '-updated_at'], name='bug_assignee_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['reported_by', '-created_at'], name='bug_reporter_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['-updated_at'], name='bug_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bugcomment',
+            index=models.Index(fields=['bug', 'created_at'], name='bugcomment_bug_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bughistory',
+            index=models.Index(fields=['-timestamp'], name='bughistory_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bughistory',
+            index=models.Index(fields=['bug', '-timestamp'], name='bughistory_bug_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0004_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bughistory',
+            name='bughistory_bug_timestamp_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bughistory',
+            index=models.Index(fields=['bug', 'timestamp'], name='bughistory_bug_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+STATUSES = ('open', 'in_progress', 'resolved', 'closed', 'reopened')
+PRIORITIES = ('low', 'medium', 'high', 'critical')
+SEVERITIES = ('minor', 'major', 'critical', 'blocker')
+
+
+def populate_stats(apps, schema_editor):
+    Bug = apps.get_model('bugs', 'Bug')
+    ProjectBugStats = apps.get_model('bugs', 'ProjectBugStats')
+
+    aggregates = {
+        'total': Count('id'),
+        'open_unassigned': Count('id', filter=Q(status='open', assigned_to__isnull=True)),
+    }
+    for prefix, values in (('status', STATUSES), ('priority', PRIORITIES), ('severity', SEVERITIES)):
+        for value in values:
+            aggregates[f'{prefix}_{value}'] = Count('id', filter=Q(**{prefix: value}))
+
+    rows = Bug.objects.order_by().values('project_id').annotate(**aggregates)
+    ProjectBugStats.objects.bulk_create([ProjectBugStats(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0005_history_index_direction'),
+        ('projects', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectBugStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bug_stats', serialize=False, to='projects.project')),
+                ('total', models.IntegerField(default=0)),
+                ('status_open', models.IntegerField(default=0)),
+                ('status_in_progress', models.IntegerField(default=0)),
+                ('status_resolved', models.IntegerField(default=0)),
+                ('status_closed', models.IntegerField(default=0)),
+                ('status_reopened', models.IntegerField(default=0)),
+                ('priority_low', models.IntegerField(default=0)),
+                ('priority_medium', models.IntegerField(default=0)),
+                ('priority_high', models.IntegerField(default=0)),
+                ('priority_critical', models.IntegerField(default=0)),
+                ('severity_minor', models.IntegerField(default=0)),
+                ('severity_major', models.IntegerField(default=0)),
+                ('severity_critical', models.IntegerField(default=0)),
+                ('severity_blocker', models.IntegerField(default=0)),
+                ('open_unassigned', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Project bug stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0006_project_bug_stats'),
+        ('projects', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('priority', models.CharField(max_length=20)),
+                ('severity', models.CharField(max_length=20)),
+                ('opened', models.IntegerField(default=0)),
+                ('resolved', models.IntegerField(default=0)),
+                ('closed', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bug_rollups', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'day'], name='bugrollup_project_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'project', 'priority', 'severity'), name='unique_bug_rollup')],
+            },
+        ),
+    ]
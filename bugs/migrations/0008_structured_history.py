@@ -0,0 +1,95 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:31
+
+from django.conf import settings
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+# (pattern, event, field) for every action string the app has written;
+# ``old`` and ``new`` groups become old_value and new_value.
+ACTION_PATTERNS = [
+    (re.compile(r"^Changed (?P<field>status|priority|severity|title) from '(?P<old>.*)' to '(?P<new>.*)'$", re.S),
+     'changed', None),
+    (re.compile(r"^Assigned to (?P<new>.+)$", re.S), 'changed', 'assigned_to'),
+    (re.compile(r"^Unassigned$"), 'changed', 'assigned_to'),
+    (re.compile(r"^Changed version to (?P<new>.+)$", re.S), 'changed', 'project_version'),
+    (re.compile(r"^Cleared version$"), 'changed', 'project_version'),
+    (re.compile(r"^Created bug$"), 'created', ''),
+    (re.compile(r"^Imported bug$"), 'imported', ''),
+    (re.compile(r"^Added comment: (?P<new>.*?)(?:\.\.\.)?$", re.S), 'commented', ''),
+    (re.compile(r"^Deleted a comment$"), 'comment_deleted', ''),
+    (re.compile(r"^Added attachment: (?P<new>.+)$", re.S), 'attached', ''),
+    (re.compile(r"^Deleted attachment: (?P<new>.+)$", re.S), 'attachment_deleted', ''),
+]
+
+
+def parse_action(action):
+    """Return ``(event, field, old_value, new_value)`` for an action string."""
+    for pattern, event, field in ACTION_PATTERNS:
+        match = pattern.match(action)
+        if match:
+            groups = match.groupdict()
+            return (
+                event,
+                groups.get('field') or field,
+                (groups.get('old') or '')[:200],
+                (groups.get('new') or '')[:200],
+            )
+    return 'other', '', '', ''
+
+
+def parse_actions(apps, schema_editor):
+    BugHistory = apps.get_model('bugs', 'BugHistory')
+
+    batch = []
+    for entry in BugHistory.objects.only('id', 'action').iterator(chunk_size=BATCH_SIZE):
+        entry.event, entry.field, entry.old_value, entry.new_value = parse_action(entry.action)
+        if entry.event != 'other':
+            batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            BugHistory.objects.bulk_update(batch, ['event', 'field', 'old_value', 'new_value'])
+            batch = []
+    if batch:
+        BugHistory.objects.bulk_update(batch, ['event', 'field', 'old_value', 'new_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0007_bug_daily_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bughistory',
+            name='event',
+            field=models.CharField(choices=[('created', 'Created'), ('imported', 'Imported'), ('changed', 'Field changed'), ('commented', 'Comment added'), ('comment_deleted', 'Comment deleted'), ('attached', 'Attachment added'), ('attachment_deleted', 'Attachment deleted'), ('other', 'Other')], default='other', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='bughistory',
+            name='field',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='bughistory',
+            name='new_value',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='bughistory',
+            name='old_value',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.RunPython(parse_actions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bughistory',
+            index=models.Index(fields=['field', 'new_value', 'old_value', 'timestamp'], name='bughistory_field_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bughistory',
+            index=models.Index(fields=['event', 'timestamp'], name='bughistory_event_time_idx'),
+        ),
+    ]
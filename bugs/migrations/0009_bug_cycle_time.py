@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0008_structured_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugCycleTime',
+            fields=[
+                ('bug', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cycle_time', serialize=False, to='bugs.bug')),
+                ('status', models.CharField(max_length=20)),
+                ('status_since', models.DateTimeField()),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('reopen_count', models.IntegerField(default=0)),
+                ('lead_seconds', models.FloatField(blank=True, null=True)),
+                ('resolve_seconds', models.FloatField(blank=True, null=True)),
+                ('cycle_seconds', models.FloatField(blank=True, null=True)),
+                ('open_seconds', models.FloatField(default=0)),
+                ('in_progress_seconds', models.FloatField(default=0)),
+                ('resolved_seconds', models.FloatField(default=0)),
+                ('closed_seconds', models.FloatField(default=0)),
+                ('reopened_seconds', models.FloatField(default=0)),
+                ('last_history_id', models.IntegerField(db_index=True, default=0)),
+            ],
+        ),
+    ]
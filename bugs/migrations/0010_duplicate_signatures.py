@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0009_bug_cycle_time'),
+        ('projects', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugSignature',
+            fields=[
+                ('bug', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='bugs.bug')),
+                ('title', models.BinaryField()),
+                ('description', models.BinaryField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BugSignatureBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('bug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_buckets', to='bugs.bug')),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'bucket', 'bug'], name='bugbucket_project_bucket_idx')],
+            },
+        ),
+    ]
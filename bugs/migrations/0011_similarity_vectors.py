@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0010_duplicate_signatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugTermStat',
+            fields=[
+                ('feature', models.IntegerField(primary_key=True, serialize=False)),
+                ('documents', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BugVector',
+            fields=[
+                ('bug', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='bugs.bug')),
+                ('digest', models.CharField(max_length=32)),
+                ('terms', models.BinaryField()),
+                ('features', models.BinaryField()),
+                ('weights', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BugVectorPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feature', models.IntegerField()),
+                ('weight', models.FloatField()),
+                ('bug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vector_postings', to='bugs.bug')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['feature', '-weight', 'bug'], name='bugposting_feature_weight_idx')],
+            },
+        ),
+    ]
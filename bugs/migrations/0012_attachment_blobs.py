@@ -0,0 +1,170 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:57
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import secrets
+import shutil
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import migrations, models, transaction
+from django.db.models import F
+
+# Copied from bugs.attachments so this migration keeps working as that
+# module evolves.
+BLOCK_SIZE = 4 * 1024 * 1024
+SNIFF_BYTES = 8192
+
+
+def _is_text(filename, sample):
+    content_type, encoding = mimetypes.guess_type(filename)
+    if encoding:
+        return False
+    if content_type and content_type.startswith('text/'):
+        return True
+    if not sample or b'\0' in sample:
+        return False
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        return exc.start >= len(sample) - 3
+    return True
+
+
+def move_to_blobs(apps, schema_editor):
+    AttachmentBlob = apps.get_model('bugs', 'AttachmentBlob')
+    BugAttachment = apps.get_model('bugs', 'BugAttachment')
+
+    # Checked before anything is moved: a missing file more likely means a
+    # wrong MEDIA_ROOT than a lost attachment, and rows are never deleted here
+    missing = [
+        (attachment_id, name)
+        for attachment_id, name in BugAttachment.objects.values_list('id', 'file').iterator()
+        if not name or not default_storage.exists(name)
+    ]
+    if missing:
+        listed = '\n'.join(f'  attachment {attachment_id}: {name or "(no file)"}' for attachment_id, name in missing[:20])
+        more = f'\n  ... and {len(missing) - 20} more' if len(missing) > 20 else ''
+        raise RuntimeError(
+            f'{len(missing)} attachment files are missing from {default_storage.location}:\n{listed}{more}\n'
+            'Check MEDIA_ROOT, or restore or delete those attachments, then migrate again.'
+        )
+
+    replaced = []
+    for attachment in BugAttachment.objects.iterator():
+        name = attachment.file.name
+        with default_storage.open(name, 'rb') as source:
+            digests = []
+            size = 0
+            while block := source.read(BLOCK_SIZE):
+                digests.append(hashlib.sha256(block).digest())
+                size += len(block)
+            source.seek(0)
+            sample = source.read(SNIFF_BYTES)
+        digest = hashlib.sha256(b''.join(digests)).hexdigest()
+
+        blob = AttachmentBlob.objects.filter(digest=digest).first()
+        if blob is None:
+            compressed = _is_text(attachment.filename, sample)
+            blob_name = f'attachment_blobs/{digest[:2]}/{digest}-{secrets.token_hex(4)}{".gz" if compressed else ""}'
+            path = default_storage.path(blob_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with default_storage.open(name, 'rb') as source, open(path, 'wb') as output:
+                if compressed:
+                    with gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as archive:
+                        shutil.copyfileobj(source, archive, BLOCK_SIZE)
+                else:
+                    shutil.copyfileobj(source, output, BLOCK_SIZE)
+            blob = AttachmentBlob.objects.create(
+                digest=digest, size=size, stored_size=default_storage.size(blob_name),
+                compressed=compressed, file=blob_name,
+            )
+        AttachmentBlob.objects.filter(id=blob.id).update(references=F('references') + 1)
+        attachment.blob_id = blob.id
+        attachment.save(update_fields=['blob'])
+        replaced.append(name)
+
+    transaction.on_commit(lambda: [default_storage.delete(name) for name in replaced])
+
+
+def restore_files(apps, schema_editor):
+    AttachmentBlob = apps.get_model('bugs', 'AttachmentBlob')
+    BugAttachment = apps.get_model('bugs', 'BugAttachment')
+
+    for attachment in BugAttachment.objects.select_related('blob').iterator():
+        blob = attachment.blob
+        with default_storage.open(blob.file.name, 'rb') as stored:
+            source = gzip.GzipFile(fileobj=stored, mode='rb') if blob.compressed else stored
+            attachment.file = default_storage.save(f'bug_attachments/{attachment.filename}', File(source))
+        attachment.save(update_fields=['file'])
+
+    blob_names = list(AttachmentBlob.objects.values_list('file', flat=True))
+    transaction.on_commit(lambda: [default_storage.delete(name) for name in blob_names])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0011_similarity_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('stored_size', models.BigIntegerField()),
+                ('compressed', models.BooleanField(default=False)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bugattachment',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='bugs.attachmentblob'),
+        ),
+        migrations.RunPython(move_to_blobs, restore_files),
+        # Blank, so that unapplying the removal can add the column back to existing rows
+        migrations.AlterField(
+            model_name='bugattachment',
+            name='file',
+            field=models.FileField(blank=True, upload_to='bug_attachments/'),
+        ),
+        migrations.RemoveField(
+            model_name='bugattachment',
+            name='file',
+        ),
+        migrations.AlterField(
+            model_name='bugattachment',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='bugs.attachmentblob'),
+        ),
+        migrations.CreateModel(
+            name='AttachmentUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=100)),
+                ('size', models.BigIntegerField()),
+                ('received', models.BigIntegerField(default=0)),
+                ('block_digests', models.BinaryField(default=b'')),
+                ('client_key', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='uploads', to='bugs.attachmentblob')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachment_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['uploaded_by', 'client_key', 'updated_at'], name='upload_user_key_idx'), models.Index(fields=['updated_at'], name='upload_updated_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# bugs.previews.PREVIEW_VERSION when this migration was written
+PREVIEW_VERSION = 1
+
+
+def queue_existing_blobs(apps, schema_editor):
+    AttachmentBlob = apps.get_model('bugs', 'AttachmentBlob')
+    AttachmentPreview = apps.get_model('bugs', 'AttachmentPreview')
+    AttachmentPreview.objects.bulk_create(
+        [AttachmentPreview(blob_id=blob_id, version=PREVIEW_VERSION)
+         for blob_id in AttachmentBlob.objects.values_list('id', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0012_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentPreview',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='preview', serialize=False, to='bugs.attachmentblob')),
+                ('version', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('kind', models.CharField(blank=True, choices=[('image', 'Image thumbnails'), ('text', 'Text excerpt'), ('none', 'No preview')], max_length=10)),
+                ('image_format', models.CharField(blank=True, max_length=4)),
+                ('attempts', models.IntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=100)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after', 'blob'], name='preview_queue_idx')],
+            },
+        ),
+        migrations.RunPython(queue_existing_blobs, migrations.RunPython.noop),
+    ]
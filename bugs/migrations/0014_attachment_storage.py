@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:03
+
+import os
+import shutil
+
+import bugs.storage
+from django.conf import settings
+from django.db import migrations, models
+
+# Directories that earlier migrations and code wrote under MEDIA_ROOT
+DIRECTORIES = ('attachment_blobs', 'attachment_uploads', 'attachment_previews')
+
+
+def _move(source_root, target_root):
+    for directory in DIRECTORIES:
+        source = os.path.join(source_root, directory)
+        if not os.path.isdir(source):
+            continue
+        target = os.path.join(target_root, directory)
+        os.makedirs(target, exist_ok=True)
+        for entry in os.listdir(source):
+            shutil.move(os.path.join(source, entry), os.path.join(target, entry))
+        os.rmdir(source)
+
+
+def move_out_of_media(apps, schema_editor):
+    _move(settings.MEDIA_ROOT, bugs.storage.attachment_storage().location)
+
+
+def move_into_media(apps, schema_editor):
+    _move(bugs.storage.attachment_storage().location, settings.MEDIA_ROOT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0013_attachment_previews'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attachmentblob',
+            name='file',
+            field=models.FileField(max_length=255, storage=bugs.storage.attachment_storage, upload_to=''),
+        ),
+        migrations.RunPython(move_out_of_media, move_into_media),
+    ]
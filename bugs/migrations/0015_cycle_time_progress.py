@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:15
+
+from django.db import migrations, models
+from django.db.models import Max
+
+STATUS_COLUMNS = ('open_seconds', 'in_progress_seconds', 'resolved_seconds', 'closed_seconds', 'reopened_seconds')
+
+
+def record_progress(apps, schema_editor):
+    BugCycleTime = apps.get_model('bugs', 'BugCycleTime')
+    CycleTimeProgress = apps.get_model('bugs', 'CycleTimeProgress')
+    # Zero meant both "never left" and "left at once"; treat it as the former,
+    # as the summaries did. ``refresh_cycle_times --rebuild`` tells them apart.
+    for column in STATUS_COLUMNS:
+        BugCycleTime.objects.filter(**{column: 0}).update(**{column: None})
+    last = BugCycleTime.objects.aggregate(last=Max('last_history_id'))['last'] or 0
+    CycleTimeProgress.objects.create(pk=1, last_history_id=last)
+
+
+def zero_unvisited(apps, schema_editor):
+    BugCycleTime = apps.get_model('bugs', 'BugCycleTime')
+    for column in STATUS_COLUMNS:
+        BugCycleTime.objects.filter(**{f'{column}__isnull': True}).update(**{column: 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0014_attachment_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleTimeProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_history_id', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='bugcycletime',
+            name='closed_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bugcycletime',
+            name='in_progress_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bugcycletime',
+            name='open_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bugcycletime',
+            name='reopened_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bugcycletime',
+            name='resolved_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(record_progress, zero_unvisited),
+    ]
@@ -1,7 +1,47 @@
-from django.db import models
+import uuid
+from collections import Counter, defaultdict
+
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from projects.models import Project, ProjectVersion
 
+from .storage import attachment_storage
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def normalize(name):
+        """Canonical form used for storage and exact-match lookups."""
+        return name.strip().lower()[:50]
+    
+    @classmethod
+    def parse(cls, value):
+        """Split a comma-separated string into unique, normalized tag names."""
+        names = []
+        for part in (value or '').split(','):
+            name = cls.normalize(part)
+            if name and name not in names:
+                names.append(name)
+        return names
+    
+    @classmethod
+    def counts_for_project(cls, project):
+        """Tag frequencies for a project's bugs, most used first, in one grouped query."""
+        return (
+            BugTag.objects.filter(bug__project=project)
+            .values('tag__name')
+            .annotate(count=models.Count('id'))
+            .order_by('-count', 'tag__name')
+        )
+    
+    class Meta:
+        ordering = ['name']
+
 class Bug(models.Model):
     STATUS_CHOICES = (
         ('open', 'Open'),
@@ -45,17 +85,147 @@ class Bug(models.Model):
     resolved_at = models.DateTimeField(null=True, blank=True)
     
     # Tags for categorization
-    tags = models.CharField(max_length=200, blank=True, null=True)
+    tags = models.ManyToManyField(Tag, through='BugTag', related_name='bugs', blank=True)
     
     def __str__(self):
         return self.title
     
+    def set_tag_names(self, value):
+        """Replace the bug's tags with those in a comma-separated string."""
+        names = Tag.parse(value)
+        existing = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+        missing = [Tag(name=name) for name in names if name not in existing]
+        if missing:
+            Tag.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+        self.tags.set([existing[name] for name in names])
+    
+    # Fields the duplicate and similarity indexes are computed from
+    INDEXED_FIELDS = ('title', 'description', 'project_id')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so that saving can tell whether the indexed text changed
+        if all(name in field_names for name in cls.INDEXED_FIELDS):
+            instance._indexed_values = instance.indexed_values()
+        return instance
+    
+    def indexed_values(self):
+        return tuple(getattr(self, name) for name in self.INDEXED_FIELDS)
+    
+    def indexed_values_changed(self):
+        """Whether ``INDEXED_FIELDS`` differ from when the bug was read; True for new bugs."""
+        return getattr(self, '_indexed_values', None) != self.indexed_values()
+    
+    def save(self, *args, **kwargs):
+        # The project counters move in the same transaction as the row
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Bug.objects.filter(pk=self.pk).values_list(
+                    *ProjectBugStats.TRACKED_FIELDS
+                ).first()
+            super().save(*args, **kwargs)
+            state = ProjectBugStats.state_of(self)
+            ProjectBugStats.record_changes([(previous, state)])
+            BugDailyRollup.record_events(BugDailyRollup.events_for(
+                previous, state, self.created_at,
+                when=self.resolved_at if previous is None else None,
+            ))
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination order for bug lists
+            models.Index(fields=['-created_at', '-id'], name='bug_created_id_idx'),
+            models.Index(fields=['project', '-created_at', '-id'], name='bug_project_created_idx'),
+            models.Index(fields=['project', 'status'], name='bug_project_status_idx'),
+            models.Index(fields=['assigned_to', '-updated_at'], name='bug_assignee_updated_idx'),
+            models.Index(fields=['reported_by', '-created_at'], name='bug_reporter_created_idx'),
+            models.Index(fields=['-updated_at'], name='bug_updated_idx'),
+        ]
+
+class BugTag(models.Model):
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='bug_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='bug_tags')
+    
+    def __str__(self):
+        return f"{self.bug_id} - {self.tag}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bug', 'tag'], name='unique_bug_tag'),
+        ]
+        indexes = [
+            # Reverse direction of the unique constraint: tag -> bugs
+            models.Index(fields=['tag', 'bug'], name='bugtag_tag_bug_idx'),
+        ]
+
+class AttachmentBlob(models.Model):
+    """
+    The content of one or more attachments, stored once.
+    
+    Named by a SHA-256 content digest (see ``bugs.attachments``) and kept
+    gzip-compressed when the content is text. ``references`` counts the
+    attachments and finished uploads using it; the blob and its file are
+    removed when it drops to zero.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()  # of the original content
+    stored_size = models.BigIntegerField()
+    compressed = models.BooleanField(default=False)
+    file = models.FileField(max_length=255, storage=attachment_storage)
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} bytes, {self.references} references)"
+
+class AttachmentPreview(models.Model):
+    """
+    Thumbnails or a text excerpt of a blob, generated in the background.
+    
+    Each row is also the queue entry for its own generation; see
+    ``bugs.previews``. ``version`` is the preview format it was (or is to
+    be) generated with.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    KIND_CHOICES = (
+        ('image', 'Image thumbnails'),
+        ('text', 'Text excerpt'),
+        ('none', 'No preview'),
+    )
+    
+    blob = models.OneToOneField(AttachmentBlob, on_delete=models.CASCADE, primary_key=True,
+                                related_name='preview')
+    version = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, blank=True)
+    image_format = models.CharField(max_length=4, blank=True)  # file extension of the thumbnails
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)  # pushed back between retries
+    claimed_by = models.CharField(max_length=100, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"Preview of {self.blob_id}: {self.status}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'blob'], name='preview_queue_idx'),
+        ]
 
 class BugAttachment(models.Model):
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='bug_attachments/')
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, related_name='attachments')
     filename = models.CharField(max_length=100)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -63,6 +233,40 @@ class BugAttachment(models.Model):
     def __str__(self):
         return f"{self.bug.id} - {self.filename}"
 
+class AttachmentUpload(models.Model):
+    """
+    A chunked upload in progress, or finished and not yet attached.
+    
+    Chunks are appended to a part file named after the upload; the SHA-256
+    of every whole block received is kept in ``block_digests``, so the
+    upload can resume in a later request without reading the file back.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attachment_uploads')
+    filename = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    block_digests = models.BinaryField(default=b'')  # 32 bytes per block received
+    # Lets the browser find its unfinished upload of the same file again
+    client_key = models.CharField(max_length=255, blank=True)
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, null=True, blank=True,
+                             related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename}: {self.received} of {self.size} bytes"
+    
+    @property
+    def complete(self):
+        return self.blob_id is not None
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_by', 'client_key', 'updated_at'], name='upload_user_key_idx'),
+            models.Index(fields=['updated_at'], name='upload_updated_idx'),
+        ]
+
 class BugComment(models.Model):
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -74,16 +278,444 @@ class BugComment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['bug', 'created_at'], name='bugcomment_bug_created_idx'),
+        ]
 
 class BugHistory(models.Model):
+    EVENT_CHOICES = (
+        ('created', 'Created'),
+        ('imported', 'Imported'),
+        ('changed', 'Field changed'),
+        ('commented', 'Comment added'),
+        ('comment_deleted', 'Comment deleted'),
+        ('attached', 'Attachment added'),
+        ('attachment_deleted', 'Attachment deleted'),
+        ('other', 'Other'),
+    )
+    
+    # Longest old/new value stored; longer values (titles) are truncated
+    VALUE_LENGTH = 200
+    
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='history')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.CharField(max_length=200)  # e.g., "Changed status from Open to In Progress"
     timestamp = models.DateTimeField(auto_now_add=True)
     
+    # Structured form of the action, for querying
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES, default='other')
+    field = models.CharField(max_length=30, blank=True, default='')  # for "changed" events
+    old_value = models.CharField(max_length=VALUE_LENGTH, blank=True, default='')
+    new_value = models.CharField(max_length=VALUE_LENGTH, blank=True, default='')
+    
     def __str__(self):
         return f"{self.user.username}: {self.action}"
     
+    @classmethod
+    def field_change(cls, bug, user, field, old_value, new_value, action=None, **kwargs):
+        """
+        An unsaved "changed" entry. ``bug`` and ``user`` may be instances or
+        ids; ``None`` values are stored as empty strings.
+        """
+        old_value = '' if old_value is None else str(old_value)[:cls.VALUE_LENGTH]
+        new_value = '' if new_value is None else str(new_value)[:cls.VALUE_LENGTH]
+        if action is None:
+            action = f"Changed {field} from '{old_value}' to '{new_value}'"
+        return cls(
+            bug_id=getattr(bug, 'id', bug), user_id=getattr(user, 'id', user),
+            event='changed', field=field, old_value=old_value, new_value=new_value,
+            action=action[:200], **kwargs
+        )
+    
+    @classmethod
+    def entry(cls, bug, user, event, action, new_value=''):
+        """An unsaved entry for any other event, such as a new comment."""
+        return cls(
+            bug_id=getattr(bug, 'id', bug), user_id=getattr(user, 'id', user),
+            event=event, new_value=str(new_value)[:cls.VALUE_LENGTH], action=action[:200]
+        )
+    
     class Meta:
         ordering = ['-timestamp']
-        verbose_name_plural = "Bug histories"
\ No newline at end of file
+        verbose_name_plural = "Bug histories"
+        indexes = [
+            models.Index(fields=['-timestamp'], name='bughistory_timestamp_idx'),
+            models.Index(fields=['bug', 'timestamp'], name='bughistory_bug_timestamp_idx'),
+            # Transitions such as status resolved -> reopened within a period
+            models.Index(fields=['field', 'new_value', 'old_value', 'timestamp'],
+                         name='bughistory_field_change_idx'),
+            models.Index(fields=['event', 'timestamp'], name='bughistory_event_time_idx'),
+        ]
+
+class ProjectBugStats(models.Model):
+    """
+    Denormalized bug counts for one project.
+
+    Updated in the same transaction as every bug write that goes through
+    ``Bug.save``, the ``post_delete`` signal, ``bugs.bulk`` or
+    ``bugs.importer``. Writes that bypass those (raw SQL, a bare
+    ``QuerySet.update``, an assignee being deleted) can leave the counts
+    stale until ``manage.py reconcile_bug_stats`` runs.
+    """
+    # Bug columns the counts depend on, in the order of a bug state tuple
+    TRACKED_FIELDS = ('project_id', 'status', 'priority', 'severity', 'assigned_to_id')
+    
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='bug_stats')
+    total = models.IntegerField(default=0)
+    
+    status_open = models.IntegerField(default=0)
+    status_in_progress = models.IntegerField(default=0)
+    status_resolved = models.IntegerField(default=0)
+    status_closed = models.IntegerField(default=0)
+    status_reopened = models.IntegerField(default=0)
+    
+    priority_low = models.IntegerField(default=0)
+    priority_medium = models.IntegerField(default=0)
+    priority_high = models.IntegerField(default=0)
+    priority_critical = models.IntegerField(default=0)
+    
+    severity_minor = models.IntegerField(default=0)
+    severity_major = models.IntegerField(default=0)
+    severity_critical = models.IntegerField(default=0)
+    severity_blocker = models.IntegerField(default=0)
+    
+    open_unassigned = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.project_id}: {self.total} bugs"
+    
+    @classmethod
+    def for_project(cls, project):
+        """The stored counts for ``project``, or all zeros if it has none yet."""
+        try:
+            return project.bug_stats
+        except cls.DoesNotExist:
+            return cls(project=project)
+    
+    @classmethod
+    def counter_fields(cls):
+        return [field.name for field in cls._meta.fields if field.name != 'project']
+    
+    @staticmethod
+    def state_of(bug):
+        return tuple(getattr(bug, field) for field in ProjectBugStats.TRACKED_FIELDS)
+    
+    @classmethod
+    def counted_fields(cls, state):
+        """Counter fields that a bug in ``state`` adds one to."""
+        project_id, status, priority, severity, assigned_to_id = state
+        fields = ['total', f'status_{status}', f'priority_{priority}', f'severity_{severity}']
+        if status == 'open' and assigned_to_id is None:
+            fields.append('open_unassigned')
+        return fields
+    
+    @classmethod
+    def record_changes(cls, changes, create=True):
+        """
+        Apply ``(old_state, new_state)`` pairs of bug state tuples, with
+        ``None`` on the old side for a new bug and on the new side for a
+        deleted one. Issues one UPDATE per affected project.
+        
+        A project without a row is recounted from scratch, unless ``create``
+        is false (as when its bugs are deleted along with the project).
+        """
+        known = set(cls.counter_fields())
+        deltas = defaultdict(Counter)
+        for old, new in changes:
+            if old == new:
+                continue
+            if old is not None:
+                for field in cls.counted_fields(old):
+                    deltas[old[0]][field] -= 1
+            if new is not None:
+                for field in cls.counted_fields(new):
+                    deltas[new[0]][field] += 1
+        
+        for project_id, delta in deltas.items():
+            values = {
+                field: models.F(field) + count
+                for field, count in delta.items() if count and field in known
+            }
+            if not values:
+                continue
+            updated = cls.objects.filter(project_id=project_id).update(**values)
+            if not updated and create:
+                cls.recount([project_id])
+    
+    @classmethod
+    def count_bugs(cls, bugs):
+        """``{project_id: {counter: value}}`` for ``bugs``, in one grouped query."""
+        aggregates = {
+            'total': models.Count('id'),
+            'open_unassigned': models.Count(
+                'id', filter=models.Q(status='open', assigned_to__isnull=True)
+            ),
+        }
+        for prefix, choices in (('status', Bug.STATUS_CHOICES),
+                                ('priority', Bug.PRIORITY_CHOICES),
+                                ('severity', Bug.SEVERITY_CHOICES)):
+            for value, _ in choices:
+                aggregates[f'{prefix}_{value}'] = models.Count(
+                    'id', filter=models.Q(**{prefix: value})
+                )
+        rows = bugs.order_by().values('project_id').annotate(**aggregates)
+        return {row.pop('project_id'): row for row in rows}
+    
+    @classmethod
+    def recount(cls, project_ids=None, dry_run=False):
+        """
+        Recompute the counts of the given projects (all by default) from the
+        bugs table and rewrite the rows that disagree. Returns the ids of the
+        projects whose stored counts were wrong.
+        """
+        projects = Project.objects.all()
+        bugs = Bug.objects.all()
+        stored = cls.objects.all()
+        if project_ids is not None:
+            projects = projects.filter(id__in=project_ids)
+            bugs = bugs.filter(project_id__in=project_ids)
+            stored = stored.filter(project_id__in=project_ids)
+        
+        fields = cls.counter_fields()
+        zeros = dict.fromkeys(fields, 0)
+        actual = cls.count_bugs(bugs)
+        stored = {stats.project_id: stats for stats in stored}
+        
+        drifted = []
+        for project_id in projects.values_list('id', flat=True):
+            counts = actual.get(project_id, zeros)
+            row = stored.get(project_id)
+            current = {field: getattr(row, field) for field in fields} if row else zeros
+            if counts == current:
+                continue
+            drifted.append(project_id)
+            if not dry_run:
+                cls.objects.update_or_create(project_id=project_id, defaults=counts)
+        return drifted
+    
+    class Meta:
+        verbose_name_plural = "Project bug stats"
+
+class BugDailyRollup(models.Model):
+    """
+    Bugs opened, resolved and closed per day, project, priority and severity.
+    
+    Each event adds one to the row for the day it happened on, through
+    ``record_events`` in the same transaction as the bug write. Past days
+    are never rewritten when a bug is edited or deleted;
+    ``manage.py backfill_bug_rollups`` rebuilds the table from the bugs and
+    their history.
+    """
+    EVENT_KINDS = ('opened', 'resolved', 'closed')
+    
+    day = models.DateField()
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='bug_rollups')
+    priority = models.CharField(max_length=20)
+    severity = models.CharField(max_length=20)
+    opened = models.IntegerField(default=0)
+    resolved = models.IntegerField(default=0)
+    closed = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.day} {self.project_id} {self.priority}/{self.severity}"
+    
+    @staticmethod
+    def events_for(old_state, new_state, created_at, when=None):
+        """
+        Events for a bug going from ``old_state`` to ``new_state`` (state
+        tuples as in ``ProjectBugStats``), as ``(day, project_id, priority,
+        severity, kind)``. A status event is dated ``when``, default now.
+        """
+        project_id, status, priority, severity, _ = new_state
+        events = []
+        if old_state is None:
+            events.append((timezone.localdate(created_at), project_id, priority, severity, 'opened'))
+        if status in ('resolved', 'closed') and (old_state is None or old_state[1] != status):
+            day = timezone.localdate(when or timezone.now())
+            events.append((day, project_id, priority, severity, status))
+        return events
+    
+    @classmethod
+    def record_events(cls, events):
+        """Add one to the matching counter for each event."""
+        counts = defaultdict(Counter)
+        for day, project_id, priority, severity, kind in events:
+            counts[(day, project_id, priority, severity)][kind] += 1
+        cls.add_counts(
+            key + tuple(kinds[kind] for kind in cls.EVENT_KINDS)
+            for key, kinds in counts.items()
+        )
+    
+    @classmethod
+    def add_counts(cls, rows):
+        """
+        Upsert ``(day, project_id, priority, severity, opened, resolved,
+        closed)`` rows, adding to any counts already stored for that key.
+        """
+        ops = connection.ops
+        params = [
+            (ops.adapt_datefield_value(day), project_id, priority, severity, *counts)
+            for day, project_id, priority, severity, *counts in rows
+        ]
+        if not params:
+            return
+        table = ops.quote_name(cls._meta.db_table)
+        columns = ('day', 'project_id', 'priority', 'severity') + cls.EVENT_KINDS
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT (day, project_id, priority, severity) DO UPDATE SET "
+                + ', '.join(f"{kind} = {table}.{kind} + excluded.{kind}" for kind in cls.EVENT_KINDS),
+                params,
+            )
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'project', 'priority', 'severity'],
+                                    name='unique_bug_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['project', 'day'], name='bugrollup_project_day_idx'),
+        ]
+
+class BugCycleTime(models.Model):
+    """
+    Durations derived from one bug's status history.
+    
+    Maintained by ``bugs.analytics.refresh``, which replays history entries
+    newer than ``last_history_id`` in (bug, timestamp) order, so every entry
+    is folded in exactly once. Time in the bug's current status only counts
+    once it leaves that status. ``manage.py refresh_cycle_times --rebuild``
+    recomputes the table from scratch.
+    """
+    STATUSES = tuple(value for value, _ in Bug.STATUS_CHOICES)
+    
+    bug = models.OneToOneField(Bug, on_delete=models.CASCADE, primary_key=True,
+                               related_name='cycle_time')
+    status = models.CharField(max_length=20)
+    status_since = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)  # first time in progress
+    reopen_count = models.IntegerField(default=0)
+    
+    # Seconds from creation to the first close / first resolve or close,
+    # and from first in progress to first resolve or close
+    lead_seconds = models.FloatField(null=True, blank=True)
+    resolve_seconds = models.FloatField(null=True, blank=True)
+    cycle_seconds = models.FloatField(null=True, blank=True)
+    
+    # Total seconds spent in each status; NULL until the bug first leaves it
+    open_seconds = models.FloatField(null=True, blank=True)
+    in_progress_seconds = models.FloatField(null=True, blank=True)
+    resolved_seconds = models.FloatField(null=True, blank=True)
+    closed_seconds = models.FloatField(null=True, blank=True)
+    reopened_seconds = models.FloatField(null=True, blank=True)
+    
+    last_history_id = models.IntegerField(default=0, db_index=True)
+    
+    def __str__(self):
+        return f"Cycle time for bug #{self.bug_id}"
+    
+    def enter(self, status, when, created_at):
+        """Move to ``status`` at ``when``, closing the time spent in the previous one."""
+        elapsed = max((when - self.status_since).total_seconds(), 0)
+        if self.status in self.STATUSES:
+            field = f'{self.status}_seconds'
+            setattr(self, field, (getattr(self, field) or 0) + elapsed)
+        self.status, self.status_since = status, when
+        
+        if status == 'in_progress' and self.started_at is None:
+            self.started_at = when
+        elif status == 'reopened':
+            self.reopen_count += 1
+        if status in ('resolved', 'closed') and self.resolve_seconds is None:
+            self.resolve_seconds = max((when - created_at).total_seconds(), 0)
+            if self.started_at is not None:
+                self.cycle_seconds = max((when - self.started_at).total_seconds(), 0)
+        if status == 'closed' and self.lead_seconds is None:
+            self.lead_seconds = max((when - created_at).total_seconds(), 0)
+
+class CycleTimeProgress(models.Model):
+    """
+    The newest history entry ``bugs.analytics.refresh`` has read, status
+    change or not. A single row.
+    """
+    last_history_id = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"Cycle times up to history #{self.last_history_id}"
+
+class BugSignature(models.Model):
+    """
+    MinHash signatures of a bug's title and description.
+    
+    Maintained by ``bugs.duplicates`` together with one
+    ``BugSignatureBucket`` per band of each signature.
+    """
+    bug = models.OneToOneField(Bug, on_delete=models.CASCADE, primary_key=True,
+                               related_name='signature')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+')
+    # Packed array('I') values; empty when the text has no words
+    title = models.BinaryField()
+    description = models.BinaryField()
+    
+    def __str__(self):
+        return f"Signature of bug #{self.bug_id}"
+
+class BugSignatureBucket(models.Model):
+    """One LSH bucket a bug's signature falls into."""
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='signature_buckets')
+    # Covered by the (project, bucket, bug) index
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='+', db_index=False)
+    bucket = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"Bug #{self.bug_id} in bucket {self.bucket}"
+    
+    class Meta:
+        indexes = [
+            # Duplicate lookups read bug ids straight from the index
+            models.Index(fields=['project', 'bucket', 'bug'], name='bugbucket_project_bucket_idx'),
+        ]
+
+class BugVector(models.Model):
+    """
+    TF-IDF vector of a bug's title, description and comments.
+    
+    Maintained by ``bugs.similarity``. Words are hashed into integer
+    features; only the ``MAX_TERMS`` heaviest are kept, L2-normalized, and
+    each of them also has a ``BugVectorPosting`` row.
+    """
+    bug = models.OneToOneField(Bug, on_delete=models.CASCADE, primary_key=True,
+                               related_name='vector')
+    digest = models.CharField(max_length=32)  # of the text the vector was computed from
+    terms = models.BinaryField()  # array('I') of every distinct feature, for document counts
+    features = models.BinaryField()  # array('I'), heaviest first
+    weights = models.BinaryField()  # array('f') of float32 weights, matching features
+    
+    def __str__(self):
+        return f"Vector of bug #{self.bug_id}"
+
+class BugVectorPosting(models.Model):
+    """One feature of a bug's vector, for finding the bugs that share it."""
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='vector_postings')
+    feature = models.IntegerField()
+    weight = models.FloatField()
+    
+    def __str__(self):
+        return f"Bug #{self.bug_id}: {self.feature} = {self.weight:.3f}"
+    
+    class Meta:
+        indexes = [
+            # Heaviest bugs for a feature first, read from the index alone
+            models.Index(fields=['feature', '-weight', 'bug'], name='bugposting_feature_weight_idx'),
+        ]
+
+class BugTermStat(models.Model):
+    """How many bugs' vectors contain a feature, for its IDF weight."""
+    feature = models.IntegerField(primary_key=True)
+    documents = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.feature}: {self.documents} bugs"
@@ -0,0 +1,234 @@
+"""
+Keyset (cursor) pagination for bug listings.
+
+Bugs are ordered newest first on ``(created_at, id)``. A cursor encodes the
+sort key of the row at the edge of a page, so fetching the next or previous
+page is an indexed range scan instead of an ``OFFSET`` that gets slower the
+deeper you go. Because cursors point at values rather than positions, bugs
+inserted while someone is paging do not shift rows between pages.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import search
+
+# Columns rendered by the bug tables; everything else stays deferred.
+BUG_LIST_FIELDS = (
+    'id',
+    'title',
+    'status',
+    'priority',
+    'severity',
+    'created_at',
+    'project__id',
+    'project__name',
+    'reported_by__id',
+    'reported_by__username',
+    'assigned_to__id',
+    'assigned_to__username',
+)
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGE_SIZE = 200
+
+# Comments and history entries shown per batch on the bug detail page.
+ACTIVITY_PAGE_SIZE = 20
+
+
+def lean_bug_queryset(queryset):
+    """Join the related rows the list tables render and defer the rest."""
+    return queryset.select_related(
+        'project', 'reported_by', 'assigned_to'
+    ).only(*BUG_LIST_FIELDS)
+
+
+def encode_cursor(obj, field='created_at'):
+    """Encode the ``(field, id)`` sort key of a row as an opaque URL-safe cursor."""
+    raw = f"{getattr(obj, field).isoformat()}|{obj.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into ``(timestamp, id)``, or ``None`` if it is invalid."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, bug_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(bug_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def get_page_size(request):
+    """Read ``page_size`` from the query string, clamped to the configured bounds."""
+    default = getattr(settings, 'BUG_LIST_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, 'BUG_LIST_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+class CursorPage:
+    """A single page of bugs plus the cursors needed to move around it."""
+
+    def __init__(self, object_list, page_size, next_cursor=None, prev_cursor=None,
+                 querystring=''):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.querystring = querystring
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_bugs(queryset, request):
+    """
+    Return a ``CursorPage`` of ``queryset`` for the ``after``/``before``
+    cursors in the request.
+
+    ``after`` walks towards older bugs and ``before`` towards newer ones.
+    One extra row is fetched to find out whether another page exists, so
+    no COUNT query is needed.
+    """
+    page_size = get_page_size(request)
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before')) if not after else None
+
+    queryset = lean_bug_queryset(queryset)
+
+    if before:
+        created_at, bug_id = before
+        # Written as a range on created_at plus a tie-break so SQLite can
+        # seek the (created_at, id) index instead of OR-ing two scans.
+        queryset = queryset.filter(
+            Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=bug_id))
+        ).order_by('created_at', 'id')
+    else:
+        if after:
+            created_at, bug_id = after
+            queryset = queryset.filter(
+                Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=bug_id))
+            )
+        queryset = queryset.order_by('-created_at', '-id')
+
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if before:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, after is not None
+
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+
+    return CursorPage(
+        rows,
+        page_size,
+        next_cursor=encode_cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=encode_cursor(rows[0]) if rows and has_previous else None,
+        querystring=params.urlencode(),
+    )
+
+
+def _offset_cursor(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def paginate_ranked(text, queryset, request):
+    """
+    Return a ``CursorPage`` of full-text matches for ``text``, best first.
+
+    Relevance order has no stable sort key to seek on, so cursors here are
+    positions in the ranking. The FTS index has to score every match anyway,
+    which keeps offsets cheap. Each bug gets ``search_snippet`` and
+    ``search_score`` attributes for the template.
+    """
+    page_size = get_page_size(request)
+    after = _offset_cursor(request.GET.get('after'))
+    before = _offset_cursor(request.GET.get('before')) if after is None else None
+
+    if before is not None:
+        offset = max(0, before - page_size)
+        limit = before - offset
+    else:
+        offset = after or 0
+        limit = page_size
+
+    hits = search.search_bugs(text, queryset, limit=limit + 1, offset=offset)
+    has_next = len(hits) > limit or before is not None
+    hits = hits[:limit]
+
+    matched = queryset.model.objects.filter(id__in=[hit[0] for hit in hits])
+    bugs = lean_bug_queryset(matched).in_bulk()
+    rows = []
+    for bug_id, score, snippet in hits:
+        bug = bugs.get(bug_id)
+        if bug is not None:
+            bug.search_score = score
+            bug.search_snippet = snippet
+            rows.append(bug)
+
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+
+    end = offset + len(hits)
+    return CursorPage(
+        rows,
+        page_size,
+        next_cursor=str(end) if has_next else None,
+        prev_cursor=str(offset) if offset > 0 else None,
+        querystring=params.urlencode(),
+    )
+
+
+def older_items(queryset, field, cursor=None, limit=ACTIVITY_PAGE_SIZE):
+    """
+    Return ``(items, older_cursor)`` for a time-ordered stream such as a
+    bug's comments or history.
+
+    ``items`` are the ``limit`` newest rows of ``queryset`` older than
+    ``cursor`` (all rows when it is empty), newest first, ordered on
+    ``(field, id)``. ``older_cursor`` fetches the batch after them, and is
+    ``None`` once the stream is exhausted.
+    """
+    key = decode_cursor(cursor)
+    if key:
+        value, row_id = key
+        queryset = queryset.filter(
+            Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(id__lt=row_id))
+        )
+    items = list(queryset.order_by(f'-{field}', '-id')[:limit + 1])
+    older_cursor = encode_cursor(items[limit - 1], field) if len(items) > limit else None
+    return items[:limit], older_cursor
@@ -0,0 +1,292 @@
+"""
+Thumbnails and text excerpts of attachments, generated in the background.
+
+Previews belong to an ``AttachmentBlob``, so content attached to several
+bugs is previewed once. Saving an attachment queues an
+``AttachmentPreview`` row for its blob. Workers started by
+``manage.py run_preview_workers`` claim queued rows with a conditional
+UPDATE, as the analysis workers in ``ai_debugger.jobs`` do, and write:
+
+- for images, a thumbnail in each of ``THUMBNAIL_SIZES``
+- for text, its first and last ``EXCERPT_LINES`` lines, and in the same
+  pass the log viewer's line index and uncompressed copy (``bugs.logview``)
+
+The files go to ``attachment_previews/<digest>/v<version>/`` in
+attachment storage. A preview's URL contains the version and content
+digest, so what it points to never changes and it is served with a
+year-long immutable Cache-Control. Raising ``PREVIEW_VERSION`` gives every preview
+new URLs; ``run_preview_workers --requeue`` then regenerates them.
+"""
+import logging
+import os
+import re
+import shutil
+import threading
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import DatabaseError
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import logview
+from .attachments import iter_content, storage_path
+from .models import AttachmentBlob, AttachmentPreview
+from .storage import attachment_storage
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_VERSION = 1
+
+PREVIEW_DIR = 'attachment_previews'
+
+# Longest side in pixels; the first is shown on the bug page, the second
+# for high-density screens
+THUMBNAIL_SIZES = (160, 320)
+
+JPEG_QUALITY = 80
+
+EXCERPT_LINES = 20
+
+# Bytes read from each end of a text file for its excerpt
+EXCERPT_BYTES = 16 * 1024
+
+MAX_LINE_CHARS = 200
+
+MAX_ATTEMPTS = 3
+
+RETRY_BACKOFF_SECONDS = 10
+
+# A claimed preview not finished by then is presumed abandoned
+STALE_SECONDS = 300
+
+CACHE_SECONDS = 365 * 24 * 3600
+
+_NAME_RE = re.compile(r'(?:thumb-(\d+)\.(?:jpg|png)|excerpt\.txt)')
+
+Preview = namedtuple('Preview', 'thumbnail_url thumbnail_2x_url excerpt')
+
+
+def _directory(version, digest):
+    return f'{PREVIEW_DIR}/{digest[:2]}/{digest}/v{version}'
+
+
+def preview_path(version, digest, name):
+    """The file behind a preview URL, or None if no preview has that name."""
+    match = _NAME_RE.fullmatch(name)
+    if not match or not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return None
+    if match.group(1) and int(match.group(1)) not in THUMBNAIL_SIZES:
+        return None
+    path = attachment_storage().path(f'{_directory(version, digest)}/{name}')
+    return path if os.path.exists(path) else None
+
+
+def _url(preview, name):
+    return reverse('bugs:attachment_preview', args=[preview.version, preview.blob.digest, name])
+
+
+def preview_of(blob):
+    """What the bug page shows for ``blob``, or None while it has no preview."""
+    preview = getattr(blob, 'preview', None)
+    if preview is None or preview.status != 'done':
+        return None
+    if preview.kind == 'image':
+        small, large = (_url(preview, f'thumb-{size}.{preview.image_format}') for size in THUMBNAIL_SIZES)
+        return Preview(small, large, None)
+    if preview.kind == 'text':
+        path = preview_path(preview.version, blob.digest, 'excerpt.txt')
+        if path is not None:
+            with open(path, encoding='utf-8') as file:
+                return Preview(None, None, file.read())
+    return None
+
+
+def enqueue(blob_ids):
+    """Queue previews for blobs that have none in the current version."""
+    blob_ids = list(blob_ids)
+    AttachmentPreview.objects.filter(blob_id__in=blob_ids).exclude(version=PREVIEW_VERSION).update(
+        version=PREVIEW_VERSION, status='pending', kind='', attempts=0, error='',
+        run_after=timezone.now(), claimed_by='',
+    )
+    AttachmentPreview.objects.bulk_create(
+        [AttachmentPreview(blob_id=blob_id, version=PREVIEW_VERSION) for blob_id in blob_ids],
+        ignore_conflicts=True,
+    )
+
+
+def regenerate(blob_ids):
+    """Queue previews again that are not queued already, such as to rebuild an evicted log."""
+    blob_ids = list(blob_ids)
+    AttachmentPreview.objects.filter(blob_id__in=blob_ids, status__in=('done', 'failed')).update(
+        status='pending', attempts=0, error='', run_after=timezone.now(), claimed_by='',
+    )
+    enqueue(blob_ids)
+
+
+def requeue_outdated():
+    """Queue every blob whose preview is missing or from an older version. Returns how many."""
+    blob_ids = list(AttachmentBlob.objects.filter(
+        Q(preview__isnull=True) | ~Q(preview__version=PREVIEW_VERSION)
+    ).values_list('id', flat=True))
+    enqueue(blob_ids)
+    return len(blob_ids)
+
+
+def claim(worker):
+    """Take the oldest runnable queued preview for ``worker``, or return None."""
+    while True:
+        now = timezone.now()
+        blob_id = AttachmentPreview.objects.filter(
+            status='pending', run_after__lte=now
+        ).order_by('run_after', 'blob').values_list('blob', flat=True).first()
+        if blob_id is None:
+            return None
+        claimed = AttachmentPreview.objects.filter(blob_id=blob_id, status='pending').update(
+            status='processing', claimed_by=worker, claimed_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            # By id: a preview whose outcome could not be recorded may still
+            # be held by this worker
+            return AttachmentPreview.objects.select_related('blob').get(blob_id=blob_id)
+
+
+def requeue_stale(stale_seconds=STALE_SECONDS):
+    """Return previews whose worker went away to the queue. Returns how many."""
+    return AttachmentPreview.objects.filter(
+        status='processing', claimed_at__lt=timezone.now() - timedelta(seconds=stale_seconds)
+    ).update(status='pending', claimed_by='', run_after=timezone.now())
+
+
+def _thumbnails(blob, directory):
+    """Write the thumbnails of an image blob. Returns their file extension."""
+    with blob.file.open('rb') as file, Image.open(file) as image:
+        # JPEGs are decoded at a reduced scale straight away
+        image.draft('RGB', (max(THUMBNAIL_SIZES),) * 2)
+        image = ImageOps.exif_transpose(image)
+        alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if alpha else 'RGB')
+        extension = 'png' if alpha else 'jpg'
+        # Largest first, each one scaled down from the previous
+        for size in sorted(THUMBNAIL_SIZES, reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            _write(f'{directory}/thumb-{size}.{extension}', lambda path: image.save(
+                path, 'PNG' if alpha else 'JPEG', optimize=True, quality=JPEG_QUALITY
+            ))
+    return extension
+
+
+def _lines(data):
+    return [line.rstrip('\r')[:MAX_LINE_CHARS] for line in data.decode('utf-8', 'replace').split('\n')]
+
+
+def excerpt(chunks):
+    """The first and last ``EXCERPT_LINES`` lines of text read as byte ``chunks``."""
+    start = end = b''
+    size = newlines = 0
+    last = b''
+    for data in chunks:
+        if len(start) < EXCERPT_BYTES:
+            start += data[:EXCERPT_BYTES - len(start)]
+        end = (end + data)[-EXCERPT_BYTES:]
+        size += len(data)
+        newlines += data.count(b'\n')
+        last = data
+    line_count = newlines + (1 if size and not last.endswith(b'\n') else 0)
+
+    if size <= EXCERPT_BYTES:
+        lines = _lines(start.removesuffix(b'\n'))
+        if len(lines) <= 2 * EXCERPT_LINES:
+            return '\n'.join(lines)
+        head, tail = lines[:EXCERPT_LINES], lines[-EXCERPT_LINES:]
+    else:
+        head = _lines(start)[:EXCERPT_LINES]
+        # The first line of the window is most likely cut
+        tail = _lines(end.removesuffix(b'\n'))[1:][-EXCERPT_LINES:]
+    omitted = max(line_count - len(head) - len(tail), 0)
+    return '\n'.join([*head, f'... {omitted} lines omitted ...', *tail])
+
+
+def _write(name, save):
+    """Write stored file ``name`` through ``save(path)``, replacing it only once complete."""
+    path = storage_path(name)
+    save(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def generate(preview):
+    """Write the preview files of a claimed preview's blob. Returns (kind, image format)."""
+    blob = preview.blob
+    directory = _directory(preview.version, blob.digest)
+    if blob.compressed:
+        # Only text is stored compressed
+        text = excerpt(logview.fill_cache(blob, iter_content(blob)))
+        _write(f'{directory}/excerpt.txt', lambda path: _write_text(path, text))
+        logview.evict(keep=blob)
+        return 'text', ''
+    try:
+        return 'image', _thumbnails(blob, directory)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return 'none', ''
+
+
+def run(preview):
+    """Generate one claimed preview and record the outcome. Returns True if it is done."""
+    held = AttachmentPreview.objects.filter(
+        blob_id=preview.blob_id, status='processing', claimed_by=preview.claimed_by
+    )
+    try:
+        kind, image_format = generate(preview)
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        logger.warning('Preview of blob %s failed (attempt %s): %s', preview.blob_id, preview.attempts, error)
+        if preview.attempts >= MAX_ATTEMPTS:
+            held.update(status='failed', error=error)
+        else:
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (preview.attempts - 1)
+            held.update(status='pending', error=error, claimed_by='',
+                        run_after=timezone.now() + timedelta(seconds=delay))
+        return False
+    held.update(status='done', kind=kind, image_format=image_format, error='')
+    return True
+
+
+def work(worker, poll_seconds=1.0, stop=None, drain=False):
+    """
+    Claim and generate previews until ``stop`` is set, sleeping
+    ``poll_seconds`` when the queue is empty. With ``drain``, return once
+    it is empty.
+    """
+    stop = stop or threading.Event()
+    requeue_stale()
+    while not stop.is_set():
+        try:
+            preview = claim(worker)
+        except DatabaseError:
+            logger.exception('Claiming a preview failed')
+            preview = None
+        if preview is None:
+            if drain:
+                return
+            # Idle, so look for previews left behind by workers that died
+            requeue_stale()
+            stop.wait(poll_seconds)
+            continue
+        try:
+            run(preview)
+        except DatabaseError:
+            # It stays claimed and is retried once requeue_stale notices
+            logger.exception('Recording the preview of blob %s failed', preview.blob_id)
+
+
+def delete_files(digest):
+    """Remove the preview files of a deleted blob, in every version."""
+    shutil.rmtree(attachment_storage().path(f'{PREVIEW_DIR}/{digest[:2]}/{digest}'), ignore_errors=True)
@@ -0,0 +1,222 @@
+"""
+Reading and rebuilding the daily bug rollups.
+
+``BugDailyRollup`` holds one row per day, project, priority and severity
+that saw any activity, so a time series costs a range scan over the days
+asked for, whatever the total number of bugs. Series are returned as
+columnar arrays (one list per measure, aligned with ``buckets``) with
+empty buckets filled in as zeros.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Bug, BugDailyRollup, BugHistory
+
+GRANULARITIES = ('day', 'week', 'month')
+
+DEFAULT_RANGE_DAYS = 365
+
+# Longest series a single request may ask for.
+MAX_BUCKETS = 1000
+
+# Dimensions a series can be split by.
+BREAKDOWNS = ('priority', 'severity', 'project')
+
+
+class RollupRangeError(ValueError):
+    pass
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing ``day``."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def bucket_count(start, end, granularity):
+    """How many buckets ``bucket_range`` returns, without building them."""
+    if granularity == 'month':
+        return max((end.year - start.year) * 12 + end.month - start.month + 1, 0)
+    days = (end - bucket_start(start, granularity)).days
+    if granularity == 'week':
+        return max(days // 7 + 1, 0)
+    return max(days + 1, 0)
+
+
+def bucket_range(start, end, granularity):
+    """Every bucket start from ``start`` to ``end`` inclusive."""
+    buckets = []
+    day = bucket_start(start, granularity)
+    for index in range(bucket_count(start, end, granularity)):
+        if index:
+            # Only stepped when needed, so a range ending at date.max works
+            day = _next_bucket(day, granularity)
+        buckets.append(day)
+    return buckets
+
+
+def _parse_day(value, default):
+    if not value:
+        return default
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise RollupRangeError(f'"{value}" is not a valid YYYY-MM-DD date')
+    return day
+
+
+def parse_range(params):
+    """
+    Read ``start``, ``end`` (ISO dates) and ``granularity`` from a QueryDict.
+
+    Defaults to the last year by month. Raises ``RollupRangeError`` for bad
+    or oversized ranges.
+    """
+    granularity = params.get('granularity') or 'month'
+    if granularity not in GRANULARITIES:
+        raise RollupRangeError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    end = _parse_day(params.get('end'), timezone.localdate())
+    try:
+        start = _parse_day(params.get('start'), end - timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    except OverflowError:
+        raise RollupRangeError('the default range would start before year 1; give a start date')
+    if start > end:
+        raise RollupRangeError('start must not be after end')
+    if bucket_count(start, end, granularity) > MAX_BUCKETS:
+        raise RollupRangeError(f'at most {MAX_BUCKETS} {granularity} buckets per request')
+    return start, end, granularity
+
+
+def _bucket_expression(granularity):
+    if granularity == 'week':
+        return TruncWeek('day')
+    if granularity == 'month':
+        return TruncMonth('day')
+    return F('day')
+
+
+def series(start, end, granularity='day', project_id=None, by=None, project_ids=None):
+    """
+    Opened/resolved/closed counts per bucket between ``start`` and ``end``,
+    for one project or, with ``project_ids``, only those projects.
+
+    Returns ``{'granularity', 'start', 'end', 'buckets', 'opened',
+    'resolved', 'closed'}`` with one entry per bucket in each list. With
+    ``by`` (one of ``BREAKDOWNS``), a ``series`` dict maps each value of
+    that dimension to its own ``{'opened': [...], ...}`` columns.
+    """
+    rows = BugDailyRollup.objects.filter(day__range=(start, end))
+    if project_id:
+        rows = rows.filter(project_id=project_id)
+    if project_ids is not None:
+        rows = rows.filter(project_id__in=project_ids)
+
+    group = ['bucket'] + ([f'{by}_id' if by == 'project' else by] if by else [])
+    rows = (
+        rows.annotate(bucket=_bucket_expression(granularity))
+        .values(*group)
+        .annotate(**{kind: Sum(kind) for kind in BugDailyRollup.EVENT_KINDS})
+        .order_by()
+    )
+
+    buckets = bucket_range(start, end, granularity)
+    position = {bucket: index for index, bucket in enumerate(buckets)}
+
+    def empty_columns():
+        return {kind: [0] * len(buckets) for kind in BugDailyRollup.EVENT_KINDS}
+
+    totals = empty_columns()
+    breakdown = defaultdict(empty_columns)
+    for row in rows:
+        index = position[bucket_start(row['bucket'], granularity)]
+        for kind in BugDailyRollup.EVENT_KINDS:
+            totals[kind][index] += row[kind]
+            if by:
+                breakdown[str(row[group[1]])][kind][index] += row[kind]
+
+    result = {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': [bucket.isoformat() for bucket in buckets],
+        **totals,
+    }
+    if by:
+        result['series'] = dict(breakdown)
+    return result
+
+
+def _status_changes(status):
+    """History rows recording a change of status to ``status``."""
+    return BugHistory.objects.filter(field='status', new_value=status)
+
+
+def backfill():
+    """
+    Rebuild every rollup row from the bugs table and status history.
+
+    Bugs are opened on their creation date and resolved or closed on the
+    date of each recorded status change event. Bugs that reached their status
+    without one (such as imported ones) count on ``resolved_at``, or failing
+    that their last update. Returns the number of rows written.
+
+    Rows are keyed by each bug's current project, priority and severity,
+    whereas the rows kept up to date as bugs change use the values at the
+    time of each event. A backfill therefore moves past events of bugs
+    that were reprioritised or moved since into their present buckets.
+    """
+    counts = defaultdict(lambda: dict.fromkeys(BugDailyRollup.EVENT_KINDS, 0))
+    key_fields = ('day', 'project_id', 'priority', 'severity')
+
+    def add(rows, kind):
+        for row in rows:
+            counts[tuple(row[field] for field in key_fields)][kind] += row['count']
+
+    add(
+        Bug.objects.annotate(day=TruncDate('created_at'))
+        .values(*key_fields).annotate(count=Count('id')).order_by(),
+        'opened',
+    )
+    for status in ('resolved', 'closed'):
+        changes = _status_changes(status)
+        add(
+            changes.annotate(
+                day=TruncDate('timestamp'), project_id=F('bug__project_id'),
+                priority=F('bug__priority'), severity=F('bug__severity'),
+            ).values(*key_fields).annotate(count=Count('id')).order_by(),
+            status,
+        )
+        add(
+            Bug.objects.filter(status=status)
+            .exclude(id__in=changes.values('bug_id'))
+            .annotate(day=TruncDate(Coalesce('resolved_at', 'updated_at')))
+            .values(*key_fields).annotate(count=Count('id')).order_by(),
+            status,
+        )
+
+    with transaction.atomic():
+        BugDailyRollup.objects.all().delete()
+        BugDailyRollup.add_counts(
+            key + tuple(kinds[kind] for kind in BugDailyRollup.EVENT_KINDS)
+            for key, kinds in counts.items()
+        )
+    return len(counts)
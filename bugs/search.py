@@ -0,0 +1,181 @@
+"""
+Full-text search for bugs backed by an SQLite FTS5 index.
+
+The ``bugs_bug_fts`` virtual table holds one row per bug (``rowid`` is the
+bug id) with the title, description, tags and the concatenated text of all
+of the bug's comments. It is kept in sync by the signal handlers in
+``bugs.signals`` and can be rebuilt from scratch with
+``manage.py rebuild_search_index``.
+
+On databases without FTS5 the helpers here report the index as unavailable
+and callers fall back to ``icontains`` filtering.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = 'bugs_bug_fts'
+
+# bm25() weights, in column order: title, description, tags, comments.
+COLUMN_WEIGHTS = (10.0, 1.0, 5.0, 1.0)
+
+# Control-character markers wrapped around matches by snippet(); swapped for
+# <mark> tags after the surrounding text has been escaped.
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+_DOCUMENT_SELECT = (
+    "SELECT b.id, b.title, b.description, "
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM bugs_bugtag bt "
+    "JOIN bugs_tag t ON t.id = bt.tag_id WHERE bt.bug_id = b.id), ''), "
+    "COALESCE((SELECT group_concat(c.content, ' ') FROM bugs_bugcomment c "
+    "WHERE c.bug_id = b.id), '') "
+    "FROM bugs_bug b"
+)
+
+# Stay under SQLite's default limit on bound parameters per statement.
+INDEX_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = None
+
+
+def create_index():
+    """Create the FTS5 table if the database supports it."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, description, tags, comments, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    return True
+
+
+def is_available():
+    """Return True when the FTS table exists on the default database."""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def index_bug(bug_id):
+    """(Re)index a single bug, or drop it from the index if it no longer exists."""
+    index_bugs([bug_id])
+
+
+def index_bugs(bug_ids):
+    """(Re)index a batch of bugs with one DELETE and one INSERT ... SELECT."""
+    if not is_available():
+        return
+    bug_ids = list(bug_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(bug_ids), INDEX_BATCH_SIZE):
+            batch = bug_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags, comments) "
+                + _DOCUMENT_SELECT + f" WHERE b.id IN ({placeholders})",
+                batch,
+            )
+
+
+def remove_bug(bug_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [bug_id])
+
+
+def rebuild_index():
+    """Repopulate the whole index in a single INSERT ... SELECT. Returns the row count."""
+    global _available
+    _available = None
+    if not create_index():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags, comments) "
+            + _DOCUMENT_SELECT
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word is quoted (so user input can never be parsed as FTS syntax)
+    and turned into a prefix term, so "crash rep" matches "crash report".
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filter_queryset(queryset, text):
+    """Restrict ``queryset`` to bugs matching ``text``, without ranking them."""
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    )
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(_HIGHLIGHT_START, '<mark>')
+        .replace(_HIGHLIGHT_END, '</mark>')
+    )
+
+
+def ranking_sql(match, queryset=None, limit=50, offset=0):
+    """The SQL and parameters ``search_bugs`` runs for a MATCH expression."""
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    sql = (
+        f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score, "
+        f"snippet({FTS_TABLE}, -1, %s, %s, '…', 16) "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [_HIGHLIGHT_START, _HIGHLIGHT_END, match]
+
+    if queryset is not None and queryset.query.where:
+        subquery, subparams = queryset.values('id').order_by().query.sql_with_params()
+        sql += f" AND rowid IN ({subquery})"
+        params.extend(subparams)
+
+    sql += " ORDER BY score LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+    return sql, params
+
+
+def search_bugs(text, queryset=None, limit=50, offset=0):
+    """
+    Return ``(bug_id, score, snippet)`` tuples for the best BM25 matches.
+
+    ``queryset`` optionally restricts matches to the bugs it selects, so the
+    regular status/priority/project filters compose with the text search.
+    Lower scores rank higher, as with SQLite's ``bm25()``.
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    sql, params = ranking_sql(match, queryset, limit, offset)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], row[1], _highlight(row[2])) for row in cursor.fetchall()]
@@ -0,0 +1,161 @@
+"""
+Sending stored attachment files: conditional requests, byte ranges and
+sendfile offload.
+
+``serve_file`` answers ``If-None-Match`` and ``If-Modified-Since`` with 304
+and a single ``Range`` with 206 (honouring ``If-Range``), so interrupted
+downloads resume and media players can seek. With ``ATTACHMENT_SENDFILE``
+set, the response only names the file in an ``X-Sendfile`` or
+``X-Accel-Redirect`` header and the front server sends the bytes, ranges
+included; Django never reads the file. Otherwise the file goes out
+through ``FileResponse``, limited to the requested range. The limited file
+still has a ``fileno()``, so WSGI servers with a ``wsgi.file_wrapper``
+(gunicorn, uWSGI) can send it with sendfile(2).
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .storage import attachment_storage
+
+DEFAULT_ACCEL_PREFIX = '/protected-attachments/'
+
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileRange:
+    """``length`` bytes of an open file from ``start`` on, read like a file."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # sendfile(2) starts at the current offset and stops at Content-Length
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def requested_range(request, size, etag, last_modified):
+    """
+    ``(start, length)`` of the single byte range requested, or None to send
+    the whole file. Raises RangeNotSatisfiable for a range past the end.
+    """
+    header = request.headers.get('Range', '').strip()
+    if not header or request.method != 'GET':
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        # The client's copy is outdated; it gets the whole file
+        return None
+    match = _RANGE_RE.fullmatch(header)
+    if not match or match.groups() == ('', ''):
+        # Several ranges or another unit; sending everything is allowed
+        return None
+    first, last = match.groups()
+    if not first:
+        length = min(int(last), size)
+        if not length:
+            raise RangeNotSatisfiable()
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, end - start + 1
+
+
+def _headers(etag, last_modified, disposition, encoding, cache_control):
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control,
+    }
+    if disposition:
+        headers['Content-Disposition'] = disposition
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return headers
+
+
+def serve_file(request, name, content_type, etag, last_modified, disposition=None, encoding=None,
+               cache_control='private, no-cache'):
+    """
+    Respond with the stored file ``name``. ``etag`` must identify its
+    bytes (and ``encoding``); ``last_modified`` is a Unix timestamp.
+    """
+    etag = quote_etag(etag)
+    last_modified = int(last_modified)
+    headers = _headers(etag, last_modified, disposition, encoding, cache_control)
+    base = HttpResponse(content_type=content_type, headers=headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=base)
+    if conditional is not base:
+        return conditional
+
+    path = attachment_storage().path(name)
+    offload = getattr(settings, 'ATTACHMENT_SENDFILE', None)
+    if offload == 'x-accel-redirect':
+        prefix = getattr(settings, 'ATTACHMENT_ACCEL_PREFIX', DEFAULT_ACCEL_PREFIX)
+        base['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+        return base
+    if offload == 'x-sendfile':
+        base['X-Sendfile'] = path
+        return base
+
+    size = os.path.getsize(path)
+    try:
+        byte_range = requested_range(request, size, etag, last_modified)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, length = byte_range or (0, size)
+    response = FileResponse(
+        FileRange(open(path, 'rb'), start, length), content_type=content_type,
+        status=206 if byte_range else 200, headers=headers,
+    )
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    return response
+
+
+def serve_stream(request, chunks, size, content_type, etag, last_modified, disposition=None,
+                 cache_control='private, no-cache'):
+    """
+    Respond with content produced by ``chunks`` (such as a decompressed
+    blob), which cannot be offloaded or sent in ranges.
+    """
+    etag = quote_etag(etag)
+    last_modified = int(last_modified)
+    headers = _headers(etag, last_modified, disposition, None, cache_control)
+    base = HttpResponse(content_type=content_type, headers=headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=base)
+    if conditional is not base:
+        return conditional
+    response = StreamingHttpResponse(chunks, content_type=content_type, headers=headers)
+    response['Content-Length'] = size
+    response['Accept-Ranges'] = 'none'
+    return response
@@ -0,0 +1,108 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import attachments, duplicates, facets, logview, previews, search, similarity
+from .live import hub
+from .models import AttachmentBlob, AttachmentUpload, Bug, BugAttachment, BugComment, BugHistory, ProjectBugStats
+
+
+@receiver(post_save, sender=Bug)
+def index_saved_bug(sender, instance, **kwargs):
+    search.index_bug(instance.id)
+    if instance.indexed_values_changed():
+        duplicates.index_bug(instance)
+        similarity.index_bug(instance.id)
+        # A second save of the same instance has nothing new to index
+        instance._indexed_values = instance.indexed_values()
+
+
+@receiver(post_save, sender=Bug)
+@receiver(post_delete, sender=Bug)
+def retire_facet_counts(sender, **kwargs):
+    transaction.on_commit(facets.invalidate)
+
+
+@receiver(pre_delete, sender=Bug)
+def uncount_deleted_bug_terms(sender, instance, **kwargs):
+    similarity.remove_bug(instance.id)
+
+
+@receiver(post_delete, sender=Bug)
+def unindex_deleted_bug(sender, instance, **kwargs):
+    search.remove_bug(instance.id)
+
+
+@receiver(post_delete, sender=Bug)
+def uncount_deleted_bug(sender, instance, **kwargs):
+    # Sent inside the delete transaction, for cascades and queryset deletes
+    # too. When the project itself is going, its stats row may already be
+    # gone, so a missing row is not recreated.
+    ProjectBugStats.record_changes([(ProjectBugStats.state_of(instance), None)], create=False)
+
+
+@receiver(m2m_changed, sender=Bug.tags.through)
+def reindex_retagged_bug(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    transaction.on_commit(facets.invalidate)
+    if not reverse:
+        search.index_bug(instance.id)
+    elif pk_set:
+        for bug_id in pk_set:
+            search.index_bug(bug_id)
+
+
+@receiver(post_save, sender=BugComment)
+@receiver(post_delete, sender=BugComment)
+def reindex_commented_bug(sender, instance, **kwargs):
+    # Comment text is folded into the bug's document, so the bug is
+    # reindexed; if the bug itself is being deleted this just drops the row.
+    search.index_bug(instance.bug_id)
+    # Its vector after commit, when a bug being deleted is already gone
+    transaction.on_commit(lambda: similarity.index_bug(instance.bug_id))
+
+
+@receiver(post_save, sender=BugHistory)
+def announce_history(sender, instance, created, **kwargs):
+    # Live streams read the entry back from the database, so wait until
+    # it is visible to other connections
+    if created:
+        transaction.on_commit(hub.notify)
+
+
+@receiver(post_save, sender=BugAttachment)
+def reference_attached_blob(sender, instance, created, **kwargs):
+    if created:
+        AttachmentBlob.objects.filter(id=instance.blob_id).update(references=F('references') + 1)
+
+
+@receiver(post_save, sender=BugAttachment)
+def queue_attachment_preview(sender, instance, created, **kwargs):
+    if created:
+        previews.enqueue([instance.blob_id])
+
+
+@receiver(post_delete, sender=AttachmentBlob)
+def delete_blob_previews(sender, instance, **kwargs):
+    transaction.on_commit(lambda: previews.delete_files(instance.digest))
+
+
+@receiver(post_delete, sender=AttachmentBlob)
+def delete_blob_log_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: logview.delete_files(instance))
+
+
+@receiver(post_delete, sender=BugAttachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    # Sent for cascades from a deleted bug too, so shared content is only
+    # removed with its last attachment
+    attachments.release(instance.blob_id)
+
+
+@receiver(post_delete, sender=AttachmentUpload)
+def release_upload(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        attachments.release(instance.blob_id)
+    transaction.on_commit(lambda: attachments.remove_part_file(instance))
@@ -0,0 +1,275 @@
+"""
+"Similar bugs" for the bug detail page, from TF-IDF vectors.
+
+Every bug's title (counted ``TITLE_WEIGHT`` times), description and
+comments are reduced to words, and the words are hashed into integer
+features. A bug's vector keeps its ``MAX_TERMS`` heaviest features,
+weighted ``(1 + log tf) * idf`` and L2-normalized, as float32 arrays in a
+``BugVector`` row. Each kept feature also gets a ``BugVectorPosting``
+row, indexed by (feature, weight). ``BugTermStat`` counts the bugs
+containing each feature, for the IDF.
+
+``similar_bugs`` reads the ``POSTINGS_PER_TERM`` heaviest postings of
+each of the bug's features straight from the index, and sums query weight
+times posting weight per bug: the dot product of the two normalized
+vectors, except that bugs far down a common feature's postings only get
+credit for their other features. No other part of the table is read.
+Results are cached per bug until its own vector changes or
+``CACHE_SECONDS`` pass.
+
+Vectors are recomputed when a bug's text changes or one of its comments
+is saved. Imported bugs are left out of the import itself;
+``manage.py rebuild_similarity_index --missing`` computes their vectors
+afterwards. The IDF of a feature is read when a vector is computed, so
+older vectors drift slowly as the corpus grows.
+``manage.py rebuild_similarity_index`` recomputes everything from scratch.
+"""
+import hashlib
+import heapq
+import math
+import zlib
+from array import array
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .duplicates import words
+from .models import Bug, BugComment, BugTermStat, BugVector, BugVectorPosting, ProjectBugStats
+
+TITLE_WEIGHT = 3
+
+# Words read per bug, so that pasted logs cannot dominate
+MAX_WORDS = 5000
+
+MAX_TERMS = 32
+
+POSTINGS_PER_TERM = 250
+
+CACHE_SECONDS = 600
+
+BATCH_SIZE = 500
+
+
+def _feature(word):
+    # 31 bits, to fit a signed integer column on every backend
+    return zlib.crc32(word.encode()) & 0x7fffffff
+
+
+def _load(data, typecode):
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+
+def _documents(bug_ids):
+    """``{bug_id: (digest, Counter of features)}`` for the given bugs that exist."""
+    texts = {
+        bug_id: [title, description]
+        for bug_id, title, description in Bug.objects.filter(id__in=bug_ids).values_list(
+            'id', 'title', 'description'
+        )
+    }
+    comments = BugComment.objects.filter(bug_id__in=list(texts)).order_by('bug_id', 'id')
+    for bug_id, content in comments.values_list('bug_id', 'content'):
+        texts[bug_id].append(content)
+
+    documents = {}
+    for bug_id, (title, *body) in texts.items():
+        digest = hashlib.md5('\0'.join([title, *body]).encode()).hexdigest()
+        counts = Counter()
+        for word in words(title):
+            counts[_feature(word)] += TITLE_WEIGHT
+        counts.update(_feature(word) for word in words(' '.join(body))[:MAX_WORDS])
+        documents[bug_id] = (digest, counts)
+    return documents
+
+
+def _bug_count():
+    return ProjectBugStats.objects.aggregate(total=Sum('total'))['total'] or 0
+
+
+def _document_counts(features):
+    features = list(features)
+    counts = {}
+    for start in range(0, len(features), BATCH_SIZE):
+        counts.update(BugTermStat.objects.filter(
+            feature__in=features[start:start + BATCH_SIZE]
+        ).values_list('feature', 'documents'))
+    return counts
+
+
+def _add_document_counts(delta):
+    """Add ``{feature: change}`` to the stored document counts."""
+    rows = [(feature, change) for feature, change in delta.items() if change]
+    if not rows:
+        return
+    table = connection.ops.quote_name(BugTermStat._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (feature, documents) VALUES (%s, %s) "
+            f"ON CONFLICT (feature) DO UPDATE SET documents = {table}.documents + excluded.documents",
+            rows,
+        )
+
+
+def vectorize(counts, document_counts, bug_count):
+    """``(features, weights)`` arrays for a Counter of features, heaviest first."""
+    weighted = heapq.nlargest(MAX_TERMS, (
+        ((1 + math.log(tf)) * (math.log((1 + bug_count) / (1 + document_counts.get(feature, 0))) + 1),
+         feature)
+        for feature, tf in counts.items()
+    ))
+    norm = math.sqrt(sum(weight * weight for weight, _ in weighted)) or 1.0
+    return (array('I', [feature for _, feature in weighted]),
+            array('f', [weight / norm for weight, _ in weighted]))
+
+
+def _write(vectors):
+    """Replace the vectors and postings of ``{bug_id: (digest, terms, features, weights)}``."""
+    ids = list(vectors)
+    BugVectorPosting.objects.filter(bug_id__in=ids).delete()
+    BugVector.objects.filter(bug_id__in=ids).delete()
+    BugVector.objects.bulk_create([
+        BugVector(bug_id=bug_id, digest=digest, terms=terms.tobytes(),
+                  features=features.tobytes(), weights=weights.tobytes())
+        for bug_id, (digest, terms, features, weights) in vectors.items()
+    ])
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO %s (bug_id, feature, weight) VALUES (%%s, %%s, %%s)'
+            % ops.quote_name(BugVectorPosting._meta.db_table),
+            [
+                (bug_id, feature, weight)
+                for bug_id, (_, _, features, weights) in vectors.items()
+                for feature, weight in zip(features, weights)
+            ],
+        )
+
+
+def index_bugs(bug_ids):
+    """Recompute the vectors of the given bugs whose text changed."""
+    bug_ids = list(bug_ids)
+    with transaction.atomic():
+        for start in range(0, len(bug_ids), BATCH_SIZE):
+            _index_batch(bug_ids[start:start + BATCH_SIZE])
+
+
+def _index_batch(bug_ids):
+    documents = _documents(bug_ids)
+    stored = {
+        bug_id: (digest, set(_load(terms, 'I')))
+        for bug_id, digest, terms in BugVector.objects.filter(bug_id__in=bug_ids).values_list(
+            'bug_id', 'digest', 'terms'
+        )
+    }
+    documents = {
+        bug_id: document for bug_id, document in documents.items()
+        if bug_id not in stored or stored[bug_id][0] != document[0]
+    }
+    if not documents:
+        return
+
+    delta = Counter()
+    for bug_id, (_, counts) in documents.items():
+        old = stored.get(bug_id, (None, set()))[1]
+        delta.update(dict.fromkeys(counts.keys() - old, 1))
+        delta.subtract(dict.fromkeys(old - counts.keys(), 1))
+    _add_document_counts(delta)
+
+    document_counts = _document_counts(
+        {feature for _, counts in documents.values() for feature in counts}
+    )
+    bug_count = _bug_count()
+    _write({
+        bug_id: (digest, array('I', sorted(counts)), *vectorize(counts, document_counts, bug_count))
+        for bug_id, (digest, counts) in documents.items()
+    })
+
+
+def index_bug(bug_id):
+    index_bugs([bug_id])
+
+
+def index_missing(batch_size=BATCH_SIZE):
+    """Compute the vectors of bugs without one, a batch per transaction. Returns the number indexed."""
+    count = 0
+    after_id = 0
+    while True:
+        bug_ids = list(
+            Bug.objects.filter(id__gt=after_id, vector__isnull=True)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not bug_ids:
+            return count
+        index_bugs(bug_ids)
+        count += len(bug_ids)
+        after_id = bug_ids[-1]
+
+
+def remove_bug(bug_id):
+    """Take a bug that is about to be deleted out of the document counts."""
+    terms = BugVector.objects.filter(bug_id=bug_id).values_list('terms', flat=True).first()
+    if terms is not None:
+        _add_document_counts(dict.fromkeys(_load(terms, 'I'), -1))
+
+
+def rebuild_index():
+    """Recompute every vector and document count. Returns the number of bugs indexed."""
+    bug_ids = list(Bug.objects.order_by('id').values_list('id', flat=True))
+    with transaction.atomic():
+        BugVectorPosting.objects.all().delete()
+        BugVector.objects.all().delete()
+        BugTermStat.objects.all().delete()
+
+        # First pass: document counts over the whole corpus
+        document_counts = Counter()
+        for start in range(0, len(bug_ids), BATCH_SIZE):
+            for _, counts in _documents(bug_ids[start:start + BATCH_SIZE]).values():
+                document_counts.update(counts.keys())
+        _add_document_counts(document_counts)
+
+        bug_count = len(bug_ids)
+        for start in range(0, len(bug_ids), BATCH_SIZE):
+            _write({
+                bug_id: (digest, array('I', sorted(counts)),
+                         *vectorize(counts, document_counts, bug_count))
+                for bug_id, (digest, counts) in _documents(bug_ids[start:start + BATCH_SIZE]).items()
+            })
+    return len(bug_ids)
+
+
+def _nearest(bug_id, features, weights, limit):
+    table = connection.ops.quote_name(BugVectorPosting._meta.db_table)
+    branch = (
+        f"SELECT * FROM (SELECT bug_id, weight, %s AS term FROM {table} "
+        f"WHERE feature = %s ORDER BY weight DESC LIMIT {POSTINGS_PER_TERM})"
+    )
+    params = []
+    for term, feature in enumerate(features):
+        params.extend([term, feature])
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join([branch] * len(features)), params)
+        rows = cursor.fetchall()
+
+    scores = defaultdict(float)
+    for other_id, weight, term in rows:
+        scores[other_id] += weights[term] * weight
+    scores.pop(bug_id, None)
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def similar_bugs(bug_id, limit=5):
+    """``(bug_id, similarity)`` for the bugs most like ``bug_id``, best first."""
+    vector = BugVector.objects.filter(bug_id=bug_id).values_list('features', 'weights').first()
+    if vector is None or not vector[0]:
+        return []
+    features, weights = bytes(vector[0]), bytes(vector[1])
+    key = f'similar_bugs:{bug_id}:{limit}:{zlib.crc32(features + weights)}'
+    result = cache.get(key)
+    if result is None:
+        result = _nearest(bug_id, _load(features, 'I'), _load(weights, 'f'), limit)
+        cache.set(key, result, CACHE_SECONDS)
+    return result
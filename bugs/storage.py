@@ -0,0 +1,32 @@
+"""
+Storage for attachment content and previews.
+
+It lives under ``ATTACHMENT_ROOT`` rather than ``MEDIA_ROOT``, because
+media files may be served to anyone, while attachments are only sent by
+``bugs.views`` after checking project membership.
+"""
+import os
+from functools import cache
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+
+class AttachmentStorage(FileSystemStorage):
+    """Files under ``ATTACHMENT_ROOT``, following it when tests override it."""
+
+    @cached_property
+    def base_location(self):
+        return getattr(settings, 'ATTACHMENT_ROOT', os.path.join(settings.BASE_DIR, 'attachments'))
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'ATTACHMENT_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+
+@cache
+def attachment_storage():
+    return AttachmentStorage()
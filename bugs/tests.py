@@ -1,3 +1,1394 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from collections import Counter
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from . import (
+    analytics, attachments, duplicates, export, facets, importer, live, logview, pagination, previews,
+    rollups, search, similarity,
+)
+from .importer import BugImporter
+from .management.commands import check_query_plans
+from .models import (
+    AttachmentBlob, AttachmentPreview, AttachmentUpload, Bug, BugAttachment, BugComment, BugCycleTime,
+    BugDailyRollup, BugHistory, BugTermStat, BugVector, ProjectBugStats, Tag,
+)
+from .storage import attachment_storage
+from projects.models import Project, ProjectVersion
+
+# Migration modules are not importable by name, starting with a digit
+structured_history = importlib.import_module('bugs.migrations.0008_structured_history')
+
+BLOCK = 1024
+
+
+class AttachmentTestCase(TestCase):
+    """Runs with attachments stored in a temporary directory."""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(ATTACHMENT_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('reporter', password='secret')
+
+
+@mock.patch.object(attachments, 'BLOCK_SIZE', BLOCK)
+class ChunkedUploadTests(AttachmentTestCase):
+
+    def start(self, content):
+        return attachments.start_upload(self.user, 'trace.bin', len(content))
+
+    def test_chunks_in_order_make_a_blob(self):
+        content = bytes(range(256)) * 10
+        upload = self.start(content)
+        for offset in range(0, len(content), 2 * BLOCK):
+            attachments.write_chunk(upload, offset, io.BytesIO(content[offset:offset + 2 * BLOCK]),
+                                    len(content[offset:offset + 2 * BLOCK]))
+
+        blob = AttachmentBlob.objects.get(id=upload.blob_id)
+        digests = b''.join(
+            hashlib.sha256(content[i:i + BLOCK]).digest() for i in range(0, len(content), BLOCK)
+        )
+        self.assertEqual(blob.digest, hashlib.sha256(digests).hexdigest())
+        self.assertEqual(b''.join(attachments.iter_content(blob)), content)
+
+    def test_text_upload_is_stored_compressed(self):
+        content = b'ERROR something failed\n' * 100
+        upload = attachments.start_upload(self.user, 'server.log', len(content))
+        attachments.write_chunk(upload, 0, io.BytesIO(content), len(content))
+        self.assertTrue(upload.blob.compressed)
+        self.assertEqual(b''.join(attachments.iter_content(upload.blob)), content)
+
+    def test_chunk_at_the_wrong_offset_is_refused(self):
+        content = b'x' * (3 * BLOCK)
+        upload = self.start(content)
+        with self.assertRaisesMessage(attachments.UploadError, 'starting at byte 0'):
+            attachments.write_chunk(upload, BLOCK, io.BytesIO(content[BLOCK:2 * BLOCK]), BLOCK)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 0)
+
+    def test_cut_short_chunk_keeps_whole_blocks_and_resumes(self):
+        content = bytes(range(256)) * 16
+        upload = self.start(content)
+        # The connection drops half way through the third block
+        with self.assertRaises(attachments.UploadError):
+            attachments.write_chunk(upload, 0, io.BytesIO(content[:2 * BLOCK + BLOCK // 2]), 4 * BLOCK)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 2 * BLOCK)
+
+        attachments.write_chunk(upload, upload.received, io.BytesIO(content[2 * BLOCK:]), 2 * BLOCK)
+        self.assertEqual(b''.join(attachments.iter_content(upload.blob)), content)
+
+    def test_chunk_sent_while_another_is_received_is_refused(self):
+        content = b'y' * (2 * BLOCK)
+        upload = self.start(content)
+        # Another request holds the part file
+        with open(attachments.part_path(upload), 'ab') as other:
+            attachments.lock_file(other)
+            with self.assertRaisesMessage(attachments.UploadError, 'still being received'):
+                attachments.write_chunk(upload, 0, io.BytesIO(content[:BLOCK]), BLOCK)
+
+        attachments.write_chunk(upload, 0, io.BytesIO(content[:BLOCK]), BLOCK)
+        self.assertEqual(upload.received, BLOCK)
+
+    def test_stale_copy_of_the_upload_sees_progress_made_elsewhere(self):
+        content = b'z' * (2 * BLOCK)
+        upload = self.start(content)
+        stale = AttachmentUpload.objects.get(id=upload.id)
+        attachments.write_chunk(upload, 0, io.BytesIO(content[:BLOCK]), BLOCK)
+
+        # A retry of the first chunk, checked against the stored progress
+        with self.assertRaisesMessage(attachments.UploadError, f'starting at byte {BLOCK}'):
+            attachments.write_chunk(stale, 0, io.BytesIO(content[:BLOCK]), BLOCK)
+
+    def test_put_at_the_wrong_offset_answers_409_with_where_to_resume(self):
+        content = b'w' * (2 * BLOCK)
+        upload = self.start(content)
+        self.client.login(username='reporter', password='secret')
+        response = self.client.put(
+            f'/bugs/uploads/{upload.id}/', content[BLOCK:], content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {BLOCK}-{2 * BLOCK - 1}/{2 * BLOCK}'},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 0)
+
+
+class ProjectTestCase(AttachmentTestCase):
+    """Adds a project the user is a member of, with one bug, and one they are not in."""
+
+    def setUp(self):
+        super().setUp()
+        manager = User.objects.create_user('manager')
+        self.project = Project.objects.create(name='Tracker', description='', manager=manager)
+        self.project.members.add(manager, self.user)
+        self.other_project = Project.objects.create(name='Billing', description='', manager=manager)
+        self.bug = Bug.objects.create(
+            title='Crash on save', description='Stack trace attached', project=self.project, reported_by=manager,
+        )
+        self.other_bug = Bug.objects.create(
+            title='Invoice rounding', description='Secret numbers', project=self.other_project, reported_by=manager,
+        )
+        self.client.login(username='reporter', password='secret')
+
+    def attach(self, bug, filename, content):
+        upload = attachments.start_upload(self.user, filename, len(content))
+        attachments.write_chunk(upload, 0, io.BytesIO(content), len(content))
+        return attachments.attach(bug, upload, self.user)
+
+
+class DownloadAttachmentTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        self.attachment = self.attach(self.bug, 'screenshot.png', self.content)
+        self.url = reverse('bugs:download_attachment', args=[self.bug.id, self.attachment.id])
+        blob = self.attachment.blob
+        self.etag = f'"{blob.digest}"'
+        self.last_modified = http_date(int(blob.created_at.timestamp()))
+
+    def test_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_range_is_answered_with_206(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+    def test_suffix_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+    def test_range_past_the_end_is_answered_with_416(self):
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_if_range_matching_the_etag_gets_the_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': self.etag})
+        self.assertEqual(response.status_code, 206)
+
+    def test_if_range_with_the_modification_date_gets_the_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': self.last_modified})
+        self.assertEqual(response.status_code, 206)
+
+    def test_outdated_if_range_gets_the_whole_file(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"some-other-version"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_matching_etag_is_answered_with_304(self):
+        response = self.client.get(self.url, headers={'If-None-Match': self.etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_compressed_text_to_a_client_without_gzip_is_sent_whole(self):
+        text = b'ERROR something failed\n' * 100
+        attachment = self.attach(self.bug, 'server.log', text)
+        url = reverse('bugs:download_attachment', args=[self.bug.id, attachment.id])
+        response = self.client.get(url, headers={'Range': 'bytes=0-9', 'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'none')
+        self.assertEqual(b''.join(response.streaming_content), text)
+
+    def test_attachment_of_another_project_is_refused(self):
+        attachment = self.attach(self.other_bug, 'invoice.png', self.content)
+        url = reverse('bugs:download_attachment', args=[self.other_bug.id, attachment.id])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ProjectAccessTests(ProjectTestCase):
+
+    def test_bug_of_another_project_is_refused(self):
+        self.assertEqual(self.client.get(reverse('bugs:bug_detail', args=[self.bug.id])).status_code, 200)
+        for name in ('bug_detail', 'bug_comments', 'bug_history'):
+            response = self.client.get(reverse(f'bugs:{name}', args=[self.other_bug.id]))
+            self.assertEqual(response.status_code, 403, name)
+
+    def test_bug_of_another_project_cannot_be_changed(self):
+        for name in ('edit_bug', 'delete_bug', 'change_status', 'add_comment', 'add_attachment'):
+            response = self.client.post(reverse(f'bugs:{name}', args=[self.other_bug.id]),
+                                        {'status': 'closed', 'content': 'Leaked'})
+            self.assertEqual(response.status_code, 403, name)
+        self.other_bug.refresh_from_db()
+        self.assertEqual(self.other_bug.status, 'open')
+        self.assertFalse(self.other_bug.comments.exists())
+
+    def test_bug_cannot_be_filed_in_another_project(self):
+        self.client.post(reverse('bugs:create_bug'), {
+            'title': 'Planted', 'description': '', 'project': self.other_project.id,
+            'priority': 'low', 'severity': 'minor',
+        })
+        self.assertFalse(Bug.objects.filter(title='Planted').exists())
+
+    def test_only_project_members_can_be_assigned(self):
+        outsider = User.objects.create_user('outsider')
+        url = reverse('bugs:edit_bug', args=[self.bug.id])
+        self.client.post(url, {'assigned_to': outsider.id})
+        self.bug.refresh_from_db()
+        self.assertIsNone(self.bug.assigned_to_id)
+        self.client.post(url, {'assigned_to': self.user.id})
+        self.bug.refresh_from_db()
+        self.assertEqual(self.bug.assigned_to_id, self.user.id)
+
+    def test_lists_and_search_leave_out_other_projects(self):
+        for name in ('bug_list', 'search_bugs'):
+            response = self.client.get(reverse(f'bugs:{name}'))
+            self.assertContains(response, 'Crash on save', msg_prefix=name)
+            self.assertNotContains(response, 'Invoice rounding', msg_prefix=name)
+            self.assertNotContains(response, 'Billing', msg_prefix=name)
+        response = self.client.get(reverse('dashboard:recent_activity'))
+        self.assertNotContains(response, 'Invoice rounding')
+
+    def test_statistics_count_only_visible_projects(self):
+        response = self.client.get(reverse('dashboard:statistics'))
+        self.assertEqual(response.context['total_projects'], 1)
+        self.assertEqual(response.context['total_bugs'], 1)
+        url = reverse('dashboard:statistics_chart')
+        self.assertEqual(self.client.get(url, {'project': self.other_project.id}).status_code, 403)
+
+    def test_duplicates_of_another_project_are_refused(self):
+        url = reverse('bugs:duplicate_candidates')
+        response = self.client.get(url, {'project': self.other_project.id, 'title': 'Invoice rounding'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(url, {'project': 999999, 'title': 'x'}).status_code, 404)
+
+    def test_similar_bugs_leave_out_other_projects(self):
+        twin = Bug.objects.create(title='Crash on save', description='Stack trace attached',
+                                  project=self.other_project, reported_by=self.user)
+        # Bug ids repeat between tests, and so would cached neighbours
+        cache.clear()
+        self.assertIn(twin.id, [bug_id for bug_id, _ in similarity.similar_bugs(self.bug.id)])
+        response = self.client.get(reverse('bugs:bug_detail', args=[self.bug.id]))
+        self.assertNotIn(twin, response.context['similar_bugs'])
+
+    def test_export_leaves_out_other_projects(self):
+        response = self.client.get(reverse('bugs:export_bugs'), {'format': 'jsonl'})
+        content = b''.join(response.streaming_content)
+        self.assertIn(b'Crash on save', content)
+        self.assertNotIn(b'Invoice rounding', content)
+
+    def test_staff_export_everything(self):
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        response = self.client.get(reverse('bugs:export_bugs'), {'format': 'jsonl'})
+        self.assertIn(b'Invoice rounding', b''.join(response.streaming_content))
+
+    def test_activity_of_another_project_is_refused(self):
+        url = reverse('dashboard:activity_stream')
+        self.assertEqual(self.client.get(url, {'project': self.project.id}).status_code, 200)
+        self.assertEqual(self.client.get(url, {'project': self.other_project.id}).status_code, 403)
+        self.assertEqual(self.client.get(url, {'project': 999999}).status_code, 404)
+
+
+class BulkUpdateTests(ProjectTestCase):
+
+    def bulk(self, bugs, **changes):
+        self.client.post(reverse('bugs:bulk_update_bugs'), {'bug_ids': [bug.id for bug in bugs], **changes})
+        for bug in bugs:
+            bug.refresh_from_db()
+
+    def test_bugs_of_other_projects_are_left_alone(self):
+        self.bulk([self.bug, self.other_bug], set_status='closed')
+        self.assertEqual(self.bug.status, 'closed')
+        self.assertEqual(self.other_bug.status, 'open')
+
+    def test_assignee_outside_the_project_is_refused(self):
+        outsider = User.objects.create_user('outsider')
+        self.bulk([self.bug], set_assigned_to=outsider.id, set_status='closed')
+        self.assertIsNone(self.bug.assigned_to_id)
+        self.assertEqual(self.bug.status, 'open')
+        self.bulk([self.bug], set_assigned_to=self.user.id)
+        self.assertEqual(self.bug.assigned_to_id, self.user.id)
+
+    def test_version_of_another_project_is_refused(self):
+        other_version = ProjectVersion.objects.create(
+            project=self.other_project, version_number='2.0', release_date='2026-01-01',
+        )
+        self.bulk([self.bug], set_project_version=other_version.id)
+        self.assertIsNone(self.bug.project_version_id)
+        version = ProjectVersion.objects.create(
+            project=self.project, version_number='1.0', release_date='2026-01-01',
+        )
+        self.bulk([self.bug], set_project_version=version.id)
+        self.assertEqual(self.bug.project_version_id, version.id)
+
+    def rollup_rows(self):
+        return sorted(BugDailyRollup.objects.values_list(
+            'day', 'project_id', 'priority', 'severity', 'opened', 'resolved', 'closed',
+        ))
+
+    def file_bugs(self):
+        return [self.bug] + [
+            Bug.objects.create(title=f'Bug {number}', description='', project=self.project,
+                               reported_by=self.user, priority=priority)
+            for number, priority in enumerate(['low', 'high', 'high'])
+        ]
+
+    def test_counters_agree_with_a_recount(self):
+        bugs = self.file_bugs()
+        self.bulk(bugs[:3], set_status='resolved', set_priority='high')
+        self.bulk(bugs[1:], set_status='closed', set_assigned_to=self.user.id)
+
+        stats = ProjectBugStats.objects.get(project=self.project)
+        self.assertEqual((stats.status_open, stats.status_resolved, stats.status_closed), (0, 1, 3))
+        self.assertEqual(stats.priority_high, 4)
+        self.assertEqual(ProjectBugStats.recount(dry_run=True), [])
+
+    def test_rollups_agree_with_a_backfill(self):
+        # Rollups keep the priority a bug was opened with, which a backfill
+        # cannot know, so priorities stay put here
+        bugs = self.file_bugs()
+        self.bulk(bugs[:3], set_status='resolved')
+        self.bulk(bugs[1:], set_status='closed')
+
+        rows = self.rollup_rows()
+        self.assertEqual(sum(row[5] for row in rows), 3)
+        self.assertEqual(sum(row[6] for row in rows), 3)
+        rollups.backfill()
+        self.assertEqual(self.rollup_rows(), rows)
+
+    def test_only_bugs_that_change_get_history(self):
+        closed = Bug.objects.create(title='Done', description='', project=self.project,
+                                    reported_by=self.user, status='closed')
+        latest = BugHistory.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        self.bulk([self.bug, closed], set_status='closed')
+        self.assertEqual(list(BugHistory.objects.filter(id__gt=latest).values_list('bug_id', flat=True)),
+                         [self.bug.id])
+
+    def test_bulk_bar_offers_the_filtered_projects_people_and_versions(self):
+        User.objects.create_user('outsider')
+        ProjectVersion.objects.create(project=self.other_project, version_number='2.0', release_date='2026-01-01')
+        version = ProjectVersion.objects.create(project=self.project, version_number='1.0', release_date='2026-01-01')
+
+        response = self.client.get(reverse('bugs:bug_list'))
+        self.assertEqual(list(response.context['users']), [])
+        self.assertEqual(list(response.context['versions']), [])
+
+        response = self.client.get(reverse('bugs:bug_list'), {'project': self.project.id})
+        self.assertEqual([user.username for user in response.context['users']], ['manager', 'reporter'])
+        self.assertEqual(list(response.context['versions']), [version])
+
+
+class LogSearchTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        lines = [f'INFO request {number} served' for number in range(1, 41)]
+        # Catastrophic backtracking for (a|aa)+b
+        lines[19] = 'a' * 60 + '!'
+        lines[29] = 'ERROR request 30 failed'
+        self.attachment = self.attach(self.bug, 'server.log', '\n'.join(lines).encode() + b'\n')
+        # The preview worker builds the log cache
+        previews.work('test', drain=True)
+
+    def search(self, **params):
+        url = reverse('bugs:log_search', args=[self.bug.id, self.attachment.id])
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(row) for row in b''.join(response.streaming_content).splitlines()]
+
+    def test_matching_lines_stream_in(self):
+        rows = self.search(q='ERROR')
+        self.assertEqual(rows, [{'line': 30, 'text': 'ERROR request 30 failed'}, {'next': None}])
+
+    def test_search_continues_from_the_line_given(self):
+        rows = self.search(q='served', start=35)
+        self.assertEqual([row.get('line') for row in rows], [35, 36, 37, 38, 39, 40, None])
+
+    def test_search_cut_short_gives_the_line_to_continue_from(self):
+        with logview.open_log(self.attachment.blob) as log:
+            results = list(log.search(logview.compile_pattern('served'), start=4, max_matches=2))
+        self.assertEqual(results, [(4, 'INFO request 5 served'), (5, 'INFO request 6 served'), (6, None)])
+
+    @mock.patch.object(logview, 'SEARCH_WINDOW', 256)
+    @mock.patch.object(logview, 'WINDOW_SECONDS', 0.5)
+    def test_runaway_expression_is_stopped_and_skips_its_window(self):
+        rows = self.search(q='(a|aa)+b')
+        self.assertEqual(len(rows), 1)
+        # The search moves past the window holding line 20
+        self.assertGreater(rows[0]['next'], 20)
+        with logview.open_log(self.attachment.blob) as log:
+            self.assertLess(rows[0]['next'], log.line_count)
+
+    def test_pattern_that_does_not_compile_is_refused(self):
+        url = reverse('bugs:log_search', args=[self.bug.id, self.attachment.id])
+        self.assertEqual(self.client.get(url, {'q': '(unclosed'}).status_code, 400)
+
+
+class LogCacheTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.attachment = self.attach(self.bug, 'server.log', b'INFO started\n' * 1000)
+        self.viewer_url = reverse('bugs:log_viewer', args=[self.bug.id, self.attachment.id])
+        self.lines_url = reverse('bugs:log_lines', args=[self.bug.id, self.attachment.id])
+
+    def test_log_is_prepared_by_the_preview_worker_not_the_request(self):
+        response = self.client.get(self.viewer_url)
+        self.assertContains(response, 'being prepared')
+        self.assertFalse(logview.is_cached(self.attachment.blob))
+        self.assertEqual(self.client.get(self.lines_url).status_code, 503)
+
+        previews.work('test', drain=True)
+        self.assertContains(self.client.get(self.viewer_url), '1000 lines')
+        self.assertEqual(self.client.get(self.lines_url, {'start': 1000}).json()['lines'], ['INFO started'])
+
+    def test_least_recently_opened_logs_are_evicted(self):
+        other = self.attach(self.bug, 'worker.log', b'WARN slow\n' * 1000)
+        previews.work('test', drain=True)
+        first, second = self.attachment.blob, other.blob
+        # The first log was opened long ago
+        past = time.time() - 3600
+        index_path = attachment_storage().path(f'{logview._directory(first)}/lines.idx')
+        os.utime(index_path, (past, past))
+
+        self.assertEqual(logview.evict(limit=first.size + 100), 1)
+        self.assertFalse(logview.is_cached(first))
+        self.assertTrue(logview.is_cached(second))
+
+        # Opening it again queues it to be rebuilt
+        self.client.get(self.viewer_url)
+        previews.work('test', drain=True)
+        self.assertTrue(logview.is_cached(first))
+
+    def test_the_log_just_built_is_kept_however_large(self):
+        previews.work('test', drain=True)
+        self.assertEqual(logview.evict(limit=0, keep=self.attachment.blob), 0)
+        self.assertTrue(logview.is_cached(self.attachment.blob))
+        self.assertEqual(logview.evict(limit=0), 1)
+
+
+class PreviewTests(ProjectTestCase):
+
+    def image(self, mode='RGB', size=(800, 400)):
+        output = io.BytesIO()
+        Image.new(mode, size).save(output, 'PNG')
+        return output.getvalue()
+
+    def test_image_gets_thumbnails_in_each_size(self):
+        attachment = self.attach(self.bug, 'screenshot.png', self.image())
+        previews.work('test', drain=True)
+
+        preview = previews.preview_of(AttachmentBlob.objects.get(id=attachment.blob_id))
+        self.assertIsNone(preview.excerpt)
+        for url, size in ((preview.thumbnail_url, 160), (preview.thumbnail_2x_url, 320)):
+            self.assertTrue(url.endswith(f'thumb-{size}.jpg'))
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+            with Image.open(io.BytesIO(b''.join(response.streaming_content))) as thumbnail:
+                self.assertEqual(thumbnail.size, (size, size // 2))
+
+    def test_transparent_image_keeps_its_alpha_as_png(self):
+        attachment = self.attach(self.bug, 'icon.png', self.image(mode='RGBA', size=(64, 64)))
+        previews.work('test', drain=True)
+        preview = previews.preview_of(AttachmentBlob.objects.get(id=attachment.blob_id))
+        self.assertTrue(preview.thumbnail_url.endswith('thumb-160.png'))
+
+    def test_text_gets_an_excerpt_of_its_first_and_last_lines(self):
+        lines = [f'line {number}' for number in range(1, 101)]
+        lines[0] = 'x' * 1000
+        attachment = self.attach(self.bug, 'server.log', '\n'.join(lines).encode() + b'\n')
+        previews.work('test', drain=True)
+
+        excerpt = previews.preview_of(AttachmentBlob.objects.get(id=attachment.blob_id)).excerpt.split('\n')
+        self.assertEqual(excerpt[0], 'x' * previews.MAX_LINE_CHARS)
+        self.assertEqual(excerpt[1:previews.EXCERPT_LINES], lines[1:previews.EXCERPT_LINES])
+        self.assertEqual(excerpt[previews.EXCERPT_LINES], '... 60 lines omitted ...')
+        self.assertEqual(excerpt[-previews.EXCERPT_LINES:], lines[-previews.EXCERPT_LINES:])
+
+    def test_short_text_is_shown_whole(self):
+        self.assertEqual(previews.excerpt([b'first\r\n', b'second\n']), 'first\nsecond')
+
+    def test_other_files_have_no_preview(self):
+        attachment = self.attach(self.bug, 'core.dump', bytes(range(256)) * 4)
+        previews.work('test', drain=True)
+        blob = AttachmentBlob.objects.get(id=attachment.blob_id)
+        self.assertEqual(blob.preview.kind, 'none')
+        self.assertIsNone(previews.preview_of(blob))
+
+    def test_blob_attached_twice_is_previewed_once(self):
+        content = self.image()
+        self.attach(self.bug, 'screenshot.png', content)
+        self.attach(self.bug, 'again.png', content)
+        with mock.patch.object(previews, 'generate', wraps=previews.generate) as generate:
+            previews.work('test', drain=True)
+        self.assertEqual(generate.call_count, 1)
+
+    def test_preview_urls_outside_the_naming_scheme_are_not_found(self):
+        attachment = self.attach(self.bug, 'screenshot.png', self.image())
+        previews.work('test', drain=True)
+        digest = attachment.blob.digest
+        for args in ((1, digest, 'thumb-100.jpg'), (1, digest, '../lines.idx'), (1, 'not-a-digest', 'excerpt.txt'),
+                     (2, digest, 'thumb-160.jpg')):
+            with self.subTest(args=args):
+                self.assertIsNone(previews.preview_path(*args))
+        url = reverse('bugs:attachment_preview', args=[1, digest, 'thumb-100.jpg'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_previews_are_only_served_to_project_members(self):
+        attachment = self.attach(self.bug, 'screenshot.png', self.image())
+        previews.work('test', drain=True)
+        url = previews.preview_of(AttachmentBlob.objects.get(id=attachment.blob_id)).thumbnail_url
+        User.objects.create_user('outsider', password='secret')
+        self.client.login(username='outsider', password='secret')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_failing_preview_is_retried_then_given_up(self):
+        attachment = self.attach(self.bug, 'screenshot.png', self.image())
+        with mock.patch.object(previews, 'generate', side_effect=OSError('disk full')), \
+                self.assertLogs(previews.logger, 'WARNING'):
+            for attempt in range(1, previews.MAX_ATTEMPTS + 1):
+                previews.work('test', drain=True)
+                preview = AttachmentPreview.objects.get(blob_id=attachment.blob_id)
+                self.assertEqual(preview.attempts, attempt)
+                # Retries wait out a backoff; skip it
+                AttachmentPreview.objects.filter(pk=preview.pk).update(run_after=timezone.now())
+        self.assertEqual(preview.status, 'failed')
+        self.assertIn('disk full', preview.error)
+        self.assertIsNone(previews.claim('test'))
+
+    def test_stale_claims_are_requeued(self):
+        attachment = self.attach(self.bug, 'screenshot.png', self.image())
+        self.assertEqual(previews.claim('gone').blob_id, attachment.blob_id)
+        self.assertIsNone(previews.claim('test'))
+        AttachmentPreview.objects.update(claimed_at=timezone.now() - timedelta(seconds=previews.STALE_SECONDS + 1))
+        self.assertEqual(previews.requeue_stale(), 1)
+        previews.work('test', drain=True)
+        self.assertEqual(AttachmentPreview.objects.get(blob_id=attachment.blob_id).status, 'done')
+
+
+class BugListPaginationTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(6):
+            Bug.objects.create(title=f'Bug {number}', description='', project=self.project,
+                               reported_by=self.user)
+        # Bugs filed in the same instant are told apart by id
+        Bug.objects.update(created_at=self.bug.created_at)
+        self.newest_first = list(
+            Bug.objects.filter(project=self.project).order_by('-id').values_list('id', flat=True)
+        )
+
+    def page(self, **params):
+        return self.client.get(reverse('bugs:bug_list'), {'page_size': 3, **params}).context['page']
+
+    def test_pages_cover_equal_timestamps_once_each(self):
+        first = self.page()
+        second = self.page(after=first.next_cursor)
+        third = self.page(after=second.next_cursor)
+        self.assertEqual([bug.id for bug in [*first, *second, *third]], self.newest_first)
+        self.assertFalse(third.has_next)
+
+    def test_previous_page_is_the_page_before(self):
+        first = self.page()
+        second = self.page(after=first.next_cursor)
+        back = self.page(before=second.prev_cursor)
+        self.assertEqual([bug.id for bug in back], [bug.id for bug in first])
+        self.assertFalse(back.has_previous)
+
+    def test_bugs_filed_while_paging_do_not_shift_pages(self):
+        first = self.page()
+        Bug.objects.create(title='Filed meanwhile', description='', project=self.project, reported_by=self.user)
+        second = self.page(after=first.next_cursor)
+        self.assertEqual([bug.id for bug in second], self.newest_first[3:6])
+
+    def test_rows_leave_the_description_deferred(self):
+        bug = self.page().object_list[0]
+        self.assertIn('description', bug.get_deferred_fields())
+        with self.assertNumQueries(0):
+            bug.project.name, bug.reported_by.username
+
+    def test_invalid_cursor_starts_from_the_top(self):
+        page = self.page(after='not-a-cursor')
+        self.assertEqual([bug.id for bug in page], self.newest_first[:3])
+
+
+class FullTextSearchTests(ProjectTestCase):
+
+    def file(self, title, description=''):
+        return Bug.objects.create(title=title, description=description, project=self.project,
+                                  reported_by=self.user)
+
+    def ids(self, text, queryset=None):
+        return [bug_id for bug_id, _, _ in search.search_bugs(text, queryset)]
+
+    def test_title_match_ranks_above_description_match(self):
+        in_description = self.file('Login page', 'The timeout happens after a minute')
+        in_title = self.file('Timeout when saving', 'Nothing else to say')
+        self.assertEqual(self.ids('timeout'), [in_title.id, in_description.id])
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.ids('cra sav'), [self.bug.id])
+
+    def test_comments_and_tags_are_searchable(self):
+        BugComment.objects.create(bug=self.bug, author=self.user, content='Reproduced on staging')
+        self.bug.set_tag_names('regression')
+        self.assertEqual(self.ids('staging'), [self.bug.id])
+        self.assertEqual(self.ids('regression'), [self.bug.id])
+
+    def test_edits_and_deletions_reach_the_index(self):
+        self.bug.title = 'Freeze on open'
+        self.bug.save()
+        self.assertEqual(self.ids('crash'), [])
+        self.assertEqual(self.ids('freeze'), [self.bug.id])
+        self.bug.delete()
+        self.assertEqual(self.ids('freeze'), [])
+
+    def test_query_syntax_is_taken_as_words(self):
+        self.assertEqual(self.ids('crash OR "invoice'), [])
+        self.assertEqual(self.ids('NOT crash'), [])
+        self.assertEqual(self.ids('*'), [])
+
+    def test_filters_restrict_the_ranking(self):
+        self.file('Crash on load')
+        self.assertEqual(self.ids('crash', Bug.objects.filter(id=self.bug.id)), [self.bug.id])
+
+    def test_snippet_escapes_the_text_around_the_match(self):
+        self.file('<b>Timeout</b> in report')
+        _, _, snippet = search.search_bugs('timeout')[0]
+        self.assertIn('&lt;b&gt;<mark>Timeout</mark>&lt;/b&gt;', snippet)
+
+    def test_search_page_ranks_matches_of_visible_projects(self):
+        response = self.client.get(reverse('bugs:search_bugs'), {'q': 'crash'})
+        self.assertEqual([bug.id for bug in response.context['bugs']], [self.bug.id])
+        self.assertContains(response, '<mark>Crash</mark>')
+
+
+class TagTests(ProjectTestCase):
+
+    def test_names_are_normalized_and_deduplicated(self):
+        self.bug.set_tag_names(' UI, Crash ,ui,, ')
+        self.assertEqual(sorted(self.bug.tags.values_list('name', flat=True)), ['crash', 'ui'])
+        self.bug.set_tag_names('crash')
+        self.assertEqual(list(self.bug.tags.values_list('name', flat=True)), ['crash'])
+
+    def test_tag_filter_matches_whole_names_only(self):
+        self.bug.set_tag_names('ui')
+        tagged = Bug.objects.create(title='Slow', description='', project=self.project, reported_by=self.user)
+        tagged.set_tag_names('ui-freeze, backend')
+        response = self.client.get(reverse('bugs:bug_list'), {'tag': 'ui'})
+        self.assertEqual([bug.id for bug in response.context['bugs']], [self.bug.id])
+        response = self.client.get(reverse('bugs:bug_list'), {'tag': ['ui-freeze', 'backend']})
+        self.assertEqual([bug.id for bug in response.context['bugs']], [tagged.id])
+
+    def test_counts_for_project_are_most_used_first(self):
+        self.bug.set_tag_names('ui, crash')
+        other = Bug.objects.create(title='Slow', description='', project=self.project, reported_by=self.user)
+        other.set_tag_names('crash')
+        self.other_bug.set_tag_names('crash, billing')
+        self.assertEqual(
+            [(row['tag__name'], row['count']) for row in Tag.counts_for_project(self.project)],
+            [('crash', 2), ('ui', 1)],
+        )
+
+
+class FacetCountTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for status, priority, assignee in [('open', 'high', self.user), ('open', 'low', None),
+                                           ('resolved', 'high', None), ('resolved', 'low', self.user)]:
+            Bug.objects.create(title='Crash', description='', project=self.project, reported_by=self.user,
+                               status=status, priority=priority, assigned_to=assignee)
+        self.bugs = Bug.objects.filter(project=self.project)
+
+    def expected(self, selected):
+        """Each facet counted the slow way: one query per facet, without its own filter."""
+        counts = {}
+        for facet, field in facets.FACET_FIELDS.items():
+            others = {name: value for name, value in selected.items() if name != facet}
+            rows = facets.apply_facet_filters(self.bugs, others).values_list(field, flat=True)
+            counts[facet] = Counter(facets._row_key(value) for value in rows)
+        return counts
+
+    def test_counts_ignore_only_their_own_selection(self):
+        for selected in [{}, {'status': 'open'}, {'status': 'open', 'priority': 'high'},
+                         {'status': 'resolved', 'assigned_to': facets.NONE_VALUE},
+                         {'status': 'open', 'priority': 'low', 'severity': 'minor'}]:
+            expected = self.expected(selected)
+            with self.subTest(selected=selected), self.assertNumQueries(1):
+                self.assertEqual(facets.facet_counts(self.bugs, selected), expected)
+
+    def test_cached_counts_are_retired_when_a_bug_changes(self):
+        def open_count():
+            return facets.cached_facet_counts(self.bugs, {}, {'q': ''})['status']['open']
+
+        self.assertEqual(open_count(), 3)
+        with self.assertNumQueries(0):
+            open_count()
+        self.bug.status = 'closed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bug.save()
+        self.assertEqual(open_count(), 2)
+
+
+class ProjectBugStatsTests(ProjectTestCase):
+
+    def stats(self, project=None):
+        return ProjectBugStats.objects.get(project=project or self.project)
+
+    def test_counters_follow_saves_moves_and_deletes(self):
+        bug = Bug.objects.create(title='Slow', description='', project=self.project, reported_by=self.user,
+                                 priority='high')
+        self.assertEqual((self.stats().total, self.stats().open_unassigned, self.stats().priority_high), (2, 2, 1))
+
+        bug.assigned_to = self.user
+        bug.status = 'in_progress'
+        bug.save()
+        self.assertEqual((self.stats().status_open, self.stats().status_in_progress), (1, 1))
+        self.assertEqual(self.stats().open_unassigned, 1)
+
+        bug.project = self.other_project
+        bug.save()
+        self.assertEqual((self.stats().total, self.stats(self.other_project).total), (1, 2))
+
+        bug.delete()
+        self.assertEqual(self.stats(self.other_project).total, 1)
+        self.assertEqual(ProjectBugStats.recount(dry_run=True), [])
+
+    def test_reconcile_repairs_writes_that_bypass_the_counters(self):
+        Bug.objects.filter(id=self.bug.id).update(status='closed')
+        output = io.StringIO()
+        call_command('reconcile_bug_stats', '--dry-run', stdout=output)
+        self.assertIn(f'Found drift in 1 project(s): {self.project.id}', output.getvalue())
+        self.assertEqual(self.stats().status_open, 1)
+
+        call_command('reconcile_bug_stats', stdout=output)
+        self.assertEqual((self.stats().status_open, self.stats().status_closed), (0, 1))
+        self.assertEqual(ProjectBugStats.recount(dry_run=True), [])
+
+    def test_deleting_a_project_leaves_no_counters_behind(self):
+        self.other_project.delete()
+        self.assertFalse(ProjectBugStats.objects.filter(project_id=self.other_project.id).exists())
+        self.assertEqual(ProjectBugStats.recount(dry_run=True), [])
+
+
+class RollupTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        BugDailyRollup.objects.all().delete()
+        BugDailyRollup.add_counts([
+            (date(2026, 3, 2), self.project.id, 'high', 'major', 2, 1, 0),
+            (date(2026, 3, 8), self.project.id, 'low', 'major', 1, 0, 1),
+            (date(2026, 3, 9), self.project.id, 'low', 'minor', 4, 0, 0),
+            (date(2026, 5, 1), self.other_project.id, 'high', 'major', 7, 0, 0),
+        ])
+
+    def test_weeks_and_months_sum_their_days_and_fill_gaps_with_zeros(self):
+        weeks = rollups.series(date(2026, 3, 1), date(2026, 3, 20), 'week')
+        self.assertEqual(weeks['buckets'], ['2026-02-23', '2026-03-02', '2026-03-09', '2026-03-16'])
+        self.assertEqual((weeks['opened'], weeks['resolved'], weeks['closed']),
+                         ([0, 3, 4, 0], [0, 1, 0, 0], [0, 1, 0, 0]))
+
+        months = rollups.series(date(2026, 3, 1), date(2026, 5, 31), 'month', project_ids=[self.project.id])
+        self.assertEqual(months['buckets'], ['2026-03-01', '2026-04-01', '2026-05-01'])
+        self.assertEqual(months['opened'], [7, 0, 0])
+
+    def test_breakdown_splits_the_totals(self):
+        data = rollups.series(date(2026, 3, 1), date(2026, 3, 31), 'month', by='priority')
+        self.assertEqual(data['opened'], [7])
+        self.assertEqual({value: columns['opened'] for value, columns in data['series'].items()},
+                         {'high': [2], 'low': [5]})
+
+    def test_chart_answers_bad_ranges_with_400(self):
+        url = reverse('dashboard:statistics_chart')
+        for params in [{'granularity': 'hour'}, {'start': '2026-13-01'},
+                       {'start': '2026-03-02', 'end': '2026-03-01'},
+                       {'start': '2000-01-01', 'end': '2026-01-01', 'granularity': 'day'},
+                       {'by': 'status'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        response = self.client.get(url, {'start': '2026-03-01', 'end': '2026-05-31'})
+        self.assertEqual(response.json()['opened'], [7, 0, 0])
+
+
+class BugHistoryTests(ProjectTestCase):
+
+    def test_edits_and_comments_are_recorded_as_structured_events(self):
+        self.client.post(reverse('bugs:change_status', args=[self.bug.id]), {'status': 'in_progress'})
+        self.client.post(reverse('bugs:add_comment', args=[self.bug.id]), {'content': 'On it'})
+        self.assertEqual(
+            list(self.bug.history.order_by('id').values_list('event', 'field', 'old_value', 'new_value')),
+            [('changed', 'status', 'open', 'in_progress'), ('commented', '', '', 'On it')],
+        )
+
+    def test_long_values_are_truncated(self):
+        entry = BugHistory.field_change(self.bug, self.user, 'title', 'Short', 'x' * 500)
+        self.assertEqual(len(entry.new_value), BugHistory.VALUE_LENGTH)
+        self.assertLessEqual(len(entry.action), 200)
+
+    def test_old_action_strings_are_parsed(self):
+        parse_action = structured_history.parse_action
+        cases = {
+            "Changed status from 'open' to 'resolved'": ('changed', 'status', 'open', 'resolved'),
+            "Changed title from 'It's broken' to 'Fixed'": ('changed', 'title', "It's broken", 'Fixed'),
+            'Assigned to reporter': ('changed', 'assigned_to', '', 'reporter'),
+            'Unassigned': ('changed', 'assigned_to', '', ''),
+            'Changed version to 1.2': ('changed', 'project_version', '', '1.2'),
+            'Added comment: Seen on staging...': ('commented', '', '', 'Seen on staging'),
+            'Added attachment: trace.log': ('attached', '', '', 'trace.log'),
+            'Created bug': ('created', '', '', ''),
+            'Moved to the backlog': ('other', '', '', ''),
+        }
+        for action, expected in cases.items():
+            with self.subTest(action=action):
+                self.assertEqual(parse_action(action), expected)
+
+
+class BugDetailTests(ProjectTestCase):
+
+    def comment(self, count):
+        BugComment.objects.bulk_create(
+            BugComment(bug=self.bug, author=self.user, content=f'Comment {number}') for number in range(count)
+        )
+        BugHistory.objects.bulk_create(
+            BugHistory(bug=self.bug, user=self.user, action=f'Edit {number}') for number in range(count)
+        )
+
+    def queries_for_detail(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('bugs:bug_detail', args=[self.bug.id])).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_activity(self):
+        self.comment(2)
+        self.bug.set_tag_names('ui, crash')
+        few = self.queries_for_detail()
+        self.comment(40)
+        self.attach(self.bug, 'trace.txt', b'Traceback\n')
+        self.attach(self.bug, 'shot.png', b'\x89PNG')
+        self.assertEqual(self.queries_for_detail(), few)
+
+    def test_older_comments_and_history_come_in_batches(self):
+        self.comment(pagination.ACTIVITY_PAGE_SIZE + 5)
+        response = self.client.get(reverse('bugs:bug_detail', args=[self.bug.id]))
+        self.assertEqual(len(response.context['comments']), pagination.ACTIVITY_PAGE_SIZE)
+
+        cursor = response.context['older_comments']
+        response = self.client.get(reverse('bugs:bug_comments', args=[self.bug.id]), {'before': cursor})
+        self.assertEqual([comment.content for comment in response.context['comments']],
+                         [f'Comment {number}' for number in range(5)])
+        self.assertIsNone(response.context['older_comments'])
+
+        history = BugHistory.objects.filter(bug=self.bug).count()
+        cursor = self.client.get(reverse('bugs:bug_detail', args=[self.bug.id])).context['older_history']
+        response = self.client.get(reverse('bugs:bug_history', args=[self.bug.id]), {'before': cursor})
+        self.assertEqual(len(response.context['history']), history - pagination.ACTIVITY_PAGE_SIZE)
+
+
+class ExportTests(ProjectTestCase):
+
+    def export(self, **params):
+        response = self.client.get(reverse('bugs:export_bugs'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_header_and_one_line_per_bug_with_optional_columns(self):
+        BugComment.objects.create(bug=self.bug, author=self.user, content='Seen it too')
+        Bug.objects.filter(id=self.bug.id).update(
+            status='resolved', resolved_at=self.bug.created_at + timedelta(hours=3),
+        )
+        rows = list(csv.DictReader(io.StringIO(self.export(include=['comment_count', 'resolution_hours']))))
+        self.assertEqual(list(rows[0]), export.export_columns(['comment_count', 'resolution_hours']))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['title'], rows[0]['project'], rows[0]['assigned_to']),
+                         ('Crash on save', 'Tracker', ''))
+        self.assertEqual((rows[0]['comment_count'], rows[0]['resolution_hours']), ('1', '3.0'))
+
+    def test_jsonl_follows_the_list_filters_newest_first(self):
+        newer = Bug.objects.create(title='Crash on load', description='', project=self.project,
+                                   reported_by=self.user, priority='high')
+        Bug.objects.create(title='Slow start', description='', project=self.project, reported_by=self.user)
+        lines = self.export(format='jsonl', q='crash').splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [newer.id, self.bug.id])
+        lines = self.export(format='jsonl', priority='high').splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Crash on load'])
+        self.assertIsNone(json.loads(lines[0])['resolved_at'])
+
+    def test_rows_are_read_in_one_query(self):
+        for number in range(5):
+            BugComment.objects.create(bug=self.bug, author=self.user, content=f'Comment {number}')
+        with self.assertNumQueries(1):
+            rows = list(export.export_rows(Bug.objects.all(), export.export_columns(export.OPTIONAL_COLUMNS)))
+        self.assertEqual(len(rows), 2)
+
+
+class DuplicateTests(ProjectTestCase):
+
+    def file(self, title, description='', project=None):
+        return Bug.objects.create(title=title, description=description, project=project or self.project,
+                                  reported_by=self.user)
+
+    def found(self, title, description='', **kwargs):
+        return [bug_id for bug_id, _ in duplicates.find_duplicates(self.project.id, title, description, **kwargs)]
+
+    def test_words_drop_stop_words_and_plurals(self):
+        self.assertEqual(duplicates.words('The crashes of boxes, on Pages'), ['crash', 'box', 'page'])
+
+    def test_signatures_estimate_the_overlap_of_their_sets(self):
+        first = {f'word{number}' for number in range(100)}
+        second = {f'word{number}' for number in range(50, 150)}
+        estimate = duplicates.similarity(duplicates.signature(first), duplicates.signature(second))
+        self.assertAlmostEqual(estimate, 1 / 3, delta=0.15)
+        self.assertEqual(duplicates.similarity(duplicates.signature(first), duplicates.signature(first)), 1)
+
+    def test_closest_reports_rank_first(self):
+        close = self.file('Crash when saving a large project file')
+        closer = self.file('Crash when saving large project files')
+        self.file('Dark mode colours are wrong in settings')
+        self.file('Crash when saving large project files', project=self.other_project)
+        self.assertEqual(self.found('Crashes when saving large project files'), [closer.id, close.id])
+        self.assertEqual(self.found('Crashes when saving large project files', exclude=closer.id), [close.id])
+
+    def test_descriptions_match_on_word_pairs(self):
+        text = ('Clicking export with an empty filter raises a server error, '
+                'and the page then shows a blank table until it is reloaded')
+        described = self.file('Export broken', text)
+        self.assertEqual(self.found('Something else', text + ' twice'), [described.id])
+        # The same words in another order make different pairs
+        self.assertEqual(self.found('Something else', ' '.join(sorted(text.split()))), [])
+
+    def test_edited_text_is_reindexed(self):
+        self.bug.title = 'Dark mode colours are wrong'
+        self.bug.save()
+        self.assertEqual(self.found('Crash on save'), [])
+        self.assertEqual(self.found('Dark mode colours wrong'), [self.bug.id])
+
+    def test_report_form_gets_candidates_as_json(self):
+        response = self.client.get(reverse('bugs:duplicate_candidates'),
+                                   {'project': self.project.id, 'title': 'Crashes on save'})
+        self.assertEqual([match['id'] for match in response.json()['duplicates']], [self.bug.id])
+        response = self.client.get(reverse('bugs:duplicate_candidates'), {'project': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarBugTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Bug ids repeat between tests, and so would cached neighbours
+        cache.clear()
+
+    def file(self, title, description=''):
+        return Bug.objects.create(title=title, description=description, project=self.project,
+                                  reported_by=self.user)
+
+    def exact_ranking(self, bug_id):
+        """Every other bug by the dot product of the stored vectors, best first."""
+        vectors = {
+            other_id: dict(zip(similarity._load(features, 'I'), similarity._load(weights, 'f')))
+            for other_id, features, weights in BugVector.objects.values_list('bug_id', 'features', 'weights')
+        }
+        own = vectors.pop(bug_id)
+        scores = {other_id: sum(weight * vector.get(feature, 0) for feature, weight in own.items())
+                  for other_id, vector in vectors.items()}
+        return sorted((other_id for other_id, score in scores.items() if score > 0),
+                      key=lambda other_id: (-scores[other_id], -other_id))
+
+    def test_ranking_matches_the_exact_dot_product(self):
+        bug = self.file('Export fails with a timeout', 'The CSV export of large projects times out')
+        self.file('Export of large projects is slow', 'CSV export takes minutes')
+        self.file('Timeout on login', 'Login times out behind the proxy')
+        self.file('Dark mode colours', 'Settings page colours are wrong')
+        ranked = [other_id for other_id, _ in similarity.similar_bugs(bug.id, limit=10)]
+        self.assertEqual(ranked, self.exact_ranking(bug.id))
+        self.assertNotIn(bug.id, ranked)
+        self.assertEqual(len(ranked), 2)
+
+    def test_comments_count_towards_similarity(self):
+        bug = self.file('Export fails')
+        other = self.file('Reports page broken')
+        self.assertEqual(similarity.similar_bugs(bug.id), [])
+        # Neighbours are cached until the bug's own vector changes
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            BugComment.objects.create(bug=other, author=self.user, content='The export fails here as well')
+        self.assertEqual([other_id for other_id, _ in similarity.similar_bugs(bug.id)], [other.id])
+
+    def test_document_counts_follow_edits_and_deletes(self):
+        bug = self.file('Export fails with a timeout')
+        self.file('Export of large projects is slow')
+        bug.title = 'Login fails'
+        bug.save()
+        self.bug.delete()
+        stored = dict(BugTermStat.objects.filter(documents__gt=0).values_list('feature', 'documents'))
+        similarity.rebuild_index()
+        self.assertEqual(dict(BugTermStat.objects.values_list('feature', 'documents')), stored)
+
+
+class ImportTests(ProjectTestCase):
+
+    # Bugs per second the importer must keep up; an order of magnitude
+    # below what it manages, so that only a regression trips it
+    MIN_RATE = 2000
+
+    def records(self, count):
+        for number in range(count):
+            yield number + 1, {'title': f'Import crash {number}', 'project': 'Tracker',
+                               'description': f'Saving record {number} fails with a timeout'}
+
+    def test_throughput(self):
+        importer = BugImporter(self.user)
+        started = time.monotonic()
+        result = importer.run(self.records(5000))
+        elapsed = time.monotonic() - started
+        self.assertEqual(result.created, 5000)
+        self.assertGreater(result.created / elapsed, self.MIN_RATE)
+
+    def test_csv_rows_become_bugs_with_their_tags_history_and_counts(self):
+        stream = io.StringIO(
+            'title,project,status,assigned_to,tags\n'
+            'Import timeout,Tracker,resolved,reporter,"UI, crash"\n'
+            'Lost invoice,Nowhere,open,,\n'
+            ',Tracker,open,,\n'
+        )
+        result = BugImporter(self.user, batch_size=1).run(importer.iter_records(stream, 'csv'))
+        self.assertEqual((result.created, result.failed), (1, 2))
+        self.assertEqual(result.errors, [(3, 'Unknown project "Nowhere"'), (4, 'Missing title')])
+
+        bug = Bug.objects.get(title='Import timeout')
+        self.assertEqual((bug.status, bug.assigned_to, bug.reported_by), ('resolved', self.user, self.user))
+        self.assertEqual(sorted(bug.tags.values_list('name', flat=True)), ['crash', 'ui'])
+        self.assertTrue(bug.history.exists())
+        self.assertEqual(ProjectBugStats.recount(dry_run=True), [])
+        self.assertEqual([hit[0] for hit in search.search_bugs('import timeout')], [bug.id])
+
+    def test_malformed_json_lines_are_reported_and_skipped(self):
+        stream = io.StringIO('{"title": "Import crash", "project": "Tracker"}\n{"title": \n')
+        result = BugImporter(self.user).run(importer.iter_records(stream, 'jsonl'))
+        self.assertEqual((result.created, result.failed), (1, 1))
+        self.assertEqual(result.errors[0][0], 2)
+
+    def test_dry_run_validates_without_writing(self):
+        count = Bug.objects.count()
+        result = BugImporter(self.user, dry_run=True).run(self.records(3))
+        self.assertEqual(result.created, 3)
+        self.assertEqual(Bug.objects.count(), count)
+
+    def test_only_staff_can_import(self):
+        upload = SimpleUploadedFile('bugs.jsonl', b'{"title": "Import crash", "project": "Tracker"}\n')
+        self.client.post(reverse('bugs:import_bugs'), {'file': upload})
+        self.assertFalse(Bug.objects.filter(title='Import crash').exists())
+
+    def test_duplicate_index_is_left_to_index_missing(self):
+        BugImporter(self.user).run(self.records(3))
+        imported = Bug.objects.get(title='Import crash 1')
+
+        def found():
+            return [bug_id for bug_id, _ in duplicates.find_duplicates(self.project.id, 'Import crash 1')]
+
+        self.assertNotIn(imported.id, found())
+        self.assertEqual(duplicates.index_missing(), 3)
+        self.assertEqual(duplicates.index_missing(), 0)
+        self.assertIn(imported.id, found())
+
+    def test_similarity_index_is_left_to_index_missing(self):
+        BugImporter(self.user).run(self.records(3))
+        imported = Bug.objects.get(title='Import crash 1')
+        self.assertEqual(similarity.similar_bugs(imported.id), [])
+        self.assertEqual(similarity.index_missing(), 3)
+        self.assertEqual(similarity.index_missing(), 0)
+        cache.clear()
+        self.assertTrue(similarity.similar_bugs(imported.id))
+
+    def test_saving_unchanged_text_skips_the_duplicate_and_similarity_indexes(self):
+        bug = Bug.objects.get(id=self.bug.id)
+        bug.status = 'in_progress'
+        with mock.patch.object(duplicates, 'index_bug') as index_duplicates, \
+                mock.patch.object(similarity, 'index_bug') as index_similarity:
+            bug.save()
+            bug.title = 'Crash on save as'
+            bug.save()
+            bug.save()
+        self.assertEqual(index_duplicates.call_count, 1)
+        self.assertEqual(index_similarity.call_count, 1)
+
+
+class AnalyticsTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_history_is_caught_up_on_at_most_once_per_interval(self):
+        with mock.patch.object(analytics, 'refresh', wraps=analytics.refresh) as refresh:
+            analytics.cached_summary()
+            analytics.cached_summary({'project': self.project.id})
+        self.assertEqual(refresh.call_count, 1)
+
+    def test_summary_moves_on_after_the_next_catch_up(self):
+        self.assertEqual(analytics.cached_summary()['metrics']['resolve']['count'], 0)
+        self.client.post(reverse('bugs:change_status', args=[self.bug.id]), {'status': 'resolved'})
+        # Within the interval the cached numbers stand
+        self.assertEqual(analytics.cached_summary()['metrics']['resolve']['count'], 0)
+        cache.delete('bug_analytics:refreshed')
+        self.assertEqual(analytics.cached_summary()['metrics']['resolve']['count'], 1)
+
+
+class ActivityStreamTests(ProjectTestCase):
+
+    def record(self, bug, action):
+        return BugHistory.objects.create(bug=bug, user=self.user, action=action).id
+
+    def test_polling_clients_get_new_events_of_their_projects(self):
+        cursor = live.latest_id()
+        first = self.record(self.bug, 'Looked into it')
+        self.record(self.other_bug, 'Checked the numbers')
+        response = self.client.get(reverse('dashboard:activity_stream'), headers={'Last-Event-ID': str(cursor)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn(f'id: {first}\n', body)
+        self.assertIn('Looked into it', body)
+        self.assertNotIn('Checked the numbers', body)
+
+        # A client without a cursor starts from now
+        body = self.client.get(reverse('dashboard:activity_stream')).content.decode()
+        self.assertTrue(body.endswith(f'id: {live.latest_id()}\n\n'))
+
+    @mock.patch.object(live, 'CATCHUP_LIMIT', 2)
+    def test_clients_too_far_behind_are_told_to_reload(self):
+        cursor = live.latest_id()
+        for number in range(3):
+            self.record(self.bug, f'Edit {number}')
+        body = self.client.get(reverse('dashboard:activity_stream'), {'after': cursor}).content.decode()
+        self.assertIn('event: reset', body)
+
+    def test_lagging_subscriber_is_marked_and_catches_up_from_the_buffer(self):
+        hub = live.ActivityHub()
+        subscriber = live.Subscriber([self.project.id])
+        hub.by_project[self.project.id].add(subscriber)
+        events = [live.Event(number, self.project.id, f'id: {number}\n\n')
+                  for number in range(1, live.QUEUE_SIZE + 2)]
+        hub.publish(live.Event(0, self.other_project.id, 'elsewhere'))
+        for event in events:
+            hub.publish(event)
+        self.assertTrue(subscriber.lagged)
+        self.assertIs(subscriber.queue.get_nowait(), live.LAGGED)
+        self.assertEqual(hub.replay(5, [self.project.id]), events[5:])
+
+    async def test_stream_delivers_published_events_of_its_projects(self):
+        hub = live.ActivityHub()
+        with mock.patch.object(live, 'hub', hub):
+            stream = live.stream([self.project.id])
+            try:
+                self.assertEqual(await anext(stream), f'retry: {live.RETRY_MS}\n\n')
+                received = asyncio.ensure_future(anext(stream))
+                await hub.position()
+                hub.publish(live.Event(hub.last_id + 1, self.other_project.id, 'elsewhere'))
+                hub.publish(live.Event(hub.last_id + 2, self.project.id, 'here'))
+                self.assertEqual(await asyncio.wait_for(received, 5), 'here')
+            finally:
+                await stream.aclose()
+        self.assertEqual(hub.subscriber_count, 0)
+
+
+class CycleTimeTests(ProjectTestCase):
+
+    def setUp(self):
+        super().setUp()
+        filed = timezone.now() - timedelta(days=1)
+        Bug.objects.filter(id=self.bug.id).update(created_at=filed)
+        # Hours after filing -> status entered
+        for hours, status in [(2, 'in_progress'), (5, 'resolved'), (6, 'reopened'), (10, 'closed')]:
+            entry = BugHistory.field_change(self.bug, self.user, 'status', '', status)
+            entry.save()
+            BugHistory.objects.filter(id=entry.id).update(timestamp=filed + timedelta(hours=hours))
+
+    def test_transitions_become_durations(self):
+        self.assertEqual(analytics.refresh(), 4)
+        cycle = BugCycleTime.objects.get(bug=self.bug)
+        hours = {name: getattr(cycle, column) / 3600 for name, column in analytics.METRICS.items()
+                 if getattr(cycle, column) is not None}
+        self.assertEqual(hours, {'lead': 10, 'resolve': 5, 'cycle': 3, 'in_open': 2,
+                                 'in_in_progress': 3, 'in_resolved': 1, 'in_reopened': 4})
+        self.assertEqual((cycle.status, cycle.reopen_count), ('closed', 1))
+
+    def test_history_is_read_once_in_any_window_size(self):
+        analytics.refresh(window=1)
+        self.assertEqual(analytics.refresh(), 0)
+        windowed = BugCycleTime.objects.values().get(bug=self.bug)
+        analytics.rebuild()
+        self.assertEqual(BugCycleTime.objects.values().get(bug=self.bug), windowed)
+
+    def test_percentiles_are_nearest_rank(self):
+        stats = analytics.describe(array('d', [10, 1, 2, 3, 4, 5, 6, 7, 8, 9, 100]))
+        self.assertEqual((stats['count'], stats['p50'], stats['p90'], stats['p99']), (11, 6, 10, 100))
+        self.assertEqual(stats['histogram'], [0, 3, 7, 0, 1, 0, 0, 0])
+
+    def test_breakdown_and_bad_parameters(self):
+        analytics.refresh()
+        data = analytics.summary(by='project')
+        self.assertEqual(data['groups'][str(self.project.id)]['lead']['count'], 1)
+        response = self.client.get(reverse('dashboard:analytics_data'), {'by': 'weather'})
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryPlanTests(TestCase):
+
+    def test_every_hot_query_uses_indexes(self):
+        call_command('check_query_plans', stdout=io.StringIO())
+
+    def test_index_walk_without_a_limit_is_a_problem(self):
+        plan = '5 0 0 SCAN bugs_bug USING INDEX bug_updated_idx'
+        self.assertEqual(check_query_plans.plan_problems(plan), ['full index scan of bugs_bug'])
+        self.assertEqual(check_query_plans.plan_problems(plan, limited=True), [])
+        self.assertTrue(check_query_plans.is_limited(Bug.objects.order_by('-updated_at')[:20]))
+        self.assertFalse(check_query_plans.is_limited(Bug.objects.order_by('-updated_at')[20:]))
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates the database to ``migrate_from``, and back to the latest state afterwards."""
+
+    migrate_from = None
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.media_root = os.path.join(root, 'media')
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, ATTACHMENT_ROOT=os.path.join(root, 'attachments')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.migrate, None)
+        self.old_apps = self.migrate(self.migrate_from)
+
+    def migrate(self, name):
+        """Migrate the bugs app to ``name`` (None for the latest); returns the models of that state."""
+        executor = MigrationExecutor(connection)
+        targets = [('bugs', name)] if name else executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+
+class TagMigrationTests(MigrationTestCase):
+    migrate_from = '0002_bug_fts'
+
+    def test_tag_strings_round_trip_through_tag_rows(self):
+        manager = self.old_apps.get_model('auth', 'User').objects.create(username='manager')
+        project = self.old_apps.get_model('projects', 'Project').objects.create(
+            name='Tracker', description='', manager=manager,
+        )
+        OldBug = self.old_apps.get_model('bugs', 'Bug')
+        tagged = OldBug.objects.create(title='Crash', description='', project=project, reported_by=manager,
+                                       tags=' UI, Crash ,ui')
+        untagged = OldBug.objects.create(title='Slow', description='', project=project, reported_by=manager,
+                                         tags='')
+
+        apps = self.migrate('0003_tag_model')
+        BugTag = apps.get_model('bugs', 'BugTag')
+        self.assertEqual(list(BugTag.objects.filter(bug_id=tagged.id).order_by('id').values_list('tag__name', flat=True)),
+                         ['ui', 'crash'])
+        self.assertFalse(BugTag.objects.filter(bug_id=untagged.id).exists())
+
+        apps = self.migrate(self.migrate_from)
+        restored = dict(apps.get_model('bugs', 'Bug').objects.values_list('id', 'tags'))
+        self.assertEqual(restored[tagged.id], 'ui, crash')
+        # The column was nullable, so bugs without tags get NULL back
+        self.assertIsNone(restored[untagged.id])
+
+
+class StructuredHistoryMigrationTests(MigrationTestCase):
+    migrate_from = '0007_bug_daily_rollup'
+
+    def test_action_strings_round_trip_through_structured_fields(self):
+        User = self.old_apps.get_model('auth', 'User')
+        manager = User.objects.create(username='manager')
+        project = self.old_apps.get_model('projects', 'Project').objects.create(
+            name='Tracker', description='', manager=manager,
+        )
+        bug = self.old_apps.get_model('bugs', 'Bug').objects.create(
+            title='Crash', description='', project=project, reported_by=manager,
+        )
+        OldHistory = self.old_apps.get_model('bugs', 'BugHistory')
+        actions = ["Changed priority from 'low' to 'high'", 'Assigned to manager', 'Moved to the backlog']
+        for action in actions:
+            OldHistory.objects.create(bug=bug, user=manager, action=action)
+
+        apps = self.migrate('0008_structured_history')
+        entries = apps.get_model('bugs', 'BugHistory').objects.order_by('id')
+        self.assertEqual(list(entries.values_list('event', 'field', 'old_value', 'new_value')), [
+            ('changed', 'priority', 'low', 'high'),
+            ('changed', 'assigned_to', '', 'manager'),
+            ('other', '', '', ''),
+        ])
+
+        apps = self.migrate(self.migrate_from)
+        restored = apps.get_model('bugs', 'BugHistory').objects.order_by('id').values_list('action', flat=True)
+        self.assertEqual(list(restored), actions)
+
+
+class AttachmentBlobMigrationTests(MigrationTestCase):
+    migrate_from = '0011_similarity_vectors'
+
+    def add_attachment(self, name):
+        Project = self.old_apps.get_model('projects', 'Project')
+        Bug = self.old_apps.get_model('bugs', 'Bug')
+        BugAttachment = self.old_apps.get_model('bugs', 'BugAttachment')
+        manager = self.old_apps.get_model('auth', 'User').objects.create(username='manager')
+        project = Project.objects.create(name='Tracker', description='', manager=manager)
+        bug = Bug.objects.create(title='Crash', description='', project=project, reported_by=manager)
+        return BugAttachment.objects.create(bug=bug, file=name, filename='server.log', uploaded_by=manager)
+
+    def test_attachments_round_trip_through_blobs(self):
+        content = b'ERROR something failed\n' * 100
+        os.makedirs(os.path.join(self.media_root, 'bug_attachments'))
+        with open(os.path.join(self.media_root, 'bug_attachments', 'server.log'), 'wb') as file:
+            file.write(content)
+        attachment = self.add_attachment('bug_attachments/server.log')
+
+        self.migrate(None)
+        migrated = BugAttachment.objects.select_related('blob').get(id=attachment.id)
+        self.assertTrue(migrated.blob.compressed)
+        self.assertEqual(b''.join(attachments.iter_content(migrated.blob)), content)
+
+        apps = self.migrate(self.migrate_from)
+        restored = apps.get_model('bugs', 'BugAttachment').objects.get(id=attachment.id)
+        with open(os.path.join(self.media_root, restored.file.name), 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    def test_missing_files_stop_the_migration_without_losing_rows(self):
+        attachment = self.add_attachment('bug_attachments/gone.log')
+        with self.assertRaisesMessage(RuntimeError, 'attachment files are missing'):
+            self.migrate('0012_attachment_blobs')
+        BugAttachment = self.old_apps.get_model('bugs', 'BugAttachment')
+        self.assertTrue(BugAttachment.objects.filter(id=attachment.id).exists())
+        # Nothing to restore in tearDown
+        BugAttachment.objects.all().delete()
@@ -6,13 +6,26 @@ app_name = 'bugs'
 urlpatterns = [
     path('', views.bug_list, name='bug_list'),
     path('create/', views.create_bug, name='create_bug'),
+    path('duplicates/', views.duplicate_candidates, name='duplicate_candidates'),
+    path('bulk/', views.bulk_update_bugs, name='bulk_update_bugs'),
+    path('import/', views.import_bugs, name='import_bugs'),
+    path('uploads/', views.start_upload, name='start_upload'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('previews/<int:version>/<str:digest>/<str:name>', views.attachment_preview, name='attachment_preview'),
+    path('export/', views.export_bugs, name='export_bugs'),
     path('<int:bug_id>/', views.bug_detail, name='bug_detail'),
+    path('<int:bug_id>/comments/', views.bug_comments, name='bug_comments'),
+    path('<int:bug_id>/history/', views.bug_history, name='bug_history'),
     path('<int:bug_id>/edit/', views.edit_bug, name='edit_bug'),
     path('<int:bug_id>/delete/', views.delete_bug, name='delete_bug'),
     path('<int:bug_id>/status/', views.change_status, name='change_status'),
     path('<int:bug_id>/comment/', views.add_comment, name='add_comment'),
     path('<int:bug_id>/comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
     path('<int:bug_id>/attach/', views.add_attachment, name='add_attachment'),
+    path('<int:bug_id>/attach/<int:attachment_id>/', views.download_attachment, name='download_attachment'),
+    path('<int:bug_id>/attach/<int:attachment_id>/log/', views.log_viewer, name='log_viewer'),
+    path('<int:bug_id>/attach/<int:attachment_id>/log/lines/', views.log_lines, name='log_lines'),
+    path('<int:bug_id>/attach/<int:attachment_id>/log/search/', views.log_search, name='log_search'),
     path('<int:bug_id>/attach/<int:attachment_id>/delete/', views.delete_attachment, name='delete_attachment'),
     path('search/', views.search_bugs, name='search_bugs'),
 ]
@@ -1,32 +1,165 @@
+import csv
+import mimetypes
+import os
+import re
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, QueryDict, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Q
-from .models import Bug, BugAttachment, BugComment, BugHistory
+from django.utils.cache import patch_vary_headers
+from django.utils.http import content_disposition_header
+from django.db.models import Count, Q
+from .models import AttachmentUpload, Bug, BugAttachment, BugComment, BugHistory, BugTag, Tag
+from . import access, attachments, duplicates, logview, previews, search, similarity
+from .bulk import bulk_change
+from .export import export_columns, export_rows, stream_csv, stream_jsonl
+from .importer import BugImporter, detect_format, iter_records, open_text
+from .facets import FACET_FIELDS, NONE_VALUE, apply_facet_filters, cached_facet_counts
+from .pagination import older_items, paginate_bugs, paginate_ranked
+from .serving import serve_file, serve_stream
+from .storage import attachment_storage
 from projects.models import Project, ProjectVersion
 
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+# Lines the log viewer loads at a time
+LOG_PAGE_LINES = 200
+
+def _filter_by_tags(bugs, names):
+    """Restrict bugs to those carrying every tag in ``names`` (exact match)."""
+    for name in names:
+        name = Tag.normalize(name)
+        if name:
+            bugs = bugs.filter(id__in=BugTag.objects.filter(tag__name=name).values('bug_id'))
+    return bugs
+
+def _filter_by_text(bugs, query):
+    """Restrict bugs to keyword matches, through the full-text index when available."""
+    if not query:
+        return bugs
+    if search.is_available():
+        return search.filter_queryset(bugs, query)
+    return bugs.filter(
+        Q(title__icontains=query) | 
+        Q(description__icontains=query) |
+        Q(id__in=BugTag.objects.filter(tag__name=Tag.normalize(query)).values('bug_id'))
+    )
+
+def _filter_bugs(params, user):
+    """Apply the bug list filters in ``params`` (a QueryDict) to the bugs ``user`` may see."""
+    bugs = _filter_by_tags(access.visible_bugs(user, Bug.objects.all()), params.getlist('tag'))
+    bugs = _filter_by_text(bugs, params.get('q', ''))
+    return apply_facet_filters(bugs, {
+        facet: params.get(facet, '') for facet in FACET_FIELDS
+    })
+
 @login_required
 def bug_list(request):
-    """Display list of all bugs."""
-    bugs = Bug.objects.all()
-    
-    # Filter by project if specified
-    project_id = request.GET.get('project')
-    if project_id:
-        bugs = bugs.filter(project_id=project_id)
-    
-    # Filter by status if specified
-    status = request.GET.get('status')
-    if status:
-        bugs = bugs.filter(status=status)
-    
-    # Filter by priority if specified
-    priority = request.GET.get('priority')
-    if priority:
-        bugs = bugs.filter(priority=priority)
-    
-    return render(request, 'bugs/bug_list.html', {'bugs': bugs})
+    """Display a page of bugs, newest first."""
+    bugs = _filter_bugs(request.GET, request.user)
+    page = paginate_bugs(bugs, request)
+
+    # Assignees and versions for the bulk action bar, which only make sense
+    # within one project: offered once the list is filtered by project
+    project_id = request.GET.get('project', '')
+    bulk_project = (
+        access.visible_projects(request.user).filter(id=project_id).first()
+        if project_id.isdigit() else None
+    )
+    if bulk_project is None:
+        users = versions = []
+    else:
+        users = access.project_members(bulk_project).only('id', 'username').order_by('username')
+        versions = bulk_project.versions.only('id', 'version_number')
+
+    return render(request, 'bugs/bug_list.html', {
+        'bugs': page.object_list,
+        'page': page,
+        'projects': access.visible_projects(request.user).only('id', 'name'),
+        'bulk_project': bulk_project,
+        'users': users,
+        'versions': versions,
+        'selected_tags': request.GET.getlist('tag'),
+        'filters': page.querystring,
+    })
+
+@login_required
+def export_bugs(request):
+    """Stream every bug matching the list or search filters as CSV or JSON Lines."""
+    bugs = _filter_bugs(request.GET, request.user)
+    columns = export_columns(request.GET.getlist('include'))
+    rows = export_rows(bugs, columns)
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+
+    if request.GET.get('format') == 'jsonl':
+        response = StreamingHttpResponse(stream_jsonl(rows), content_type='application/x-ndjson')
+        filename = f'bugs-{stamp}.jsonl'
+    else:
+        response = StreamingHttpResponse(stream_csv(rows, columns), content_type='text/csv')
+        filename = f'bugs-{stamp}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+def bulk_update_bugs(request):
+    """Apply one set of changes to many bugs, chosen by id or by the current filter."""
+    if request.method != 'POST':
+        return redirect('bugs:bug_list')
+
+    filters = QueryDict(request.POST.get('filters', ''))
+    redirect_url = reverse('bugs:bug_list') + (f"?{filters.urlencode()}" if filters else '')
+
+    if request.POST.get('scope') == 'all':
+        bugs = _filter_bugs(filters, request.user)
+    else:
+        bug_ids = [bug_id for bug_id in request.POST.getlist('bug_ids') if bug_id.isdigit()]
+        if not bug_ids:
+            messages.error(request, 'Select at least one bug.')
+            return redirect(redirect_url)
+        bugs = access.visible_bugs(request.user, Bug.objects.filter(id__in=bug_ids))
+    project_ids = set(bugs.order_by().values_list('project_id', flat=True).distinct())
+
+    changes = {}
+    status = request.POST.get('set_status')
+    if status in dict(Bug.STATUS_CHOICES):
+        changes['status'] = status
+    priority = request.POST.get('set_priority')
+    if priority in dict(Bug.PRIORITY_CHOICES):
+        changes['priority'] = priority
+    assignee = request.POST.get('set_assigned_to')
+    if assignee == NONE_VALUE:
+        changes['assigned_to'] = None
+    elif assignee:
+        # Only someone working on every selected bug's project can take them all
+        if not assignee.isdigit() or any(
+            not access.project_members(project).filter(id=assignee).exists()
+            for project in Project.objects.filter(id__in=project_ids)
+        ):
+            messages.error(request, 'Bugs can only be assigned to members of their project.')
+            return redirect(redirect_url)
+        changes['assigned_to'] = get_object_or_404(User, id=assignee)
+    version = request.POST.get('set_project_version')
+    if version == NONE_VALUE:
+        changes['project_version'] = None
+    elif version:
+        version = get_object_or_404(ProjectVersion, id=version) if version.isdigit() else None
+        if version is None or project_ids - {version.project_id}:
+            messages.error(request, 'A version can only be set on bugs of its own project.')
+            return redirect(redirect_url)
+        changes['project_version'] = version
+
+    if not changes:
+        messages.error(request, 'Choose at least one change to apply.')
+        return redirect(redirect_url)
+
+    count = bulk_change(bugs, request.user, **changes)
+    messages.success(request, f'Updated {count} bug{"s" if count != 1 else ""}.')
+    return redirect(redirect_url)
 
 @login_required
 def create_bug(request):
@@ -38,7 +171,18 @@ def create_bug(request):
         version_id = request.POST.get('project_version')
         priority = request.POST.get('priority')
         severity = request.POST.get('severity')
-        
+        tags = request.POST.get('tags', '')
+
+        project = Project.objects.filter(id=project_id).first() if str(project_id).isdigit() else None
+        if project is None or not access.can_view_project(request.user, project):
+            messages.error(request, 'Choose one of your projects.')
+            return redirect('bugs:create_bug')
+        if version_id and not (
+            version_id.isdigit() and ProjectVersion.objects.filter(id=version_id, project=project).exists()
+        ):
+            messages.error(request, 'That version does not belong to the project.')
+            return redirect('bugs:create_bug')
+
         # Create the bug
         bug = Bug.objects.create(
             title=title,
@@ -54,53 +198,174 @@ def create_bug(request):
             bug.project_version_id = version_id
             bug.save()
         
+        if tags:
+            bug.set_tag_names(tags)
+        
         # Create history entry
         BugHistory.objects.create(
             bug=bug,
             user=request.user,
+            event='created',
             action=f"Created bug"
         )
         
-        # Handle file attachments
-        if 'attachments' in request.FILES:
-            for file in request.FILES.getlist('attachments'):
-                BugAttachment.objects.create(
-                    bug=bug,
-                    file=file,
-                    filename=file.name,
-                    uploaded_by=request.user
-                )
+        # Handle file attachments: uploaded in chunks beforehand, or posted with the form
+        for upload in attachments.finished_uploads(request.user, request.POST.getlist('uploads')):
+            attachments.attach(bug, upload, request.user)
+        for file in request.FILES.getlist('attachments'):
+            try:
+                attachments.attach(bug, attachments.upload_file(file, request.user), request.user)
+            except attachments.UploadError as exc:
+                messages.error(request, f'Could not attach "{file.name}": {exc}')
         
         messages.success(request, f'Bug "{title}" has been created.')
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     # Get projects for the form
-    projects = Project.objects.all()
-    
+    projects = access.visible_projects(request.user)
+
     return render(request, 'bugs/create_bug.html', {'projects': projects})
 
+@login_required
+def duplicate_candidates(request):
+    """Bugs in the same project that look like the one being typed, for the report form."""
+    try:
+        project_id = int(request.GET.get('project', ''))
+        exclude = int(request.GET['exclude']) if request.GET.get('exclude') else None
+    except ValueError:
+        return JsonResponse({'error': 'project must be a project id and exclude a bug id'}, status=400)
+    project = get_object_or_404(Project, id=project_id)
+    if not access.can_view_project(request.user, project):
+        raise PermissionDenied
+
+    matches = duplicates.find_duplicates(
+        project_id, request.GET.get('title', ''), request.GET.get('description', ''), exclude=exclude
+    )
+    bugs = access.visible_bugs(request.user, Bug.objects.only('id', 'title', 'status')).in_bulk(
+        [bug_id for bug_id, _ in matches]
+    )
+
+    return JsonResponse({'duplicates': [
+        {
+            'id': bug_id,
+            'title': bugs[bug_id].title,
+            'status': bugs[bug_id].get_status_display(),
+            'similarity': round(score, 2),
+            'url': reverse('bugs:bug_detail', args=[bug_id]),
+        }
+        for bug_id, score in matches if bug_id in bugs
+    ]})
+
+@login_required
+def import_bugs(request):
+    """Import bugs from an uploaded CSV or JSON Lines file."""
+    if not request.user.is_staff:
+        messages.error(request, 'You do not have permission to import bugs.')
+        return redirect('bugs:bug_list')
+
+    result = None
+    if request.method == 'POST' and 'file' in request.FILES:
+        upload = request.FILES['file']
+        fmt = request.POST.get('format') or detect_format(upload.name)
+        importer = BugImporter(request.user, dry_run=bool(request.POST.get('dry_run')))
+        try:
+            result = importer.run(iter_records(open_text(upload), fmt))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            messages.error(request, f'Could not read "{upload.name}": {exc}')
+        else:
+            verb = 'validated' if importer.dry_run else 'imported'
+            messages.success(request, f'{result.created} bugs {verb}, {result.failed} rows rejected.')
+            if result.created and not importer.dry_run:
+                messages.info(request, 'Duplicate and similar bug suggestions include the new bugs once '
+                                       '"manage.py rebuild_duplicate_index --missing" and '
+                                       '"manage.py rebuild_similarity_index --missing" have run.')
+
+    return render(request, 'bugs/import_bugs.html', {'result': result})
+
 @login_required
 def bug_detail(request, bug_id):
     """Display bug details."""
-    bug = get_object_or_404(Bug, id=bug_id)
-    comments = bug.comments.all()
-    attachments = bug.attachments.all()
-    history = bug.history.all()
-    
+    bug = _visible_bug(
+        request, bug_id,
+        Bug.objects.select_related('project_version', 'reported_by', 'assigned_to')
+        .prefetch_related('tags')
+        .annotate(comment_count=Count('comments')),
+    )
+    # Previews come from the preview cache; the attachments themselves are not read
+    bug_attachments = list(bug.attachments.select_related('uploaded_by', 'blob', 'blob__preview'))
+    for attachment in bug_attachments:
+        attachment.preview = previews.preview_of(attachment.blob)
+
+    # Only the newest comments and history are rendered inline; older ones
+    # are fetched on demand from bug_comments / bug_history
+    comments, older_comments = older_items(bug.comments.select_related('author'), 'created_at')
+    history, older_history = older_items(bug.history.select_related('user'), 'timestamp')
+
+    # Related bugs and how they ended, best match first
+    matches = similarity.similar_bugs(bug.id)
+    related = access.visible_bugs(request.user, Bug.objects.select_related('assigned_to').only(
+        'id', 'title', 'status', 'resolved_at', 'assigned_to__username'
+    )).in_bulk([bug_id for bug_id, _ in matches])
+    similar_bugs = []
+    for bug_id, score in matches:
+        if bug_id in related:
+            related[bug_id].similarity = score
+            similar_bugs.append(related[bug_id])
+
     context = {
         'bug': bug,
-        'comments': comments,
-        'attachments': attachments,
-        'history': history
+        'comments': comments[::-1],
+        'older_comments': older_comments,
+        'attachments': bug_attachments,
+        'history': history,
+        'older_history': older_history,
+        'similar_bugs': similar_bugs,
     }
-    
+
     return render(request, 'bugs/bug_detail.html', context)
 
+def _visible_bug(request, bug_id, bugs=None):
+    """The bug ``bug_id`` from ``bugs``, if the user may see its project."""
+    bug = get_object_or_404(
+        (Bug.objects if bugs is None else bugs).select_related('project'), id=bug_id
+    )
+    if not access.can_view_project(request.user, bug.project):
+        raise PermissionDenied
+    return bug
+
+@login_required
+def bug_comments(request, bug_id):
+    """Render the batch of comments older than the ``before`` cursor."""
+    _visible_bug(request, bug_id)
+    comments, older_comments = older_items(
+        BugComment.objects.filter(bug_id=bug_id).select_related('author'),
+        'created_at', request.GET.get('before'),
+    )
+    return render(request, 'bugs/_comments.html', {
+        'bug_id': bug_id,
+        'comments': comments[::-1],
+        'older_comments': older_comments,
+    })
+
+@login_required
+def bug_history(request, bug_id):
+    """Render the batch of history entries older than the ``before`` cursor."""
+    _visible_bug(request, bug_id)
+    history, older_history = older_items(
+        BugHistory.objects.filter(bug_id=bug_id).select_related('user'),
+        'timestamp', request.GET.get('before'),
+    )
+    return render(request, 'bugs/_history.html', {
+        'bug_id': bug_id,
+        'history': history,
+        'older_history': older_history,
+    })
+
 @login_required
 def edit_bug(request, bug_id):
     """Edit bug details."""
-    bug = get_object_or_404(Bug, id=bug_id)
-    
+    bug = _visible_bug(request, bug_id)
+
     if request.method == 'POST':
         old_title = bug.title
         old_priority = bug.priority
@@ -113,74 +378,82 @@ def edit_bug(request, bug_id):
         bug.severity = request.POST.get('severity', bug.severity)
         bug.status = request.POST.get('status', bug.status)
         
-        # Assign to user if specified
+        # Assign to user if specified; only the project's people can be assigned
         assigned_to_id = request.POST.get('assigned_to')
         if assigned_to_id:
+            if not (assigned_to_id.isdigit()
+                    and access.project_members(bug.project).filter(id=assigned_to_id).exists()):
+                messages.error(request, 'Bugs can only be assigned to members of their project.')
+                return redirect('bugs:edit_bug', bug_id=bug.id)
             bug.assigned_to_id = assigned_to_id
         
         # Update project version if specified
         version_id = request.POST.get('project_version')
         if version_id:
+            if not (version_id.isdigit()
+                    and ProjectVersion.objects.filter(id=version_id, project_id=bug.project_id).exists()):
+                messages.error(request, 'That version does not belong to the project.')
+                return redirect('bugs:edit_bug', bug_id=bug.id)
             bug.project_version_id = version_id
         
         bug.save()
         
+        # Replace tags if the form sent them
+        if 'tags' in request.POST:
+            bug.set_tag_names(request.POST.get('tags'))
+        
         # Create history entries for changes
         changes = []
         if old_title != bug.title:
-            changes.append(f"Changed title from '{old_title}' to '{bug.title}'")
+            changes.append(('title', old_title, bug.title))
         if old_priority != bug.priority:
-            changes.append(f"Changed priority from '{old_priority}' to '{bug.priority}'")
+            changes.append(('priority', old_priority, bug.priority))
         if old_severity != bug.severity:
-            changes.append(f"Changed severity from '{old_severity}' to '{bug.severity}'")
+            changes.append(('severity', old_severity, bug.severity))
         if old_status != bug.status:
-            changes.append(f"Changed status from '{old_status}' to '{bug.status}'")
+            changes.append(('status', old_status, bug.status))
             
             # Set resolved date if status changed to resolved
             if bug.status == 'resolved' and old_status != 'resolved':
                 bug.resolved_at = timezone.now()
                 bug.save()
         
-        for change in changes:
-            BugHistory.objects.create(
-                bug=bug,
-                user=request.user,
-                action=change
-            )
+        for field, old_value, new_value in changes:
+            BugHistory.field_change(bug, request.user, field, old_value, new_value).save()
         
         messages.success(request, f'Bug #{bug.id} has been updated.')
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     # Get data for form
-    projects = Project.objects.all()
+    projects = access.visible_projects(request.user)
     versions = ProjectVersion.objects.filter(project=bug.project)
-    
+
     context = {
         'bug': bug,
         'projects': projects,
         'versions': versions
     }
-    
+
     return render(request, 'bugs/edit_bug.html', context)
 
 @login_required
 def delete_bug(request, bug_id):
     """Delete a bug."""
-    bug = get_object_or_404(Bug, id=bug_id)
-    
+    bug = _visible_bug(request, bug_id)
+
     if request.method == 'POST':
         bug_id = bug.id
         bug.delete()
         messages.success(request, f'Bug #{bug_id} has been deleted.')
         return redirect('bugs:bug_list')
-    
+
     return render(request, 'bugs/delete_bug.html', {'bug': bug})
 
 @login_required
 def change_status(request, bug_id):
     """Change the status of a bug."""
-    bug = get_object_or_404(Bug, id=bug_id)
-    
+    bug = _visible_bug(request, bug_id)
+
     if request.method == 'POST':
         old_status = bug.status
         new_status = request.POST.get('status')
@@ -195,23 +468,19 @@ def change_status(request, bug_id):
             bug.save()
             
             # Create history entry
-            BugHistory.objects.create(
-                bug=bug,
-                user=request.user,
-                action=f"Changed status from '{old_status}' to '{new_status}'"
-            )
+            BugHistory.field_change(bug, request.user, 'status', old_status, new_status).save()
             
             messages.success(request, f'Bug status updated to {new_status}.')
         
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     return render(request, 'bugs/change_status.html', {'bug': bug})
 
 @login_required
 def add_comment(request, bug_id):
     """Add a comment to a bug."""
-    bug = get_object_or_404(Bug, id=bug_id)
-    
+    bug = _visible_bug(request, bug_id)
+
     if request.method == 'POST':
         content = request.POST.get('content')
         
@@ -226,26 +495,28 @@ def add_comment(request, bug_id):
             BugHistory.objects.create(
                 bug=bug,
                 user=request.user,
+                event='commented',
+                new_value=content[:50],
                 action=f"Added comment: {content[:50]}..."
             )
             
             messages.success(request, 'Your comment has been added.')
         
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     return render(request, 'bugs/add_comment.html', {'bug': bug})
 
 @login_required
 def delete_comment(request, bug_id, comment_id):
     """Delete a comment."""
-    bug = get_object_or_404(Bug, id=bug_id)
+    bug = _visible_bug(request, bug_id)
     comment = get_object_or_404(BugComment, id=comment_id, bug=bug)
-    
+
     # Only allow the author or admin to delete
     if request.user != comment.author and not request.user.is_staff:
         messages.error(request, 'You do not have permission to delete this comment.')
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     if request.method == 'POST':
         comment.delete()
         
@@ -253,54 +524,265 @@ def delete_comment(request, bug_id, comment_id):
         BugHistory.objects.create(
             bug=bug,
             user=request.user,
+            event='comment_deleted',
             action=f"Deleted a comment"
         )
         
         messages.success(request, 'Comment has been deleted.')
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     return render(request, 'bugs/delete_comment.html', {'bug': bug, 'comment': comment})
 
 @login_required
 def add_attachment(request, bug_id):
-    """Add an attachment to a bug."""
-    bug = get_object_or_404(Bug, id=bug_id)
-    
+    """Add attachments to a bug."""
+    bug = _visible_bug(request, bug_id)
+
     if request.method == 'POST':
+        uploads = list(attachments.finished_uploads(request.user, request.POST.getlist('uploads')))
         if 'file' in request.FILES:
             file = request.FILES['file']
-            
-            attachment = BugAttachment.objects.create(
-                bug=bug,
-                file=file,
-                filename=file.name,
-                uploaded_by=request.user
-            )
+            try:
+                uploads.append(attachments.upload_file(file, request.user))
+            except attachments.UploadError as exc:
+                messages.error(request, f'Could not attach "{file.name}": {exc}')
+        
+        for upload in uploads:
+            attachments.attach(bug, upload, request.user)
             
             # Create history entry
             BugHistory.objects.create(
                 bug=bug,
                 user=request.user,
-                action=f"Added attachment: {file.name}"
+                event='attached',
+                new_value=upload.filename,
+                action=f"Added attachment: {upload.filename}"
             )
             
-            messages.success(request, f'Attachment "{file.name}" has been added.')
+            messages.success(request, f'Attachment "{upload.filename}" has been added.')
         
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     return render(request, 'bugs/add_attachment.html', {'bug': bug})
 
+def _upload_status(upload, error=None):
+    status = {
+        'id': str(upload.id),
+        'filename': upload.filename,
+        'size': upload.size,
+        'received': upload.received,
+        'complete': upload.complete,
+        'chunk_size': attachments.CHUNK_SIZE,
+        'url': reverse('bugs:upload_chunk', args=[upload.id]),
+    }
+    if error:
+        status['error'] = error
+    return status
+
+@login_required
+def start_upload(request):
+    """Begin a chunked attachment upload, or find the unfinished one for the same file."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST the filename, size and key of the file'}, status=405)
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size must be a number of bytes'}, status=400)
+    try:
+        upload = attachments.start_upload(
+            request.user, request.POST.get('filename', ''), size, request.POST.get('key', '')
+        )
+    except attachments.UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(_upload_status(upload))
+
+@login_required
+def upload_chunk(request, upload_id):
+    """PUT one chunk of an upload (placed by its Content-Range header); GET where to resume."""
+    upload = get_object_or_404(AttachmentUpload, id=upload_id, uploaded_by=request.user)
+    if request.method == 'PUT':
+        match = CONTENT_RANGE_RE.fullmatch(request.headers.get('Content-Range', ''))
+        if not match:
+            return JsonResponse({'error': 'Content-Range must be "bytes first-last/size"'}, status=400)
+        first, last, size = map(int, match.groups())
+        if last < first or size != upload.size:
+            return JsonResponse({'error': 'Content-Range does not match the upload'}, status=400)
+        try:
+            attachments.write_chunk(upload, first, request, last - first + 1)
+        except attachments.UploadError as exc:
+            return JsonResponse(_upload_status(upload, str(exc)), status=409)
+    return JsonResponse(_upload_status(upload))
+
+@login_required
+def attachment_preview(request, version, digest, name):
+    """Send a generated preview file; its URL is never reused for other content."""
+    path = previews.preview_path(version, digest, name)
+    if path is None:
+        raise Http404('No such preview')
+    if not request.user.is_staff and not BugAttachment.objects.filter(
+        Q(bug__project__manager=request.user) | Q(bug__project__members=request.user),
+        blob__digest=digest,
+    ).exists():
+        raise PermissionDenied
+    return serve_file(
+        request, os.path.relpath(path, attachment_storage().location), mimetypes.guess_type(name)[0],
+        etag=f'{digest}-v{version}-{name}', last_modified=os.path.getmtime(path),
+        cache_control=f'private, max-age={previews.CACHE_SECONDS}, immutable',
+    )
+
+@login_required
+def download_attachment(request, bug_id, attachment_id):
+    """
+    Send an attachment to members of its project. Conditional and range
+    requests are answered, and gzipped text goes out as stored to clients
+    that accept gzip.
+    """
+    attachment = get_object_or_404(
+        BugAttachment.objects.select_related('blob', 'bug__project'), id=attachment_id, bug_id=bug_id
+    )
+    if not access.can_view_project(request.user, attachment.bug.project):
+        raise PermissionDenied
+    blob = attachment.blob
+    content_type = mimetypes.guess_type(attachment.filename)[0]
+    if content_type is None:
+        content_type = 'text/plain; charset=utf-8' if blob.compressed else 'application/octet-stream'
+    # Only types a browser displays without running anything are shown inline
+    inline = content_type.startswith(('image/', 'text/plain', 'application/pdf', 'video/', 'audio/')) \
+        and 'svg' not in content_type
+    disposition = content_disposition_header(not inline, attachment.filename)
+    last_modified = blob.created_at.timestamp()
+
+    # Blob content never changes, so its digest is a strong validator
+    if not blob.compressed:
+        return serve_file(request, blob.file.name, content_type, blob.digest, last_modified, disposition)
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = serve_file(request, blob.file.name, content_type, f'{blob.digest}-gzip', last_modified,
+                              disposition, encoding='gzip')
+    else:
+        response = serve_stream(request, attachments.iter_content(blob), blob.size, content_type,
+                                blob.digest, last_modified, disposition)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+def _log_attachment(request, bug_id, attachment_id):
+    attachment = get_object_or_404(
+        BugAttachment.objects.select_related('blob', 'bug__project'), id=attachment_id, bug_id=bug_id
+    )
+    if not access.can_view_project(request.user, attachment.bug.project):
+        raise PermissionDenied
+    # Text is what gets stored compressed
+    if not attachment.blob.compressed:
+        raise Http404('Only text attachments can be viewed as logs')
+    return attachment
+
+def _log_preparing(attachment):
+    """Answer a request for a log that is not in the log cache, queueing it to be built."""
+    previews.regenerate([attachment.blob_id])
+    response = JsonResponse({'error': 'The log is being prepared for viewing; try again shortly.'}, status=503)
+    response['Retry-After'] = 5
+    return response
+
+def _line_number(request, name, default):
+    """A 1-based line number from the query string, as a 0-based one."""
+    try:
+        return max(int(request.GET.get(name, default)), 1) - 1
+    except ValueError:
+        return default - 1
+
+@login_required
+def log_viewer(request, bug_id, attachment_id):
+    """Page through and search a text attachment without downloading it."""
+    attachment = _log_attachment(request, bug_id, attachment_id)
+    log = logview.open_log(attachment.blob)
+    if log is None:
+        previews.regenerate([attachment.blob_id])
+        return render(request, 'bugs/log_viewer.html', {
+            'bug': attachment.bug,
+            'attachment': attachment,
+            'preparing': True,
+        })
+    with log:
+        line_count = log.line_count
+    return render(request, 'bugs/log_viewer.html', {
+        'bug': attachment.bug,
+        'attachment': attachment,
+        'line_count': line_count,
+        'page_lines': LOG_PAGE_LINES,
+        'max_pattern_chars': logview.MAX_PATTERN_CHARS,
+    })
+
+@login_required
+def log_lines(request, bug_id, attachment_id):
+    """Up to ``count`` lines of a text attachment from line ``start`` on."""
+    attachment = _log_attachment(request, bug_id, attachment_id)
+    start = _line_number(request, 'start', 1)
+    try:
+        count = min(max(int(request.GET.get('count', LOG_PAGE_LINES)), 0), logview.MAX_LINES)
+    except ValueError:
+        return JsonResponse({'error': 'count must be a number of lines'}, status=400)
+    log = logview.open_log(attachment.blob)
+    if log is None:
+        return _log_preparing(attachment)
+    with log:
+        return JsonResponse({
+            'start': start + 1,
+            'lines': log.lines(start, count),
+            'line_count': log.line_count,
+        })
+
+def _log_matches(blob, pattern, start):
+    # Opened here, so the log is closed with the response however it ends
+    log = logview.open_log(blob)
+    if log is None:
+        # Evicted since the view checked
+        yield {'next': start + 1}
+        return
+    with log:
+        resume = None
+        for line, text in log.search(pattern, start):
+            if text is None:
+                resume = line + 1
+            else:
+                yield {'line': line + 1, 'text': text}
+        yield {'next': resume}
+
+@login_required
+def log_search(request, bug_id, attachment_id):
+    """
+    Lines of a text attachment matching the regular expression ``q``, from
+    line ``start`` on, as JSON Lines sent as they are found. The last line
+    is ``{"next": n}``, with the line to continue from if the search was
+    cut short and null otherwise; an expression that backtracks without end
+    only costs the window of the log it got stuck in (see ``logview``).
+    """
+    attachment = _log_attachment(request, bug_id, attachment_id)
+    pattern = request.GET.get('q', '')
+    if not pattern or len(pattern) > logview.MAX_PATTERN_CHARS:
+        return JsonResponse(
+            {'error': f'q must be a regular expression of up to {logview.MAX_PATTERN_CHARS} characters'}, status=400
+        )
+    if not logview.is_cached(attachment.blob):
+        return _log_preparing(attachment)
+    try:
+        compiled = logview.compile_pattern(pattern, ignore_case=bool(request.GET.get('ignore_case')))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return StreamingHttpResponse(
+        stream_jsonl(_log_matches(attachment.blob, compiled, _line_number(request, 'start', 1))),
+        content_type='application/x-ndjson',
+    )
+
 @login_required
 def delete_attachment(request, bug_id, attachment_id):
     """Delete an attachment."""
-    bug = get_object_or_404(Bug, id=bug_id)
+    bug = _visible_bug(request, bug_id)
     attachment = get_object_or_404(BugAttachment, id=attachment_id, bug=bug)
-    
+
     # Only allow the uploader or admin to delete
     if request.user != attachment.uploaded_by and not request.user.is_staff:
         messages.error(request, 'You do not have permission to delete this attachment.')
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     if request.method == 'POST':
         filename = attachment.filename
         attachment.delete()
@@ -309,52 +791,79 @@ def delete_attachment(request, bug_id, attachment_id):
         BugHistory.objects.create(
             bug=bug,
             user=request.user,
+            event='attachment_deleted',
+            new_value=filename,
             action=f"Deleted attachment: {filename}"
         )
         
         messages.success(request, f'Attachment "{filename}" has been deleted.')
         return redirect('bugs:bug_detail', bug_id=bug.id)
-    
+
     return render(request, 'bugs/delete_attachment.html', {'bug': bug, 'attachment': attachment})
 
 @login_required
 def search_bugs(request):
     """Search bugs by keyword, project, status, etc."""
     query = request.GET.get('q', '')
-    status = request.GET.get('status', '')
-    priority = request.GET.get('priority', '')
-    severity = request.GET.get('severity', '')
-    project_id = request.GET.get('project', '')
-    
-    bugs = Bug.objects.all()
-    
+    selected = {
+        'status': request.GET.get('status', ''),
+        'priority': request.GET.get('priority', ''),
+        'severity': request.GET.get('severity', ''),
+        'project': request.GET.get('project', ''),
+        'assigned_to': request.GET.get('assigned_to', ''),
+    }
+    tags = request.GET.getlist('tag')
+
+    projects = access.visible_projects(request.user).only('id', 'name')
+    # Part of the facet cache key, as users with the same projects see the same counts
+    project_ids = None if request.user.is_staff else sorted(project.id for project in projects)
+    bugs = _filter_by_tags(access.visible_bugs(request.user, Bug.objects.all()), tags)
+
+    # Ranked results apply the keyword match themselves while paginating
+    ranked = bool(query) and search.is_available()
+    matched = _filter_by_text(bugs, query)
+    if not ranked:
+        bugs = matched
+
+    # Facet counts ignore each facet's own selection, so they are computed
+    # before the dropdown filters are applied
+    counts = cached_facet_counts(
+        matched, selected, {'q': query, 'tags': sorted(tags), 'projects': project_ids}
+    )
+
     # Apply filters if provided
-    if query:
-        bugs = bugs.filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(tags__icontains=query)
-        )
-    if status:
-        bugs = bugs.filter(status=status)
-    if priority:
-        bugs = bugs.filter(priority=priority)
-    if severity:
-        bugs = bugs.filter(severity=severity)
-    if project_id:
-        bugs = bugs.filter(project_id=project_id)
-    
-    # Get data for filter dropdowns
-    projects = Project.objects.all()
-    
+    bugs = apply_facet_filters(bugs, selected)
+
+    if ranked:
+        page = paginate_ranked(query, bugs, request)
+    else:
+        page = paginate_bugs(bugs, request)
+
+    # Get data for filter dropdowns, annotated with their facet counts
+    assignees = User.objects.filter(
+        id__in=[int(key) for key in counts['assigned_to'] if key != NONE_VALUE]
+    ).only('id', 'username')
+    facets = {
+        'status': [(value, label, counts['status'][value]) for value, label in Bug.STATUS_CHOICES],
+        'priority': [(value, label, counts['priority'][value]) for value, label in Bug.PRIORITY_CHOICES],
+        'severity': [(value, label, counts['severity'][value]) for value, label in Bug.SEVERITY_CHOICES],
+        'project': [(str(p.id), p.name, counts['project'][str(p.id)]) for p in projects],
+        'assigned_to': [(NONE_VALUE, 'Unassigned', counts['assigned_to'][NONE_VALUE])] + [
+            (str(user.id), user.username, counts['assigned_to'][str(user.id)]) for user in assignees
+        ],
+    }
+
     context = {
-        'bugs': bugs,
-        'projects': projects,
+        'bugs': page.object_list,
+        'page': page,
+        'facets': facets,
         'query': query,
-        'selected_status': status,
-        'selected_priority': priority,
-        'selected_severity': severity,
-        'selected_project': project_id
+        'selected_status': selected['status'],
+        'selected_priority': selected['priority'],
+        'selected_severity': selected['severity'],
+        'selected_project': selected['project'],
+        'selected_assigned_to': selected['assigned_to'],
+        'selected_tags': tags,
     }
-    
+
     return render(request, 'bugs/search_bugs.html', context)
@@ -8,5 +8,9 @@ urlpatterns = [
     path('my-bugs/', views.my_bugs, name='my_bugs'),
     path('my-projects/', views.my_projects, name='my_projects'),
     path('recent-activity/', views.recent_activity, name='recent_activity'),
+    path('activity/stream/', views.activity_stream, name='activity_stream'),
     path('stats/', views.statistics, name='statistics'),
+    path('stats/chart/', views.statistics_chart, name='statistics_chart'),
+    path('analytics/', views.analytics, name='analytics'),
+    path('analytics/data/', views.analytics_data, name='analytics_data'),
 ]
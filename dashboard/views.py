@@ -1,32 +1,52 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from bugs.models import Bug, BugHistory
-from projects.models import Project
-from django.db.models import Count, Case, When, IntegerField, Q
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from bugs import live
+from bugs.access import can_view_project, visible_bugs, visible_projects
+from bugs.analytics import METRIC_LABELS, AnalyticsParamError, cached_summary, parse_params
+from bugs.models import Bug, BugHistory, ProjectBugStats
+from bugs.rollups import BREAKDOWNS, RollupRangeError, parse_range, series
+from projects.models import Project, ProjectVersion, member_count
+from django.db.models import Case, When, IntegerField, Q, Sum
+
+def _visible_project_ids(user):
+    """The ids of the projects ``user`` may see, or None for staff, who see them all."""
+    if user.is_staff:
+        return None
+    return list(visible_projects(user).values_list('id', flat=True))
 
 @login_required
 def dashboard(request):
     """Main dashboard view."""
     # Get bugs assigned to the user
-    assigned_bugs = Bug.objects.filter(assigned_to=request.user).order_by('-updated_at')[:5]
+    assigned_bugs = visible_bugs(request.user, Bug.objects.filter(assigned_to=request.user))
+    assigned_bugs = assigned_bugs.select_related('project').order_by('-updated_at')[:5]
     
-    # Get projects the user is a member of
-    user_projects = Project.objects.filter(members=request.user)
+    # Get projects the user is a member of, with their bug counters
+    user_projects = list(Project.objects.filter(members=request.user).select_related('bug_stats'))
     
-    # Get recent bug activity across all projects
-    recent_activity = BugHistory.objects.order_by('-timestamp')[:10]
+    # Get recent bug activity across the projects the user may see
+    recent_activity = BugHistory.objects.select_related('user').order_by('-timestamp')
+    project_ids = _visible_project_ids(request.user)
+    if project_ids is not None:
+        recent_activity = recent_activity.filter(bug__project_id__in=project_ids)
+    recent_activity = recent_activity[:10]
     
     # Get bug statistics for projects the user is involved with
     project_stats = []
     for project in user_projects:
-        bugs = Bug.objects.filter(project=project)
+        counts = ProjectBugStats.for_project(project)
         stats = {
             'project': project,
-            'total_bugs': bugs.count(),
-            'open_bugs': bugs.filter(status='open').count(),
-            'in_progress_bugs': bugs.filter(status='in_progress').count(),
-            'resolved_bugs': bugs.filter(status='resolved').count(),
-            'closed_bugs': bugs.filter(status='closed').count(),
+            'total_bugs': counts.total,
+            'open_bugs': counts.status_open,
+            'in_progress_bugs': counts.status_in_progress,
+            'resolved_bugs': counts.status_resolved,
+            'closed_bugs': counts.status_closed,
         }
         project_stats.append(stats)
     
@@ -42,8 +62,9 @@ def dashboard(request):
 @login_required
 def my_bugs(request):
     """Display bugs reported by or assigned to the user."""
-    reported_bugs = Bug.objects.filter(reported_by=request.user).order_by('-created_at')
-    assigned_bugs = Bug.objects.filter(assigned_to=request.user).order_by('-updated_at')
+    bugs = visible_bugs(request.user, Bug.objects.all())
+    reported_bugs = bugs.filter(reported_by=request.user).order_by('-created_at')
+    assigned_bugs = bugs.filter(assigned_to=request.user).order_by('-updated_at')
     
     context = {
         'reported_bugs': reported_bugs,
@@ -55,8 +76,12 @@ def my_bugs(request):
 @login_required
 def my_projects(request):
     """Display projects the user is involved with."""
-    managed_projects = Project.objects.filter(manager=request.user)
-    member_projects = Project.objects.filter(members=request.user).exclude(manager=request.user)
+    managed_projects = Project.objects.filter(manager=request.user).select_related(
+        'bug_stats'
+    ).annotate(member_count=member_count())
+    member_projects = Project.objects.filter(members=request.user).exclude(
+        manager=request.user
+    ).select_related('manager', 'bug_stats')
     
     context = {
         'managed_projects': managed_projects,
@@ -67,12 +92,16 @@ def my_projects(request):
 
 @login_required
 def recent_activity(request):
-    """Display recent activity across the system."""
+    """Display recent activity across the projects the user may see."""
     # Get bugs recently modified
-    recent_bugs = Bug.objects.order_by('-updated_at')[:20]
+    recent_bugs = visible_bugs(request.user, Bug.objects.order_by('-updated_at'))[:20]
     
-    # Get recent bug history entries
-    bug_history = BugHistory.objects.order_by('-timestamp')[:50]
+    # Get recent bug history entries; newer ones arrive over the live stream
+    bug_history = BugHistory.objects.select_related('bug', 'user').order_by('-timestamp')
+    project_ids = _visible_project_ids(request.user)
+    if project_ids is not None:
+        bug_history = bug_history.filter(bug__project_id__in=project_ids)
+    bug_history = bug_history[:50]
     
     context = {
         'recent_bugs': recent_bugs,
@@ -83,25 +112,42 @@ def recent_activity(request):
 
 @login_required
 def statistics(request):
-    """Display system-wide statistics."""
-    # Get total counts
-    total_projects = Project.objects.count()
-    total_bugs = Bug.objects.count()
+    """Display statistics over the projects the user may see."""
+    project_ids = _visible_project_ids(request.user)
+    project_stats = ProjectBugStats.objects.all()
+    if project_ids is not None:
+        project_stats = project_stats.filter(project_id__in=project_ids)
     
-    # Get bug status distribution
-    bug_status_counts = Bug.objects.values('status').annotate(count=Count('status'))
+    # Current totals come from the per-project counters
+    totals = project_stats.aggregate(
+        **{field: Sum(field) for field in ProjectBugStats.counter_fields()}
+    )
+    total_projects = Project.objects.count() if project_ids is None else len(project_ids)
+    total_bugs = totals['total'] or 0
     
-    # Get bug priority distribution
-    bug_priority_counts = Bug.objects.values('priority').annotate(count=Count('priority'))
+    def distribution(prefix, choices):
+        counts = [
+            {prefix: value, 'count': totals[f'{prefix}_{value}'] or 0} for value, _ in choices
+        ]
+        return [row for row in counts if row['count']]
     
-    # Get bug severity distribution
-    bug_severity_counts = Bug.objects.values('severity').annotate(count=Count('severity'))
+    bug_status_counts = distribution('status', Bug.STATUS_CHOICES)
+    bug_priority_counts = distribution('priority', Bug.PRIORITY_CHOICES)
+    bug_severity_counts = distribution('severity', Bug.SEVERITY_CHOICES)
     
     # Get projects with most bugs
-    project_bug_counts = Project.objects.annotate(bug_count=Count('bugs')).order_by('-bug_count')[:10]
+    project_bug_counts = project_stats.select_related('project').order_by('-total')[:10]
     
-    # Get bugs by month (for charts)
-    bug_by_month = Bug.objects.extra(select={'month': "EXTRACT(month FROM created_at)"}).values('month').annotate(count=Count('id')).order_by('month')
+    # Opened/resolved/closed over time, from the daily rollups
+    try:
+        start, end, granularity = parse_range(request.GET)
+        range_error = None
+    except RollupRangeError as exc:
+        start, end, granularity = parse_range({})
+        range_error = str(exc)
+    timeline = series(start, end, granularity, project_ids=project_ids)
+    timeline_rows = list(zip(timeline['buckets'], timeline['opened'],
+                             timeline['resolved'], timeline['closed']))
     
     context = {
         'total_projects': total_projects,
@@ -110,7 +156,129 @@ def statistics(request):
         'bug_priority_counts': bug_priority_counts,
         'bug_severity_counts': bug_severity_counts,
         'project_bug_counts': project_bug_counts,
-        'bug_by_month': bug_by_month
+        'timeline_rows': timeline_rows,
+        'start': start,
+        'end': end,
+        'granularity': granularity,
+        'range_error': range_error,
     }
     
     return render(request, 'dashboard/statistics.html', context)
+
+@login_required
+def statistics_chart(request):
+    """Opened/resolved/closed bug counts per time bucket, as columnar JSON."""
+    try:
+        start, end, granularity = parse_range(request.GET)
+    except RollupRangeError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    by = request.GET.get('by') or None
+    if by and by not in BREAKDOWNS:
+        return JsonResponse({'error': f'by must be one of {", ".join(BREAKDOWNS)}'}, status=400)
+    
+    project_id = request.GET.get('project')
+    if project_id and not project_id.isdigit():
+        return JsonResponse({'error': 'project must be a project id'}, status=400)
+    project_ids = _visible_project_ids(request.user)
+    if project_id and project_ids is not None and int(project_id) not in project_ids:
+        raise PermissionDenied
+    
+    return JsonResponse(series(start, end, granularity, project_id=project_id,
+                               project_ids=project_ids, by=by))
+
+@login_required
+def analytics(request):
+    """Display cycle-time and time-to-resolve distributions."""
+    try:
+        filters, by = parse_params(request.GET)
+        param_error = None
+    except AnalyticsParamError as exc:
+        filters, by = {}, None
+        param_error = str(exc)
+    project_ids = _visible_project_ids(request.user)
+    data = cached_summary(filters, by, project_ids=project_ids)
+    
+    metric_rows = [
+        (METRIC_LABELS[name], stats, zip(data['histogram_buckets'], stats['histogram']))
+        for name, stats in data['metrics'].items()
+    ]
+    
+    # Label the breakdown groups, which are keyed by id or value
+    group_rows = []
+    if by:
+        if by == 'project':
+            labels = dict(Project.objects.values_list('id', 'name'))
+        elif by == 'version':
+            labels = dict(ProjectVersion.objects.values_list('id', 'version_number'))
+        elif by == 'assignee':
+            labels = dict(User.objects.values_list('id', 'username'))
+        else:
+            labels = dict(Bug.PRIORITY_CHOICES)
+        for key, metrics in sorted(data['groups'].items()):
+            value = int(key) if key.isdigit() else key
+            group_rows.append((labels.get(value, 'None'), metrics['resolve'], metrics['lead']))
+    
+    context = {
+        'metric_rows': metric_rows,
+        'group_rows': group_rows,
+        'by': by,
+        'filters': filters,
+        'param_error': param_error,
+        'projects': visible_projects(request.user).order_by('name'),
+        'priority_choices': Bug.PRIORITY_CHOICES,
+    }
+    
+    return render(request, 'dashboard/analytics.html', context)
+
+@login_required
+def analytics_data(request):
+    """Cycle-time percentiles and histograms, as JSON."""
+    try:
+        filters, by = parse_params(request.GET)
+    except AnalyticsParamError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    return JsonResponse(cached_summary(filters, by, project_ids=_visible_project_ids(request.user)))
+
+@login_required
+async def activity_stream(request):
+    """Stream new bug history as server-sent events."""
+    # Limit to one project, or to the user's projects with scope=mine;
+    # only staff see every project's activity
+    user = await request.auser()
+    project_id = request.GET.get('project')
+    if project_id:
+        if not project_id.isdigit():
+            return HttpResponse('project must be a project id', status=400)
+        project = await Project.objects.filter(id=project_id).afirst()
+        if project is None:
+            raise Http404('No such project')
+        if not await sync_to_async(can_view_project)(user, project):
+            raise PermissionDenied
+        project_ids = [project.id]
+    elif request.GET.get('scope') == 'mine':
+        project_ids = await sync_to_async(list)(
+            Project.objects.filter(members=user).values_list('id', flat=True)
+        )
+    else:
+        project_ids = await sync_to_async(_visible_project_ids)(user)
+    
+    # Resume after the last event the browser saw
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    cursor = int(cursor) if cursor and cursor.isdigit() else None
+    
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI a held-open stream would tie up a worker thread, so
+        # answer with what is new and let EventSource reconnect (polling)
+        if cursor is None:
+            cursor = await sync_to_async(live.latest_id)()
+        chunks, cursor = await live.catch_up(cursor, project_ids)
+        body = f'retry: {live.RETRY_MS}\n\n' + (''.join(chunks) or f'id: {cursor}\n\n')
+        response = HttpResponse(body, content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(live.stream(project_ids, cursor),
+                                         content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
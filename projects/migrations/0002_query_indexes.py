@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectversion',
+            index=models.Index(fields=['project', '-release_date'], name='version_project_release_idx'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
 class Project(models.Model):
@@ -22,4 +24,15 @@ class ProjectVersion(models.Model):
         return f"{self.project.name} - {self.version_number}"
     
     class Meta:
-        ordering = ['-release_date']
\ No newline at end of file
+        ordering = ['-release_date']
+        indexes = [
+            models.Index(fields=['project', '-release_date'], name='version_project_release_idx'),
+        ]
+
+def member_count():
+    """The number of members of each project, as an annotation that needs no GROUP BY."""
+    return Coalesce(Subquery(
+        Project.members.through.objects.filter(project_id=OuterRef('id'))
+        .order_by().values('project_id').annotate(count=Count('id')).values('count'),
+        output_field=models.IntegerField(),
+    ), 0)
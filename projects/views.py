@@ -2,13 +2,17 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from .models import Project, ProjectVersion
+from .models import Project, ProjectVersion, member_count
+from bugs.models import ProjectBugStats, Tag
+from bugs.pagination import lean_bug_queryset
 from django.utils import timezone
 
 @login_required
 def project_list(request):
     """Display list of all projects."""
-    projects = Project.objects.all()
+    projects = Project.objects.select_related('manager', 'bug_stats').annotate(
+        member_count=member_count()
+    )
     return render(request, 'projects/project_list.html', {'projects': projects})
 
 @login_required
@@ -37,12 +41,16 @@ def project_detail(request, project_id):
     """Display project details."""
     project = get_object_or_404(Project, id=project_id)
     versions = project.versions.all()
-    bugs = project.bugs.all()
+    stats = ProjectBugStats.for_project(project)
+    bugs = lean_bug_queryset(project.bugs.order_by('-created_at', '-id'))[:10]
+    tag_counts = Tag.counts_for_project(project)[:30]
     
     context = {
         'project': project,
         'versions': versions,
+        'stats': stats,
         'bugs': bugs,
+        'tag_counts': tag_counts,
     }
     
     return render(request, 'projects/project_detail.html', context)